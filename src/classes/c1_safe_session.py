@@ -18,20 +18,33 @@ class SafeSession(object):
         parent.state = self.interrupted
         self.session.add(parent)
         self.future.append([
-            parent, children, on
+            parent, children, on, None
+        ])
+
+    def dependent_bulk_add(self, parent, model, rows, on):
+        """ Same as dependent_add, but children are dict rows of model inserted in bulk """
+        parent.state = self.interrupted
+        self.session.add(parent)
+        self.future.append([
+            parent, rows, on, model
         ])
 
     def commit(self):
         try:
             self.session.commit()
             if self.future:
-                for parent, children, on in self.future:
+                for parent, children, on, model in self.future:
                     if parent.state == self.interrupted:
                         if self.interrupted is NB_STOPPED:
                             parent.state = NB_LOADED
                         elif self.interrupted is REP_STOPPED:
                             parent.state = REP_LOADED
                     self.session.add(parent)
+                    if model is not None:
+                        for child in children:
+                            child[on] = parent.id
+                        self.session.bulk_insert_mappings(model, children)
+                        continue
                     for child in children:
                         setattr(child, on, parent.id)
                         self.session.add(child)
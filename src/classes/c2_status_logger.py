@@ -18,6 +18,7 @@ class StatusLogger(object):
         self.file = consts.LOGS_DIR / "status.csv"
         self.freq = consts.STATUS_FREQUENCY
         self.pid = os.getpid()
+        self.cache = None
 
     @property
     def count(self):
@@ -43,11 +44,39 @@ class StatusLogger(object):
 
     def report(self):
         if self.total % self.freq == 0:
-            with open(str(self.file), "a") as csvfile:
-                writer = csv.writer(csvfile)
-                now = time.time()
-                writer.writerow([
-                    consts.MACHINE, self.script,
-                    self.total, self.count, self.skipped,
-                    self.time, now, now - self.time, self.pid
-                ])
+            self.write()
+
+    def merge(self, counts):
+        """ Sets count and skipped to the sums of (count, skipped) pairs of shard workers.
+        Writes a row whenever the total passes a multiple of freq """
+        previous = self.total
+        counts = list(counts)
+        self._count = sum(count for count, _ in counts)
+        self.skipped = sum(skipped for _, skipped in counts)
+        if self.total // self.freq > previous // self.freq:
+            self.write()
+
+    def write(self):
+        with open(str(self.file), "a") as csvfile:
+            writer = csv.writer(csvfile)
+            now = time.time()
+            writer.writerow([
+                consts.MACHINE, self.script,
+                self.total, self.count, self.skipped,
+                self.time, now, now - self.time, self.pid,
+                "{:.3f}".format(self.cache.hit_rate) if self.cache else ""
+            ])
+
+
+class ShardStatusLogger(StatusLogger):
+    """ StatusLogger of a shard worker.
+    Publishes (count, skipped) to its slot of a shared array instead of writing rows """
+
+    def __init__(self, script, counts, index):
+        super(ShardStatusLogger, self).__init__(script)
+        self.counts = counts
+        self.index = index
+
+    def report(self):
+        self.counts[2 * self.index] = self.count
+        self.counts[2 * self.index + 1] = self.skipped
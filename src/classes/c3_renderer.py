@@ -64,6 +64,10 @@ class CountRenderer(mistune.Renderer):
 
     def __init__(self, language, stopwords, using_stopwords):
         super(CountRenderer, self).__init__()
+        self.reset(language, stopwords, using_stopwords)
+
+    def reset(self, language, stopwords, using_stopwords):
+        """ Starts a new counter, so a parser can reuse the renderer for the next cell """
         self.stopwords = stopwords
         self.counter = {
             'language': language,
@@ -43,3 +43,26 @@ class CompressedLocalChecker(PathLocalChecker):
             return True
         except KeyError:
             return False
+
+
+class GitTreeLocalChecker(PathLocalChecker):
+    """ Checks module locality by looking at the tree of Repository.commit.
+    Paths are relative to the repository """
+
+    def __init__(self, tree, path):
+        path = to_unicode(path)
+        self.base = os.path.dirname(path)
+        self.tree = tree
+
+    def exists(self, path):
+        return self.tree.exists(path)
+
+
+class DeferredLocalChecker(object):
+    """ Leaves module locality undefined.
+
+    Used by worker processes, which do not have the repository files.
+    The locality is resolved later by resolve_features. """
+
+    def is_local(self, module):
+        return None
@@ -5,6 +5,8 @@ import sys
 
 
 class CellVisitor(ast.NodeVisitor):
+    # Increase it whenever the extracted features change, to invalidate cached results
+    VERSION = 1
 
     def __init__(self, local_checker):
         self.local_checker = local_checker
@@ -0,0 +1,171 @@
+from __future__ import print_function
+
+import time
+import multiprocessing
+
+from multiprocessing.connection import wait
+from src.helpers.h3_utils import TimeoutError
+
+
+def work(connection):
+    """ Worker loop. Runs (function, args) tasks until it receives None """
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        function, args = task
+        try:
+            result = (True, function(*args))
+        except Exception as err:  # pylint: disable=broad-except
+            result = (False, err)
+
+        try:
+            connection.send(result)
+        except Exception as err:  # pylint: disable=broad-except
+            connection.send((False, Exception("Unpicklable result: {!r}".format(err))))
+
+
+def run_inline(function, tasks):
+    """ Runs tasks in the current process, with the same output of WorkerPool.imap """
+    for args in tasks:
+        try:
+            yield True, function(*args)
+        except Exception as err:  # pylint: disable=broad-except
+            yield False, err
+
+
+class Worker(object):
+    """ Long-lived process connected by its own pipe """
+
+    def __init__(self):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=work, args=(child,))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self.index = None
+        self.deadline = None
+
+    def submit(self, index, function, args, timeout):
+        self.index = index
+        self.deadline = time.time() + timeout if timeout else None
+        self.connection.send((function, args))
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+class WorkerPool(object):
+    """ Pool of long-lived processes with per-task timeouts.
+
+    imap yields (success, result) tuples in the order of the tasks.
+    A task that exceeds the timeout yields (False, TimeoutError) and only the
+    worker running it is killed and replaced. A pool without workers runs the
+    tasks in the current process, without timeout.
+    """
+
+    def __init__(self, workers, timeout=None):
+        self.size = max(0, workers)
+        self.timeout = timeout
+        self.workers = []
+        self.respawned = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        while len(self.workers) < self.size:
+            self.workers.append(Worker())
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def replace(self, worker):
+        """ Kills a worker and starts another one in its place """
+        worker.kill()
+        new_worker = Worker()
+        self.workers[self.workers.index(worker)] = new_worker
+        self.respawned += 1
+        return new_worker
+
+    def imap(self, function, tasks, timeout=None):
+        if not self.size:
+            for result in run_inline(function, tasks):
+                yield result
+            return
+
+        self.start()
+        timeout = timeout or self.timeout
+        tasks = enumerate(tasks)
+        window = self.size * 4
+        results = {}
+        busy = {}
+        idle = list(self.workers)
+        next_index = 0
+        exhausted = False
+
+        try:
+            while True:
+                while idle and not exhausted and len(results) + len(busy) < window:
+                    try:
+                        index, args = next(tasks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    worker = idle.pop()
+                    worker.submit(index, function, args, timeout)
+                    busy[worker.connection] = worker
+
+                while next_index in results:
+                    yield results.pop(next_index)
+                    next_index += 1
+
+                if not busy:
+                    if exhausted:
+                        return
+                    continue
+
+                deadlines = [worker.deadline for worker in busy.values() if worker.deadline]
+                wait_time = max(0, min(deadlines) - time.time()) if deadlines else None
+
+                for connection in wait(list(busy), wait_time):
+                    worker = busy.pop(connection)
+                    try:
+                        results[worker.index] = connection.recv()
+                    except EOFError:
+                        results[worker.index] = (False, EnvironmentError("Worker process died"))
+                        worker = self.replace(worker)
+                    idle.append(worker)
+
+                now = time.time()
+                for connection, worker in list(busy.items()):
+                    if worker.deadline and worker.deadline <= now:
+                        del busy[connection]
+                        results[worker.index] = (False, TimeoutError("Timed Out"))
+                        idle.append(self.replace(worker))
+        finally:
+            for worker in busy.values():
+                self.replace(worker)
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import sys
+
+from sqlalchemy import select
+
+from src.db.database import CachedFeature
+from src.classes.c5_cell_visitor import CellVisitor
+
+
+class FeatureCache(object):
+    """ Persistent cache of CellVisitor results keyed by the source content.
+
+    Entries are keyed by (sha1 of the source, python major.minor, visitor version).
+    Modules are stored without locality, since it depends on the LocalChecker
+    of each file. get returns it as None, as extract_source_features does.
+    """
+
+    def __init__(self, session, batch_size=1000):
+        self.session = session
+        self.python = "{}.{}".format(*sys.version_info[:2])
+        self.version = CellVisitor.VERSION
+        self.batch_size = batch_size
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def get(self, text):
+        """ Returns the cached (modules, data_ios, extracted_args, missed_args) or None """
+        sha1 = self.key(text)
+        features = self.pending.get(sha1)
+        if features is None:
+            table = CachedFeature.__table__
+            row = self.session.execute(
+                select([table.c.modules, table.c.data_ios, table.c.extracted_args, table.c.missed_args])
+                .where(table.c.sha1 == sha1)
+                .where(table.c.python == self.python)
+                .where(table.c.version == self.version)
+            ).first()
+            if row is not None:
+                modules, data_ios, extracted_args, missed_args = row
+                features = (
+                    [tuple(module) + (None,) for module in json.loads(modules)],
+                    [tuple(data_io) for data_io in json.loads(data_ios)],
+                    extracted_args, missed_args
+                )
+
+        if features is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return features
+
+    def add(self, text, features):
+        """ Stores the features of a source. Writes them in batches """
+        self.pending[self.key(text)] = features
+        if len(self.pending) >= self.batch_size:
+            self.save()
+
+    def save(self):
+        """ Writes pending entries. Entries stored by other processes are kept """
+        if not self.pending:
+            return
+        rows = [
+            {
+                "sha1": sha1,
+                "python": self.python,
+                "version": self.version,
+                "modules": json.dumps([module[:3] for module in modules]),
+                "data_ios": json.dumps(data_ios),
+                "extracted_args": extracted_args,
+                "missed_args": missed_args,
+            } for sha1, (modules, data_ios, extracted_args, missed_args) in self.pending.items()
+        ]
+        self.session.execute(CachedFeature.__table__.insert().prefix_with("OR IGNORE"), rows)
+        self.pending = {}
@@ -0,0 +1,138 @@
+import bisect
+import hashlib
+import re
+
+from collections import Counter, OrderedDict
+
+
+LETTERS = re.compile(r"[^\W\d_]")
+NON_ASCII_LETTERS = re.compile(r"[^\W\d_a-zA-Z]")
+
+# (first code point, script, language). A script goes until the next entry.
+# language is None when the script is not used by a single language of LANG_MAP
+SCRIPTS = [
+    (0x0000, "latin", None),
+    (0x0370, "greek", "greek"),
+    (0x0400, "cyrillic", None),
+    (0x0530, "other", None),
+    (0x0590, "hebrew", "hebrew"),
+    (0x0600, "arabic", None),
+    (0x0780, "other", None),
+    (0x0900, "devanagari", None),
+    (0x0980, "bengali", "bengali"),
+    (0x0A00, "gurmukhi", "punjabi"),
+    (0x0A80, "gujarati", "gujarati"),
+    (0x0B00, "other", None),
+    (0x0B80, "tamil", "tamil"),
+    (0x0C00, "telugu", "telugu"),
+    (0x0C80, "kannada", "kannada"),
+    (0x0D00, "malayalam", "malayalam"),
+    (0x0D80, "other", None),
+    (0x0E00, "thai", "thai"),
+    (0x0E80, "other", None),
+    (0x1100, "hangul", "korean"),
+    (0x1200, "other", None),
+    (0x3040, "kana", "japanese"),
+    (0x3100, "other", None),
+    (0x3400, "han", None),
+    (0xA000, "other", None),
+    (0xAC00, "hangul", "korean"),
+    (0xD7B0, "other", None),
+]
+SCRIPT_STARTS = [start for start, _, _ in SCRIPTS]
+
+
+def script_language(text):
+    """ Returns (letters, language) of text. language is the language of the script
+    of most letters if that script belongs to a single language. Otherwise, it is None """
+    if text.isascii():
+        return len(LETTERS.findall(text)), None
+    letters = len(LETTERS.findall(text))
+    scripts = Counter()
+    for char in NON_ASCII_LETTERS.findall(text):
+        scripts[SCRIPTS[bisect.bisect_right(SCRIPT_STARTS, ord(char)) - 1][1:]] += 1
+    if not scripts:
+        return letters, None
+    (script, language), total = scripts.most_common(1)[0]
+    if script in ("kana", "han"):
+        # Japanese mixes kana and han. Han alone may also be chinese
+        total = scripts[("kana", "japanese")] + scripts[("han", None)]
+        language = "japanese" if scripts[("kana", "japanese")] else None
+    if language is None or total * 2 <= letters:
+        return letters, None
+    return letters, language
+
+
+class LanguageDetector(object):
+    """ Tiered language detection of markdown cells.
+
+    1. The script of the letters identifies languages with their own script.
+    2. Texts with fewer than min_letters letters use the most common language of
+       all the markdown cells of the notebook (its prior), or 'undetected'.
+       The prior does not depend on the cells that a run processes, so resumed
+       runs, retries and shards detect the same language as a full run.
+    3. Other texts use langdetect with a fixed seed. Its results are memoised by
+       the sha1 of the text, keeping up to cache_size entries.
+    """
+
+    def __init__(self, seed=0, min_letters=30, cache_size=100000):
+        self.seed = seed
+        self.min_letters = min_letters
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.notebook = None
+        self.prior = Counter()
+        self.detections = 0
+        self.hits = 0
+
+    def start_notebook(self, notebook, texts=()):
+        """ Builds the prior from texts, the markdown cells of the notebook in order,
+        when the cells of another notebook begin. texts is only read then """
+        if notebook != self.notebook:
+            self.notebook = notebook
+            self.prior = Counter(
+                language for language in map(self.text_language, texts) if language is not None
+            )
+
+    def prior_language(self):
+        if not self.prior:
+            return 'undetected'
+        return self.prior.most_common(1)[0][0]
+
+    def text_language(self, text):
+        """ Returns the LANG_MAP name of the language of text without the prior, or None """
+        letters, language = script_language(text)
+        if language is None and letters >= self.min_letters:
+            language = self.full_detection(text)
+        return language
+
+    def detect(self, text):
+        """ Returns the LANG_MAP name of the language of text, or 'undetected' """
+        language = self.text_language(text)
+        if language is None:
+            return self.prior_language()
+        return language
+
+    def full_detection(self, text):
+        """ Returns the LANG_MAP name of the language detected by langdetect, or None """
+        key = hashlib.sha1(text.encode("utf-8", "surrogatepass")).digest()
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+
+        from langdetect import DetectorFactory, detect
+        from langdetect.lang_detect_exception import LangDetectException
+        from src.classes.c3_renderer import LANG_MAP
+
+        DetectorFactory.seed = self.seed
+        try:
+            language = LANG_MAP.get(detect(text))
+        except LangDetectException:
+            language = None
+        self.detections += 1
+
+        self.cache[key] = language
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return language
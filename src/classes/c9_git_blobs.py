@@ -0,0 +1,177 @@
+import io
+import os
+import subprocess
+
+from src.helpers.h1_git_helpers import ls_tree
+
+
+class GitBlob(io.RawIOBase):
+    """ Content of a blob in the output of git cat-file --batch.
+
+    Reads stop at the end of the blob. Closing it skips what was not read,
+    so the next blob can be requested. Seeking to the start requests the
+    blob again, as read_notebook does when it falls back to nbformat """
+
+    def __init__(self, reader, obj, size):
+        super(GitBlob, self).__init__()
+        self.reader = reader
+        self.obj = obj
+        self.size = size
+        self.remaining = size
+        self.done = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:self.remaining]
+        count = self.reader.stdout.readinto(view)
+        if not count:
+            self.done = True
+            raise self.reader.fail(EOFError("git cat-file stopped inside {}".format(self.obj)))
+        self.remaining -= count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR and offset == 0:
+            return self.size - self.remaining
+        if whence == io.SEEK_SET and offset == 0:
+            self.skip()
+            self.size = self.remaining = self.reader.request(self.obj)
+            self.done = False
+            return 0
+        raise io.UnsupportedOperation("blobs can only be read from the start")
+
+    def skip(self):
+        """ Reads the rest of the blob and the newline after it """
+        if self.done:
+            return
+        while self.remaining > 0:
+            chunk = self.reader.stdout.read(min(self.remaining, io.DEFAULT_BUFFER_SIZE))
+            if not chunk:
+                self.done = True
+                raise self.reader.fail(EOFError("git cat-file stopped inside {}".format(self.obj)))
+            self.remaining -= len(chunk)
+        self.reader.stdout.read(1)
+        self.done = True
+
+    def close(self):
+        try:
+            self.skip()
+        finally:
+            super(GitBlob, self).close()
+
+
+class GitBlobReader(object):
+    """ Reads blobs of a repository through one long-lived git cat-file --batch.
+
+    Blobs are requested by object name and must be read one at a time.
+    Partial clones download the blobs they miss on request. If the process
+    stops, the reader is broken and blob_reader replaces it. """
+
+    def __init__(self, full_dir):
+        self.full_dir = str(full_dir)
+        self.pid = os.getpid()
+        self.process = subprocess.Popen(
+            ["git", "--git-dir", os.path.join(self.full_dir, ".git"), "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        self.stdout = self.process.stdout
+        self.blob = None
+        self.broken = False
+
+    def fail(self, err):
+        """ Marks the reader as broken and returns err """
+        self.broken = True
+        return err
+
+    def request(self, obj):
+        """ Asks for a blob and returns its size. Its content follows in stdout """
+        try:
+            self.process.stdin.write(obj.encode("ascii") + b"\n")
+            self.process.stdin.flush()
+            line = self.stdout.readline()
+        except (OSError, ValueError) as err:
+            raise self.fail(err)
+        if not line:
+            raise self.fail(EOFError("git cat-file stopped before {}".format(obj)))
+        header = line.decode("ascii").split()
+        if len(header) != 3:
+            raise FileNotFoundError("Object {} not found in {}".format(obj, self.full_dir))
+        if header[1] != "blob":
+            GitBlob(self, obj, int(header[2])).close()
+            raise IsADirectoryError("Object {} is a {}".format(obj, header[1]))
+        return int(header[2])
+
+    def open(self, obj, mode="rb", encoding=None):
+        """ Returns the content of a blob as a file object """
+        if self.blob is not None:
+            self.blob.close()
+            self.blob = None
+        self.blob = GitBlob(self, obj, self.request(obj))
+        stream = io.BufferedReader(self.blob)
+        if "b" in mode:
+            return stream
+        return io.TextIOWrapper(stream, encoding=encoding)
+
+    def read(self, obj):
+        """ Returns the content of a blob as bytes """
+        with self.open(obj) as stream:
+            return stream.read()
+
+    def close(self):
+        if self.blob is not None:
+            if self.broken:
+                self.blob.done = True
+            self.blob.close()
+            self.blob = None
+        if self.broken:
+            self.process.kill()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        self.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GitTree(object):
+    """ Paths of the files and directories of the tree of a commit """
+
+    def __init__(self, full_dir, commit):
+        self.paths = frozenset(
+            path for _, _, _, path in ls_tree(full_dir, commit, trees=True)
+        )
+
+    def exists(self, path):
+        return path in self.paths
+
+
+READER = None
+
+
+def blob_reader(full_dir):
+    """ Returns the GitBlobReader of a repository in this process.
+    The reader of the previous repository is closed, as is a reader whose
+    process stopped. Readers inherited from the parent process are left to it """
+    global READER  # pylint: disable=global-statement
+    full_dir = str(full_dir)
+    if READER is not None and READER.pid == os.getpid():
+        if READER.process.poll() is not None:
+            READER.broken = True
+        if READER.full_dir == full_dir and not READER.broken:
+            return READER
+        READER.close()
+    READER = GitBlobReader(full_dir)
+    return READER
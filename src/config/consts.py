@@ -28,6 +28,14 @@ DB_RESTORED = ROOT + os.sep + "dsmining.sqlite"
 DB_FILE_TEST = DB_DIR + os.sep + "dsmining_test.sqlite"
 DB_CONNECTION = "sqlite:////{}".format(DB_FILE)
 DB_CONNECTION_TEST = "sqlite:////{}".format(DB_FILE_TEST)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # negative values are KB, so 64 MB
+    "mmap_size": 256 * (2 ** 20),
+    "temp_store": "MEMORY",
+    "busy_timeout": 60000,
+}
 
 # Configs
 REPOS_DIR = ROOT + os.sep + "repos"
@@ -38,6 +46,27 @@ QUERY_GRAPHQL_FILE = "{}/query.graphql".format(CONFIG_DIR)
 VERBOSE = 5
 STATUS_FREQUENCY = 5
 COMPRESSION = "lbzip2"
+DOWNLOAD_JOBS = 4
+CLONE_MODE = "partial"  # full, partial (--filter=blob:none) or shallow (--depth)
+CLONE_DEPTH = 1
+EXTRACTION_BACKEND = "worktree"  # worktree (checkout) or git (files read from git objects at Repository.commit)
+COMMIT_BATCH_SIZE = 5000
+STREAM_BATCH_SIZE = 1000  # rows loaded per page by the stage filters
+FILE_BATCH_SIZE = 100  # files loaded by e2, e3 and e4 before each commit
+MARKDOWN_BATCH_SIZE = 500  # markdown cells whose features e5 inserts at once
+LANGUAGE_SEED = 0  # langdetect seed. Reruns with the same seed detect the same languages
+LANGUAGE_MIN_LETTERS = 30  # shorter markdown cells use the language of their notebook instead of langdetect
+LANGUAGE_CACHE_SIZE = 100000  # langdetect results memoised by e5
+NOTEBOOK_WORKERS = 4
+NOTEBOOK_TIMEOUT = 5 * 60
+NOTEBOOK_FAST_PATH = True  # e2 reads nbformat 4 notebooks as plain dicts, without nbformat
+FEATURE_WORKERS = 4
+FEATURE_TIMEOUT = 2 * 60
+FEATURE_CACHE = True  # reuse e6 and e7 features of identical sources
+MATERIALIZED_STATE_COUNTS = True  # s3_extract reads repository_state_counts instead of grouping repositories
+BATCH_TIME_BUDGET = None  # estimated seconds per s3_extract iteration. None limits only by size
+MAX_PARALLEL_STAGES = 3  # s3_extract scripts that run at once. 1 runs them in sequence
+STAGE_RUNNER = "forkserver"  # forkserver: scripts fork from a server with them imported. subprocess: new MAIN_VERSION interpreters
 ANACONDA_PATH = Path.home().joinpath("anaconda3")
 MAIN_VERSION = ANACONDA_PATH / "envs" / "dsm38" / "bin" / "python"
 
@@ -4,10 +4,11 @@ import src.config.consts as consts
 
 from datetime import datetime
 from contextlib import contextmanager
-from sqlalchemy import create_engine, Enum
+from sqlalchemy import create_engine, event, text, Enum, DDL
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Boolean
-from sqlalchemy import ForeignKeyConstraint, DateTime, Interval
+from sqlalchemy import Column, Integer, String, Boolean, Float
+from sqlalchemy import ForeignKeyConstraint, DateTime, Interval, Index
 from sqlalchemy.orm import sessionmaker, scoped_session, relationship
 
 from src.config.states import *
@@ -17,6 +18,11 @@ from src.helpers.h3_utils import version_string_to_list
 BigInt = Integer
 Base = declarative_base()  # pylint: disable=invalid-name
 
+# Increase it whenever tables, columns or indexes change. connect() then creates the
+# missing tables and columns. Indexes of existing tables are built by src/db/migrate.py
+SCHEMA_VERSION = 9
+ENGINES = {}
+
 
 def one_to_many(table, backref):
     """ Creates a one-to-many relationship """
@@ -44,6 +50,8 @@ class Repository(Base):
     # pylint: disable=invalid-name
     __tablename__ = 'repositories'
     __table_args__ = (
+        Index('ix_repositories_state', 'state'),
+        Index('ix_repositories_state_disk_usage', 'state', 'disk_usage_kb'),
         ForeignKeyConstraint(
             ['extraction_id'],
             ['extractions.id']
@@ -78,6 +86,7 @@ class Repository(Base):
     part = Column(Integer, default=consts.PART)
     primary_language = Column(String)
     disk_usage = Column(String)
+    disk_usage_kb = Column(Integer)  # integer disk_usage, kept by REPOSITORY_TRIGGERS
     is_mirror = Column(Boolean)
     git_created_at = Column(DateTime)
     git_pushed_at = Column(DateTime)
@@ -108,6 +117,8 @@ class Repository(Base):
     requirements_count = Column(Integer)
     pipfiles_count = Column(Integer)
     pipfile_locks_count = Column(Integer)
+    inventory_files = Column(Integer)  # rows in repository_files. None before the inventory
+    backend = Column(String)  # extraction backend of the clone: worktree or git (cloned without checkout)
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
@@ -117,6 +128,7 @@ class Repository(Base):
     python_file_modules_objs = one_to_many("PythonFileModule", "repository_obj")
     python_file_data_ios_objs = one_to_many("PythonFileDataIO", "repository_obj")
     requirement_files_objs = one_to_many("RequirementFile", "repository_obj")
+    repository_files_objs = one_to_many("RepositoryFile", "repository_obj")
 
     notebooks_objs = one_to_many("Notebook", "repository_obj")
     cell_objs = one_to_many("Cell", "repository_obj")
@@ -163,6 +175,7 @@ class Commit(Base):
     __tablename__ = 'commits'
     sqlite_autoincrement = True
     __table_args__ = (
+        Index('ix_commits_repository', 'repository_id'),
         ForeignKeyConstraint(
             ['repository_id'],
             ['repositories.id']
@@ -189,6 +202,7 @@ class Notebook(Base):
     # pylint: disable=invalid-name
     __tablename__ = 'notebooks'
     __table_args__ = (
+        Index('ix_notebooks_repository_name', 'repository_id', 'name'),
         ForeignKeyConstraint(
             ['repository_id'],
             ['repositories.id']
@@ -273,6 +287,9 @@ class Cell(Base):
     # pylint: disable=too-few-public-methods, invalid-name
     __tablename__ = 'cells'
     __table_args__ = (
+        Index('ix_cells_code', 'cell_type', 'python', 'repository_id', 'notebook_id', 'index'),
+        Index('ix_cells_markdown', 'cell_type', 'repository_id', 'notebook_id', 'index'),
+        Index('ix_cells_notebook', 'notebook_id', 'index'),
         ForeignKeyConstraint(
             ['notebook_id'],
             ['notebooks.id']
@@ -325,6 +342,7 @@ class PythonFile(Base):
     # pylint: disable=invalid-name
     __tablename__ = 'python_files'
     __table_args__ = (
+        Index('ix_python_files_repository_name', 'repository_id', 'name'),
         ForeignKeyConstraint(
             ['repository_id'],
             ['repositories.id']
@@ -376,6 +394,7 @@ class RequirementFile(Base):
     # pylint: disable=invalid-name
     __tablename__ = 'requirement_files'
     __table_args__ = (
+        Index('ix_requirement_files_repository_name', 'repository_id', 'name'),
         ForeignKeyConstraint(
             ['repository_id'],
             ['repositories.id']
@@ -410,11 +429,44 @@ class RequirementFile(Base):
         )
 
 
+class RepositoryFile(Base):
+    """Repository File Inventory Table"""
+    # pylint: disable=too-few-public-methods, invalid-name
+    __tablename__ = 'repository_files'
+    __table_args__ = (
+        Index('ix_repository_files_repository_kind', 'repository_id', 'kind'),
+        ForeignKeyConstraint(
+            ['repository_id'],
+            ['repositories.id']
+        ),
+        {'sqlite_autoincrement': True},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    repository_id = Column(Integer)
+    path = Column(String)  # relative to the repository
+    kind = Column(String)  # notebook, python, setup, requirements, pipfile, pipfile_lock
+    size = Column(Integer)
+    mtime = Column(Float)
+    blob = Column(String)  # git object of the file at Repository.commit, for the git backend
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    repository_obj = many_to_one("Repository", "repository_files_objs")
+
+    @force_encoded_string_output
+    def __repr__(self):
+        return u"<RepositoryFile({0.repository_id}/{0.id}:{0.path})>".format(
+            self
+        )
+
+
 class CellMarkdownFeature(Base):
     """Cell Markdown Features Table"""
     # pylint: disable=too-few-public-methods, invalid-name
     __tablename__ = 'cell_markdown_features'
     __table_args__ = (
+        Index('ix_cell_markdown_features_notebook', 'notebook_id', 'cell_id'),
         ForeignKeyConstraint(
             ['cell_id'],
             ['cells.id']
@@ -602,6 +654,7 @@ class CellModule(Base):
     # pylint: disable=too-few-public-methods, invalid-name
     __tablename__ = 'cell_modules'
     __table_args__ = (
+        Index('ix_cell_modules_notebook', 'notebook_id', 'cell_id'),
         ForeignKeyConstraint(
             ['cell_id'],
             ['cells.id']
@@ -649,6 +702,7 @@ class CellDataIO(Base):
     # pylint: disable=too-few-public-methods, invalid-name
     __tablename__ = 'cell_data_ios'
     __table_args__ = (
+        Index('ix_cell_data_ios_notebook', 'notebook_id', 'cell_id'),
         ForeignKeyConstraint(
             ['cell_id'],
             ['cells.id']
@@ -698,6 +752,7 @@ class PythonFileModule(Base):
     # pylint: disable=too-few-public-methods, invalid-name
     __tablename__ = 'python_file_modules'
     __table_args__ = (
+        Index('ix_python_file_modules_python_file', 'python_file_id'),
         ForeignKeyConstraint(
             ['python_file_id'],
             ['python_files.id']
@@ -738,6 +793,7 @@ class PythonFileDataIO(Base):
     # pylint: disable=too-few-public-methods, invalid-name
     __tablename__ = 'python_file_data_ios'
     __table_args__ = (
+        Index('ix_python_file_data_ios_python_file', 'python_file_id'),
         ForeignKeyConstraint(
             ['python_file_id'],
             ['python_files.id']
@@ -775,6 +831,29 @@ class PythonFileDataIO(Base):
         ).format(self)
 
 
+class CachedFeature(Base):
+    """Cell Visitor Results Cache Table"""
+    # pylint: disable=too-few-public-methods, invalid-name
+    __tablename__ = 'cached_features'
+
+    sha1 = Column(String, primary_key=True)
+    python = Column(String, primary_key=True)
+    version = Column(Integer, primary_key=True)
+
+    modules = Column(String)  # JSON list of (line, import_type, module_name)
+    data_ios = Column(String)  # JSON list of (line, caller, function_name, function_type, source, mode)
+    extracted_args = Column(Integer)
+    missed_args = Column(Integer)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    @force_encoded_string_output
+    def __repr__(self):
+        return (
+            u"<CachedFeature({0.sha1}/{0.python}/{0.version})>"
+        ).format(self)
+
+
 class Extraction(Base):
     """Repository Files Table"""
     # pylint: disable=too-few-public-methods, invalid-name
@@ -795,6 +874,7 @@ class Extraction(Base):
     runtime = Column(Interval)
     repositores = Column(Integer)
     failure = Column(String)
+    stage_runtimes = Column(String)  # JSON {script: seconds}
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
@@ -808,6 +888,96 @@ class Extraction(Base):
         ).format(self)
 
 
+class RepositoryStateCount(Base):
+    """Repositories per State Table. Kept by REPOSITORY_TRIGGERS"""
+    # pylint: disable=too-few-public-methods, invalid-name
+    __tablename__ = 'repository_state_counts'
+
+    state = Column(String, primary_key=True)
+    repositories = Column(Integer, default=0)
+    disk_usage_kb = Column(Integer, default=0)
+
+    @force_encoded_string_output
+    def __repr__(self):
+        return (
+            u"<RepositoryStateCount({0.state}:{0.repositories})>"
+        ).format(self)
+
+
+# Keep repositories.disk_usage_kb and repository_state_counts up to date on
+# every write, including bulk updates of the state
+REPOSITORY_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS tr_repositories_disk_usage_insert
+    AFTER INSERT ON repositories WHEN NEW.disk_usage IS NOT NULL
+    BEGIN
+        UPDATE repositories SET disk_usage_kb = CAST(NEW.disk_usage AS INTEGER) WHERE id = NEW.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tr_repositories_disk_usage_update
+    AFTER UPDATE OF disk_usage ON repositories
+    BEGIN
+        UPDATE repositories SET disk_usage_kb = CAST(NEW.disk_usage AS INTEGER) WHERE id = NEW.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tr_repository_state_counts_insert
+    AFTER INSERT ON repositories
+    BEGIN
+        INSERT OR IGNORE INTO repository_state_counts (state, repositories, disk_usage_kb)
+        VALUES (COALESCE(NEW.state, ''), 0, 0);
+        UPDATE repository_state_counts
+        SET repositories = repositories + 1, disk_usage_kb = disk_usage_kb + COALESCE(NEW.disk_usage_kb, 0)
+        WHERE state = COALESCE(NEW.state, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tr_repository_state_counts_update
+    AFTER UPDATE OF state, disk_usage_kb ON repositories
+    BEGIN
+        UPDATE repository_state_counts
+        SET repositories = repositories - 1, disk_usage_kb = disk_usage_kb - COALESCE(OLD.disk_usage_kb, 0)
+        WHERE state = COALESCE(OLD.state, '');
+        INSERT OR IGNORE INTO repository_state_counts (state, repositories, disk_usage_kb)
+        VALUES (COALESCE(NEW.state, ''), 0, 0);
+        UPDATE repository_state_counts
+        SET repositories = repositories + 1, disk_usage_kb = disk_usage_kb + COALESCE(NEW.disk_usage_kb, 0)
+        WHERE state = COALESCE(NEW.state, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tr_repository_state_counts_delete
+    AFTER DELETE ON repositories
+    BEGIN
+        UPDATE repository_state_counts
+        SET repositories = repositories - 1, disk_usage_kb = disk_usage_kb - COALESCE(OLD.disk_usage_kb, 0)
+        WHERE state = COALESCE(OLD.state, '');
+    END""",
+]
+
+for trigger in REPOSITORY_TRIGGERS:
+    event.listen(Repository.__table__, "after_create", DDL(trigger))
+
+
+class PlannedBatch(Base):
+    """Extraction Batch Plan Table"""
+    # pylint: disable=too-few-public-methods, invalid-name
+    __tablename__ = 'planned_batches'
+    __table_args__ = (
+        Index('ix_planned_batches_batch', 'batch'),
+        ForeignKeyConstraint(
+            ['repository_id'],
+            ['repositories.id']
+        ),
+    )
+
+    repository_id = Column(Integer, primary_key=True)
+    batch = Column(Integer)
+    size = Column(Integer)  # KB
+    notebooks = Column(Float)  # estimated when the repository was not extracted yet
+    cost = Column(Float)  # estimated seconds
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    @force_encoded_string_output
+    def __repr__(self):
+        return (
+            u"<PlannedBatch({0.batch}/{0.repository_id})>"
+        ).format(self)
+
+
 class NotebookMarkdown(Base):
     """Notebook Markdown Features Table"""
     # pylint: disable=too-few-public-methods, invalid-name
@@ -1123,11 +1293,116 @@ class DataIO(Base):
         ).format(self)
 
 
+def bulk_insert(session, model, rows):
+    """ Inserts dict rows with a single executemany, skipping the unit of work.
+    Column defaults are still applied, but no ORM objects are created """
+    if rows:
+        session.bulk_insert_mappings(model, rows)
+    return len(rows)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """ Applies the SQLite performance profile to every new connection """
+    cursor = dbapi_connection.cursor()
+    for pragma, value in consts.SQLITE_PRAGMAS.items():
+        cursor.execute("PRAGMA {} = {}".format(pragma, value))
+    cursor.close()
+
+
+def create_schema(engine):
+    """ Creates the missing tables, columns and triggers unless the database is already
+    at SCHEMA_VERSION. Missing indexes of existing tables are left to migrate.py,
+    since building them on a full database takes a while """
+    with engine.begin() as connection:
+        version = connection.execute(text("PRAGMA user_version")).scalar()
+        if version == SCHEMA_VERSION:
+            return False
+        Base.metadata.create_all(connection)
+        create_columns(connection)
+        create_triggers(connection)
+        connection.execute(text("PRAGMA user_version = {}".format(SCHEMA_VERSION)))
+    return True
+
+
+def create_triggers(bind):
+    """ Creates the missing REPOSITORY_TRIGGERS and rebuilds the columns and tables they keep """
+    for trigger in REPOSITORY_TRIGGERS:
+        bind.execute(text(trigger))
+    bind.execute(text(
+        "UPDATE repositories SET disk_usage_kb = CAST(disk_usage AS INTEGER) "
+        "WHERE disk_usage IS NOT NULL AND disk_usage_kb IS NULL"
+    ))
+    refresh_state_counts(bind)
+
+
+def refresh_state_counts(bind):
+    """ Recomputes repository_state_counts from repositories """
+    bind.execute(text("DELETE FROM repository_state_counts"))
+    bind.execute(text(
+        "INSERT INTO repository_state_counts (state, repositories, disk_usage_kb) "
+        "SELECT COALESCE(state, ''), COUNT(*), COALESCE(SUM(disk_usage_kb), 0) "
+        "FROM repositories GROUP BY COALESCE(state, '')"
+    ))
+
+
+def create_columns(bind):
+    """ Adds the model columns that are missing on existing tables.
+    Returns the created columns as table.column """
+    created = []
+    existing_tables = bind.dialect.get_table_names(bind)
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in bind.dialect.get_columns(bind, table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                bind.execute(text('ALTER TABLE {} ADD COLUMN "{}" {}'.format(
+                    table.name, column.name, column.type.compile(dialect=bind.dialect)
+                )))
+                created.append("{}.{}".format(table.name, column.name))
+    return created
+
+
+def create_indexes(bind):
+    """ Creates the managed indexes that are missing on existing tables.
+    Returns the names of the created indexes """
+    created = []
+    existing_tables = bind.dialect.get_table_names(bind)
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index["name"] for index in bind.dialect.get_indexes(bind, table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
+                created.append(index.name)
+    return created
+
+
+def get_engine(connection_string=DB_CONNECTION, echo=False):
+    """ Returns a pooled engine with the SQLite profile, created once per process """
+    key = (connection_string, echo)
+    if key not in ENGINES:
+        engine = create_engine(
+            connection_string, convert_unicode=True, echo=echo,
+            poolclass=QueuePool, connect_args={"check_same_thread": False}
+        )
+        event.listen(engine, "connect", set_sqlite_pragmas)
+        create_schema(engine)
+        ENGINES[key] = engine
+    return ENGINES[key]
+
+
+def dispose_engines():
+    """ Drops the pooled connections inherited by a forked process. The engines are reused """
+    for engine in ENGINES.values():
+        engine.dispose(close=False)
+
+
 @contextmanager
 def connect(echo=False):
     """Creates a context with an open SQLAlchemy session."""
-    engine = create_engine(DB_CONNECTION, convert_unicode=True, echo=echo)
-    Base.metadata.create_all(engine)
+    engine = get_engine(DB_CONNECTION, echo=echo)
     connection = engine.connect()
     db_session = scoped_session(sessionmaker(autocommit=False, autoflush=True, bind=engine))
     yield db_session
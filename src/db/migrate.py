@@ -0,0 +1,59 @@
+""" Creates the missing tables, columns, managed indexes and triggers on an existing database.
+
+connect() only creates the missing tables, columns and triggers. Building the
+indexes that an existing database misses can take a while on a full
+final.sqlite, so it is an explicit step: run this once before the extraction.
+
+Usage: python src/db/migrate.py [-d path/to/database.sqlite]
+"""
+import os
+import sys
+src_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+import argparse
+
+from sqlalchemy import create_engine, event, text
+from src.config.consts import DB_FILE
+from src.db.database import SCHEMA_VERSION, Base, create_columns, create_indexes
+from src.db.database import create_triggers, set_sqlite_pragmas
+from src.helpers.h3_utils import vprint
+
+
+def migration_engine(database):
+    """ Returns an engine of a database file that does not create the schema on connect """
+    engine = create_engine("sqlite:///{}".format(os.path.abspath(database)))
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def migrate(engine):
+    """ Creates missing tables, columns and indexes and updates the schema version.
+    Returns the created columns and indexes """
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        created = create_columns(connection) + create_indexes(connection)
+        create_triggers(connection)
+        connection.execute(text("PRAGMA user_version = {}".format(SCHEMA_VERSION)))
+        connection.execute(text("ANALYZE"))
+    return created
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Create missing columns and managed indexes on an existing database")
+    parser.add_argument("-d", "--database", type=str, default=DB_FILE,
+                        help="sqlite database file")
+    args = parser.parse_args()
+
+    engine = migration_engine(args.database)
+    created = migrate(engine)
+    engine.dispose()
+    for name in created:
+        vprint(0, "Created {}".format(name))
+    vprint(0, "Schema version {}. {} columns and indexes created.".format(SCHEMA_VERSION, len(created)))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,11 @@ import argparse
 import src.config.consts as consts
 
 from src.db.database import connect, NotebookMarkdown, Cell
-from src.db.database import Module
+from src.db.database import Module, DataIO, bulk_insert
 from src.helpers.h2_script_helpers import set_up_argument_parser
 from src.helpers.h3_utils import vprint, check_exit, savepid
 from src.classes.c2_status_logger import StatusLogger
-from src.helpers.h4_filters import filter_notebooks
+from src.helpers.h4_filters import filter_notebooks, release
 from src.helpers.h6_aggregation_helpers import calculate_markdown, calculate_modules
 from src.helpers.h6_aggregation_helpers import calculate_data_ios,  load_repository
 from src.config.states import *
@@ -67,7 +67,7 @@ def process_notebook(session, notebook, retry=False):
 
     session.add(NotebookMarkdown(**agg_markdown))
     session.add(Module(**agg_modules))
-    session.add_all(data_ios)
+    bulk_insert(session, DataIO, data_ios)
 
     notebook.state = NB_AGGREGATED
     session.add(notebook)
@@ -82,9 +82,10 @@ def apply(
     """Aggregate Notebook features"""
 
     query = filter_notebooks(session=session, selected_repositories=selected_repositories,
-                             count=count, interval=interval, reverse=reverse)
+                             count=count, interval=interval, reverse=reverse, stream_rows=True)
 
     repository_id = None
+    processed = []
 
     for notebook in query:
         if check_exit(check):
@@ -93,10 +94,15 @@ def apply(
             return
         status.report()
 
-        repository_id = load_repository(session, notebook, repository_id)
+        current_id = load_repository(session, notebook, repository_id)
+        if current_id != repository_id:
+            release(session, processed)
+            processed = []
+        repository_id = current_id
 
         vprint(1, 'Processing notebook: {}'.format(notebook))
         result = process_notebook(session, notebook, retry)
+        processed.append(notebook)
         vprint(1, result)
         status.count += 1
     session.commit()
@@ -10,11 +10,11 @@ import argparse
 import src.config.consts as consts
 
 from src.db.database import connect
-from src.db.database import Module
+from src.db.database import Module, DataIO, bulk_insert
 from src.helpers.h2_script_helpers import set_up_argument_parser
 from src.helpers.h3_utils import vprint, check_exit, savepid
 from src.classes.c2_status_logger import StatusLogger
-from src.helpers.h4_filters import filter_python_files
+from src.helpers.h4_filters import filter_python_files, release
 from src.helpers.h6_aggregation_helpers import calculate_modules, load_repository
 from src.helpers.h6_aggregation_helpers import calculate_data_ios
 from src.config.states import *
@@ -31,7 +31,7 @@ def process_python_file(session, python_file):
     data_ios = calculate_data_ios(python_file, TYPE)
 
     session.add(Module(**agg_modules))
-    session.add_all(data_ios)
+    bulk_insert(session, DataIO, data_ios)
 
     python_file.state = PF_AGGREGATED
     session.add(python_file)
@@ -48,10 +48,12 @@ def apply(
     query = filter_python_files(
         session=session, selected_python_files=False,
         selected_repositories=selected_repositories,
-        count=count, interval=interval, reverse=reverse
+        count=count, interval=interval, reverse=reverse,
+        stream_rows=True
     )
 
     repository_id = None
+    processed = []
 
     for python_file in query:
         if check_exit(check):
@@ -60,10 +62,15 @@ def apply(
             return
         status.report()
 
-        repository_id = load_repository(session, python_file, repository_id)
+        current_id = load_repository(session, python_file, repository_id)
+        if current_id != repository_id:
+            release(session, processed)
+            processed = []
+        repository_id = current_id
 
         vprint(1, 'Processing Python File: {}'.format(python_file))
         result = process_python_file(session, python_file)
+        processed.append(python_file)
         vprint(1, result)
         status.count += 1
     session.commit()
@@ -7,57 +7,61 @@ if src_path not in sys.path:
     sys.path.append(src_path)
 
 import argparse
+import pickle
+import tempfile
 import src.config.consts as consts
 
-from src.db.database import Commit, connect
-from src.helpers.h1_git_helpers import git, extract_hash_parts, git_output, format_commit, remove_repo_and_prepare
+from concurrent.futures import ThreadPoolExecutor
+from src.db.database import Commit, connect, bulk_insert
+from src.helpers.h1_git_helpers import git, extract_hash_parts, git_output, git_lines
+from src.helpers.h1_git_helpers import format_log_line, remove_repo_and_prepare
 from src.helpers.h3_utils import savepid, vprint, check_exit
 from src.classes.c2_status_logger import StatusLogger
 from src.classes.c1_safe_session import SafeSession
-from src.helpers.h2_script_helpers import set_up_argument_parser
+from src.helpers.h2_script_helpers import set_up_argument_parser, add_backend_argument
 from src.helpers.h4_filters import filter_repositories
+from src.helpers.h13_file_inventory import clear_inventory
 
 from src.config.states import REP_LOADED, REP_EMPTY, REP_STOPPED
 from src.config.states import REP_FAILED_TO_CLONE, REP_UNAVAILABLE_FILES
 from src.config.states import REP_ORDER, REP_ERRORS, states_after
 
 
-def load_commits(full_dir):
-    commits_info = []
+def load_commits(full_dir, commit=None):
+    """ Streams commits and merges from a single git log pass.
+    The log starts at commit, or at HEAD without it """
+    args = ["--git-dir", str(full_dir / ".git"), 'log',
+            '--pretty=format:%ci$_$%h$_$%an$_$%p$_$%s']
+    if commit is not None:
+        args.append(commit)
 
     try:
-        args = ["--git-dir", str(full_dir / ".git"), 'log',
-                '--no-merges', '--pretty=format:%ci$_$%h$_$%an$_$%s']
-
-        git_log_commits = git_output(*args).decode("utf-8")
-
-        if git_log_commits:
-            git_log_commits = git_log_commits.split("\n")
-            git_log_commits = [x for x in git_log_commits if x != ""]
-
-            for commit_ in git_log_commits:
-                commit_row = format_commit(commit_, "commit")
-                commits_info.append(commit_row)
-
-        args = ["--git-dir", str(full_dir / ".git"),
-                'log', '--merges', '--pretty=format:%ci$_$%h$_$%an$_$%s']
-        git_log_merges = git_output(*args).decode("utf-8")
-
-        if git_log_merges:
-            git_log_merges = git_log_merges.split("\n")
-            git_log_merges = [y for y in git_log_merges if y != ""]
-            for merges_ in git_log_merges:
-                merge_row = format_commit(merges_, "merge")
-                commits_info.append(merge_row)
+        for line in git_lines(*args):
+            if line:
+                yield format_log_line(line)
 
     except Exception as err:
         raise EnvironmentError("Load commits failed. Error:{}".format(err))
 
-    return commits_info
 
+def clone_options(mode):
+    """ Returns git clone options of a clone mode """
+    if mode == "partial":
+        return ["--filter=blob:none"]
+    elif mode == "shallow":
+        return ["--depth", str(consts.CLONE_DEPTH), "--no-single-branch"]
+    return []
 
-def clone(part, end, repo, remote, branch=None, commit=None):
-    """Clone git repository into a proper directory"""
+
+def clone(part, end, repo, remote, branch=None, commit=None, mode=None):
+    """Clone git repository into a proper directory
+
+    The commits are returned as a lazy iterator, so the log is only read while saving.
+    Shallow clones only load the commits inside the clone depth.
+    The git extraction backend reads files from git objects, so it skips the checkout.
+    """
+    checkout = consts.EXTRACTION_BACKEND != "git"
+    mode = mode or consts.CLONE_MODE
     part_dir = consts.SELECTED_REPOS_DIR / "content" / part
     part_dir.mkdir(parents=True, exist_ok=True)
     full_dir = part_dir / end
@@ -67,7 +71,9 @@ def clone(part, end, repo, remote, branch=None, commit=None):
                   "Delete it if you would like to re-run.")
         return full_dir, None, True
     else:
-        args = ["clone"]
+        args = ["clone"] + clone_options(mode)
+        if not checkout:
+            args.append("--no-checkout")
         args += [remote, str(full_dir)]
 
         if branch is not None:
@@ -79,6 +85,22 @@ def clone(part, end, repo, remote, branch=None, commit=None):
 
         if commit is not None:
 
+            if mode == "shallow":
+                args = [
+                    "--git-dir", str(full_dir / ".git"),
+                    "fetch", "--depth", str(consts.CLONE_DEPTH),
+                    "origin", commit
+                ]
+
+                if git(*args) != 0:
+                    raise EnvironmentError(
+                        "Fetch failed for {}/{}".format(repo, commit)
+                    )
+
+            if not checkout:
+                commits = load_commits(full_dir, commit)
+                return full_dir, commits, False
+
             args = [
                 "--git-dir", str(full_dir / ".git"),
                 "--work-tree", str(full_dir),
@@ -95,50 +117,131 @@ def clone(part, end, repo, remote, branch=None, commit=None):
         return full_dir, commits, False
 
 
-def load_repository_and_commits(session, repository,  commit=None, branch=None, retry=False):
-    """ Clones repository and extracts its information"""
-
-    repo = repository.repository
+def download_repository(repo, commit=None, branch=None):
+    """ Clones repository and loads its commits without touching the database """
     part, end = extract_hash_parts(repo)
     remote = "https://github.com/{}.git".format(repo)
 
+    vprint(1, "Remote: {}\nDownloading repository...".format(remote))
+
+    full_dir, repo_commits, already_exists = clone(part, end, repo, remote, branch, commit)
+
+    revision = "HEAD"
+    if commit is not None and consts.EXTRACTION_BACKEND == "git":
+        revision = "{}^{{commit}}".format(commit)
+    commit = git_output("rev-parse", revision, cwd=str(full_dir)).decode("utf-8").strip()
+    return part, end, commit, repo_commits, already_exists
+
+
+def save_commits(session, repository, repo_commits, batch_size=None):
+    """ Saves commits in batches while the repository is marked as stopped.
+
+    Commits from a previous interrupted attempt are removed first.
+    Returns the number of saved commits.
+    """
+    batch_size = batch_size or consts.COMMIT_BATCH_SIZE
+    state = repository.state
+    repository.state = REP_STOPPED
+    session.add(repository)
+    session.query(Commit).filter(Commit.repository_id == repository.id).delete()
+
+    count = 0
+    batch = []
+    for commitrow in repo_commits:
+        commitrow["repository_id"] = repository.id
+        batch.append(commitrow)
+        if len(batch) >= batch_size:
+            count += bulk_insert(session, Commit, batch)
+            session.commit()
+            batch = []
+
+    count += bulk_insert(session, Commit, batch)
+
+    repository.state = state
+    session.add(repository)
+    return count
+
+
+def save_repository_and_commits(session, repository, downloaded):
+    """ Saves a downloaded repository and its commits """
+    part, end, commit, repo_commits, already_exists = downloaded
+
+    if not already_exists or repository.commit != commit:
+        clear_inventory(session, repository)
+    if not already_exists:
+        repository.backend = consts.EXTRACTION_BACKEND
+
+    repository.hash_dir1 = part
+    repository.hash_dir2 = end
+    repository.commit = commit
+    repository.state = REP_LOADED
+
+    if already_exists:
+        session.add(repository)
+    elif not repo_commits or not save_commits(session, repository, repo_commits):
+        repository.state = REP_EMPTY
+        session.add(repository)
+
+
+def save_clone_failure(session, repository, err):
+    """ Marks repository as failed to clone """
+    vprint(0, 'Failed to download repository {} due to {}'
+           .format(repository, err))
+    repository.state = REP_FAILED_TO_CLONE
+    session.add(repository)
+
+
+def load_repository_and_commits(session, repository,  commit=None, branch=None, retry=False):
+    """ Clones repository and extracts its information"""
+
     if repository.commit and not retry:
         vprint(1, "Repository {} already loaded".format(repository))
         return
 
     try:
-        vprint(1, "Remote: {}\nDownloading repository...".format(remote))
+        downloaded = download_repository(repository.repository, commit, branch)
+        save_repository_and_commits(session, repository, downloaded)
+    except Exception as err:
+        save_clone_failure(session, repository, err)
 
-        full_dir, repo_commits, already_exists = clone(part, end, repo, remote, branch, commit)
 
-        commit = git_output("rev-parse", "HEAD", cwd=str(full_dir)).decode("utf-8").strip()
+def spool_commits(repo_commits):
+    """ Reads the commits in the clone pool worker, so git log runs there instead of in the writer.
+    They are kept in a temporary file and streamed back to save_commits """
+    spool = tempfile.TemporaryFile()
+    for commitrow in repo_commits:
+        pickle.dump(commitrow, spool)
+    spool.seek(0)
+    return read_spool(spool)
 
-        repository.hash_dir1 = part
-        repository.hash_dir2 = end
-        repository.commit = commit
-        repository.state = REP_LOADED
 
-        if already_exists:
-            session.add(repository)
-        elif repo_commits:
-            session.dependent_add(
-                repository, [Commit(**commitrow) for commitrow in repo_commits], "repository_id"
-            )
-        else:
-            repository.state = REP_EMPTY
-            session.add(repository)
+def read_spool(spool):
+    """ Yields the commits of spool_commits """
+    with spool:
+        while True:
+            try:
+                yield pickle.load(spool)
+            except EOFError:
+                return
+
+
+def fetch_repository(repo, commit=None, branch=None):
+    """ Worker task of the clone pool. Returns the download or the error that prevented it """
+    try:
+        part, end, commit, repo_commits, already_exists = download_repository(repo, commit, branch)
+        if repo_commits is not None:
+            repo_commits = spool_commits(repo_commits)
+        return (part, end, commit, repo_commits, already_exists), None
     except Exception as err:
-        vprint(0, 'Failed to download repository {} due to {}'
-               .format(repository, err))
-        repository.state = REP_FAILED_TO_CLONE
-        session.add(repository)
+        return None, err
 
 
-def process_repository(session, repository, branch=None, commit=None, retry=False):
-    """ Processes repository """
+def check_repository(session, repository, commit=None, retry=False):
+    """ Checks if repository must be downloaded, preparing it to be downloaded again on retry """
 
     if retry:
-        if repository.state == REP_UNAVAILABLE_FILES:
+        if repository.state in (REP_UNAVAILABLE_FILES, REP_STOPPED):
+            # REP_STOPPED: the commits of an interrupted save are incomplete
             vprint(3, "redownloading {}".format(repository))
             commit = remove_repo_and_prepare(session, repository)
         elif retry and repository.state == REP_FAILED_TO_CLONE:
@@ -148,6 +251,16 @@ def process_repository(session, repository, branch=None, commit=None, retry=Fals
     if not retry and (repository.state == REP_LOADED \
                       or repository.state in REP_ERRORS\
                       or repository.state in states_after(REP_LOADED, REP_ORDER)):
+        return False, commit
+
+    return True, commit
+
+
+def process_repository(session, repository, branch=None, commit=None, retry=False):
+    """ Processes repository """
+
+    to_download, commit = check_repository(session, repository, commit=commit, retry=retry)
+    if not to_download:
         return "already downloaded"
 
     load_repository_and_commits(
@@ -158,8 +271,76 @@ def process_repository(session, repository, branch=None, commit=None, retry=Fals
     return "done"
 
 
+def apply_parallel(session, status, query, retry, check, branch, commit, jobs):
+    """ Downloads repositories in a pool of workers.
+
+    Workers only run git, clone and log, so every database write still happens in this thread
+    in the same order of the query, keeping SafeSession.dependent_add semantics.
+    """
+    pending = []
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for repository in query:
+            to_download, repository_commit = check_repository(
+                session, repository, commit=commit, retry=retry
+            )
+
+            if not to_download:
+                pending.append((repository, None, "already downloaded"))
+            elif repository.commit and not retry:
+                vprint(1, "Repository {} already loaded".format(repository))
+                pending.append((repository, None, "done"))
+            else:
+                future = executor.submit(
+                    fetch_repository, repository.repository, repository_commit, branch
+                )
+                pending.append((repository, future, "done"))
+
+        for index, (repository, future, result) in enumerate(pending):
+
+            if check_exit(check):
+                vprint(0, "Found .exit file. Exiting")
+                finish_started(session, pending[index:])
+                return
+
+            status.report()
+            vprint(0, "Downloading repository {} from {}."
+                   .format(repository, repository.domain))
+
+            if future is not None:
+                save_download(session, repository, future)
+
+            vprint(0, result)
+
+            status.count += 1
+            session.commit()
+
+
+def save_download(session, repository, future):
+    """ Saves the result of a fetch_repository task """
+    downloaded, err = future.result()
+    try:
+        if err is not None:
+            raise err
+        save_repository_and_commits(session, repository, downloaded)
+    except Exception as err:
+        save_clone_failure(session, repository, err)
+
+
+def finish_started(session, pending):
+    """ Cancels the downloads that did not start and saves the ones that did.
+    A clone left without its commits would be taken as already downloaded by the next run """
+    started = [
+        (repository, future) for repository, future, _ in pending
+        if future is not None and not future.cancel()
+    ]
+    for repository, future in started:
+        save_download(session, repository, future)
+        session.commit()
+
+
 def apply(session, status, selected_repositories, retry, count,
-          interval, reverse, check, branch, commit):
+          interval, reverse, check, branch, commit, jobs=1):
 
     query = filter_repositories(
         session=session,
@@ -168,6 +349,9 @@ def apply(session, status, selected_repositories, retry, count,
         interval=interval, reverse=reverse
     )
 
+    if jobs > 1:
+        return apply_parallel(session, status, query, retry, check, branch, commit, jobs)
+
     for repository in query:
 
         if check_exit(check):
@@ -198,13 +382,21 @@ def main():
 
     parser = argparse.ArgumentParser(description="Download Repository via URL")
     parser = set_up_argument_parser(parser, script_name)
+    parser = add_backend_argument(parser)
     parser.add_argument("-br", "--branch", type=str,
                         help="specific branch")
     parser.add_argument("-ct", "--commit", type=str,
                         help="specific commit")
+    parser.add_argument("-j", "--jobs", type=int, default=consts.DOWNLOAD_JOBS,
+                        help="number of repositories downloaded at the same time")
+    parser.add_argument("-m", "--clone-mode", type=str, default=consts.CLONE_MODE,
+                        choices=["full", "partial", "shallow"],
+                        help="full history, blobless (partial) or shallow clones")
 
     args = parser.parse_args()
     consts.VERBOSE = args.verbose
+    consts.CLONE_MODE = args.clone_mode
+    consts.EXTRACTION_BACKEND = args.backend
 
     status = None
 
@@ -223,7 +415,8 @@ def main():
             reverse=args.reverse,
             check=set(args.check),
             branch=args.branch,
-            commit=args.commit
+            commit=args.commit,
+            jobs=args.jobs
         )
 
 
@@ -7,16 +7,19 @@ if src_path not in sys.path:
     sys.path.append(src_path)
 
 import argparse
-import nbformat as nbf
+
+from functools import partial
 import src.config.consts as consts
 
-from IPython.core.interactiveshell import InteractiveShell
 from src.db.database import Cell, Notebook, connect
 from src.helpers.h3_utils import savepid, unzip_repository, cell_output_formats
 from src.classes.c1_safe_session import SafeSession
-from src.helpers.h3_utils import timeout, find_files, TimeoutError, vprint
+from src.helpers.h3_utils import TimeoutError, vprint
+from src.helpers.h13_file_inventory import inventory_files, inventory_blobs, open_file
+from src.helpers.h12_notebook_reader import read_notebook
+from src.classes.c6_worker_pool import WorkerPool, run_inline
 from src.classes.c2_status_logger import StatusLogger
-from src.helpers.h2_script_helpers import apply, set_up_argument_parser
+from src.helpers.h2_script_helpers import apply, set_up_argument_parser, add_backend_argument
 
 from src.config.states import NB_LOADED, NB_LOAD_ERROR, NB_STOPPED
 from src.config.states import NB_LOAD_FORMAT_ERROR, NB_LOAD_TIMEOUT
@@ -27,8 +30,24 @@ from src.config.states import REP_N_EXTRACTED, REP_ORDER, REP_ERRORS
 from src.config.states import states_after, states_before
 
 
+TRANSFORMER = None
+
+
+def transform_cell(source):
+    """ Converts IPython syntax (magics, !shell, help) into python code.
+
+    Uses a single TransformerManager per process instead of booting an
+    InteractiveShell, which only adds history and profile setup to e2.
+    IPython is imported on the first cell, so --count does not load it.
+    """
+    global TRANSFORMER  # pylint: disable=global-statement
+    if TRANSFORMER is None:
+        from IPython.core.inputtransformer2 import TransformerManager
+        TRANSFORMER = TransformerManager()
+    return TRANSFORMER.transform_cell(source)
+
+
 def load_cells(repository_id, nbrow, notebook, status):
-    shell = InteractiveShell.instance()
     is_python = nbrow["language"] == "python"
     is_unknown_version = nbrow["language_version"] == "unknown"
 
@@ -54,7 +73,7 @@ def load_cells(repository_id, nbrow, notebook, status):
             source = cell["source"] = cell["source"] or ""
             if is_python and cell.get("cell_type") == "code":
                 try:
-                    source = shell.input_transformer_manager.transform_cell(source)
+                    source = transform_cell(source)
                 except (IndentationError, SyntaxError) as err:
                     vprint(3, "Error on cell transformation: {}".format(err))
                     source = ""
@@ -99,22 +118,24 @@ def load_cells(repository_id, nbrow, notebook, status):
     return nbrow, cells_info, exec_count, status
 
 
-@timeout(5 * 60, use_signals=False)
-def load_notebook(repository_id, path, notebook_file, nbrow):
-    """ Extract notebook information and cells from notebook """
+def load_notebook(repository_id, path, notebook_file, nbrow, blob=None):
+    """ Extract notebook information and cells from notebook.
+    Outputs are read without their payloads, since cells only use their formats.
+    Notebooks with a blob are streamed from git instead of the working tree """
     # pylint: disable=too-many-locals
-
     status = NB_LOADED
 
     try:
-        with open(str(path / notebook_file)) as ofile:
-            notebook = nbf.read(ofile, nbf.NO_CONVERT)
+        with open_file(path, notebook_file, blob) as ofile:
+            notebook = read_notebook(ofile, fast_path=consts.NOTEBOOK_FAST_PATH)
 
         nbrow["nbformat"] = "{0[nbformat]}".format(notebook)
 
         if "nbformat_minor" in notebook:
             nbrow["nbformat"] += ".{0[nbformat_minor]}".format(notebook)
-        notebook = nbf.convert(notebook, 4)
+        if notebook.get("nbformat") != 4:
+            import nbformat as nbf
+            notebook = nbf.convert(notebook, 4)
         metadata = notebook["metadata"]
 
     except OSError as e:
@@ -149,22 +170,59 @@ def load_notebook(repository_id, path, notebook_file, nbrow):
     return nbrow, cells_info
 
 
-def process_notebooks(session, repository, repository_notebooks_names):
+def new_nbrow(repository, name):
+    """ Notebook row before loading """
+    return {
+        "repository_id": repository.id,
+        "name": name,
+        "nbformat": 0,
+        "kernel": "no-kernel",
+        "language": "unknown",
+        "language_version": "unknown",
+        "max_execution_count": 0,
+        "total_cells": 0,
+        "code_cells": 0,
+        "code_cells_with_output": 0,
+        "markdown_cells": 0,
+        "raw_cells": 0,
+        "unknown_cell_formats": 0,
+        "empty_cells": 0,
+        "state": NB_LOADED,
+    }
+
+
+def load_notebooks(repository, to_load, pool=None, blobs=None):
+    """ Loads notebooks in the worker pool, yielding (success, result) in order.
+    Without a pool, notebooks are loaded in this process without timeout """
+    blobs = blobs or {}
+    tasks = [
+        (repository.id, repository.path, name, nbrow, blobs.get(name))
+        for name, nbrow in to_load
+    ]
+    if pool is None:
+        return run_inline(load_notebook, tasks)
+    return pool.imap(load_notebook, tasks, consts.NOTEBOOK_TIMEOUT)
+
+
+def process_notebooks(session, repository, repository_notebooks_names, pool=None):
     count = 0
+    loaded = 0
+    to_load = []
+    existing = {
+        notebook.name: notebook for notebook in
+        session.query(Notebook).filter(Notebook.repository_id == repository.id)
+    }
+
     for name in repository_notebooks_names:
         if not name:
             continue
         count += 1
 
-        notebook = session.query(Notebook).filter(
-            Notebook.repository_id == repository.id,
-            Notebook.name == name,
-        ).first()
+        notebook = existing.get(name)
 
         if notebook is not None:
             if notebook.state == NB_STOPPED:
                 session.delete(notebook)
-                session.commit()
             else:
                 if notebook.state == NB_GENERIC_LOAD_ERROR:
                     count -= 1
@@ -182,35 +240,30 @@ def process_notebooks(session, repository, repository_notebooks_names):
                 vprint(2, msg)
                 return "failed"
 
+        to_load.append((name, new_nbrow(repository, name)))
+
+    results = load_notebooks(repository, to_load, pool, inventory_blobs(session, repository))
+    for (name, nbrow), (success, result) in zip(to_load, results):
         try:
             vprint(2, "Loading notebook {}".format(name))
-            nbrow = {
-                "repository_id": repository.id,
-                "name": name,
-                "nbformat": 0,
-                "kernel": "no-kernel",
-                "language": "unknown",
-                "language_version": "unknown",
-                "max_execution_count": 0,
-                "total_cells": 0,
-                "code_cells": 0,
-                "code_cells_with_output": 0,
-                "markdown_cells": 0,
-                "raw_cells": 0,
-                "unknown_cell_formats": 0,
-                "empty_cells": 0,
-                "state": NB_LOADED,
-            }
-            try:
-                nbrow, cells = load_notebook(repository.id, repository.path, name, nbrow)
-            except TimeoutError:
+            if success:
+                nbrow, cells = result
+            elif isinstance(result, TimeoutError):
                 nbrow["state"] = NB_LOAD_TIMEOUT
                 cells = []
+            else:
+                raise result
             nbrow["state"] = NB_STOPPED
             notebook = Notebook(**nbrow)
-            session.dependent_add(
-                notebook, [Cell(**cellrow) for cellrow in cells], "notebook_id"
-            )
+            session.dependent_bulk_add(notebook, Cell, cells, "notebook_id")
+
+            loaded += 1
+            if loaded % consts.FILE_BATCH_SIZE == 0:
+                status, err = session.commit()
+                if not status:
+                    repository.state = REP_N_ERROR
+                    session.add(repository)
+                    vprint(1, "Failed to save notebooks due {!r}".format(err))
 
         except Exception as err:  # pylint: disable=broad-except
             repository.state = REP_N_ERROR
@@ -235,7 +288,7 @@ def find_notebooks(session, repository):
             session.commit()
             return notebooks
 
-    files = find_files(repository.path, "*.ipynb")
+    files = inventory_files(session, repository, "notebook")
     for file in files:
         if ".ipynb_checkpoints" not in str(file):
             notebooks.append(str(file.relative_to(repository.path)))
@@ -245,7 +298,7 @@ def find_notebooks(session, repository):
     return notebooks
 
 
-def process_repository(session, repository, retry=False):
+def process_repository(session, repository, retry=False, pool=None):
     """ Processes repository """
 
     if retry and repository.state == REP_N_ERROR:
@@ -263,7 +316,7 @@ def process_repository(session, repository, retry=False):
     repository_notebooks_names = find_notebooks(session, repository)
 
     if repository.state is not REP_UNAVAILABLE_FILES:
-        count, repository = process_notebooks(session, repository, repository_notebooks_names)
+        count, repository = process_notebooks(session, repository, repository_notebooks_names, pool)
 
         if repository.state != REP_N_ERROR and count == repository.notebooks_count:
             repository.state = REP_N_EXTRACTED
@@ -289,16 +342,23 @@ def main():
 
     parser = argparse.ArgumentParser(description="Extract notebooks from registered repositories")
     parser = set_up_argument_parser(parser, script_name)
+    parser = add_backend_argument(parser)
+    parser.add_argument("-w", "--workers", type=int, default=consts.NOTEBOOK_WORKERS,
+                        help="processes loading notebooks (0 loads them in this process)")
+    parser.add_argument("--nbformat", action="store_true",
+                        help="load all notebooks through nbformat, without the nbformat 4 fast path")
     args = parser.parse_args()
 
     consts.VERBOSE = args.verbose
+    consts.EXTRACTION_BACKEND = args.backend
+    consts.NOTEBOOK_FAST_PATH = not args.nbformat
     status = None
 
     if not args.count:
         status = StatusLogger(script_name)
         status.report()
 
-    with connect() as session, savepid():
+    with connect() as session, savepid(), WorkerPool(args.workers, consts.NOTEBOOK_TIMEOUT) as pool:
         apply(
             session=SafeSession(session, interrupted=NB_STOPPED),
             status=status,
@@ -308,7 +368,7 @@ def main():
             interval=args.interval,
             reverse=args.reverse,
             check=set(args.check),
-            process_repository=process_repository,
+            process_repository=partial(process_repository, pool=pool),
             model_type='notebooks/cells'
         )
 
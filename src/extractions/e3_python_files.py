@@ -12,8 +12,9 @@ import src.config.consts as consts
 from src.db.database import PythonFile, connect
 from src.helpers.h3_utils import vprint, savepid
 from src.classes.c2_status_logger import StatusLogger
-from src.helpers.h3_utils import find_files, unzip_repository
-from src.helpers.h2_script_helpers import apply, set_up_argument_parser
+from src.helpers.h3_utils import unzip_repository
+from src.helpers.h13_file_inventory import inventory_files, inventory_blobs, open_file
+from src.helpers.h2_script_helpers import apply, set_up_argument_parser, add_backend_argument
 
 from src.config.states import PF_LOADED, PF_EMPTY, PF_L_ERROR
 from src.config.states import REP_PF_EXTRACTED, REP_UNAVAILABLE_FILES
@@ -34,7 +35,7 @@ def find_python_files(session, repository):
             session.commit()
             return python_files
 
-    files = find_files(repository.path, "*.py")
+    files = inventory_files(session, repository, "python")
     excluded_keywords = ["venv", "site-packages", "CorePython", "conda", "setup.py"]
 
     for file in files:
@@ -46,22 +47,25 @@ def find_python_files(session, repository):
 
 
 def process_python_files(session, repository, python_files_names, count):
+    existing = {
+        python_file.name: python_file for python_file in
+        session.query(PythonFile).filter(PythonFile.repository_id == repository.id)
+    }
+    blobs = inventory_blobs(session, repository)
 
     for name in python_files_names:
         if not name:
             continue
 
         count += 1
+        if count % consts.FILE_BATCH_SIZE == 0:
+            session.commit()
 
-        python_file = session.query(PythonFile).filter(
-            PythonFile.repository_id == repository.id,
-            PythonFile.name == name,
-        ).first()
+        python_file = existing.get(name)
 
         if python_file is not None:
             if python_file.state == PF_L_ERROR:
                 session.delete(python_file)
-                session.commit()
             else:
                 vprint(2, "Python File already processed")
                 continue
@@ -69,13 +73,10 @@ def process_python_files(session, repository, python_files_names, count):
         try:
             vprint(3, "Loading python file {}".format(name))
 
-            file_path = str(repository.path) + os.sep + name
-
-            with open(file_path) as f:
+            with open_file(repository.path, name, blobs.get(name)) as f:
                 source = f.read()
 
-            with open(file_path) as f:
-                total = len(f.readlines())
+            total = source.count("\n") + (1 if source and not source.endswith("\n") else 0)
 
             if total == 0:
                 pf_state = PF_EMPTY
@@ -91,7 +92,6 @@ def process_python_files(session, repository, python_files_names, count):
             )
 
             session.add(python_file)
-            session.commit()
         except Exception as err:
 
             vprint(1, "Failed to load python file {} due {!r}".format(name, err))
@@ -103,7 +103,6 @@ def process_python_files(session, repository, python_files_names, count):
                 state=PF_L_ERROR
             )
             session.add(python_file)
-            session.commit()
 
     return count
 
@@ -142,9 +141,11 @@ def main():
     parser = argparse.ArgumentParser(
         description="Extract requirement files from registered repositories")
     parser = set_up_argument_parser(parser, script_name)
+    parser = add_backend_argument(parser)
     args = parser.parse_args()
 
     consts.VERBOSE = args.verbose
+    consts.EXTRACTION_BACKEND = args.backend
     status = None
 
     if not args.count:
@@ -12,8 +12,10 @@ import src.config.consts as consts
 from src.db.database import RequirementFile, connect
 from src.helpers.h3_utils import vprint, savepid
 from src.classes.c2_status_logger import StatusLogger
-from src.helpers.h3_utils import find_files_in_path, unzip_repository
-from src.helpers.h2_script_helpers import apply, set_up_argument_parser
+from src.helpers.h3_utils import unzip_repository
+from src.helpers.h13_file_inventory import inventory_files, inventory_blobs, open_file
+from src.helpers.h13_file_inventory import REQUIREMENT_KINDS
+from src.helpers.h2_script_helpers import apply, set_up_argument_parser, add_backend_argument
 
 from src.config.states import REQ_FILE_LOADED, REQ_FILE_L_ERROR, REQ_FILE_EMPTY
 from src.config.states import REP_REQ_FILE_EXTRACTED, REP_PF_EXTRACTED
@@ -34,8 +36,10 @@ def find_requirements(session, repository):
             session.commit()
             return setups, requirements, pipfiles, pipfile_locks
 
-    setups, requirements, pipfiles, pipfile_locks = find_files_in_path(
-        repository.path, ["setup.py", "requirements.txt", "Pipfile", "Pipfile.lock"])
+    setups, requirements, pipfiles, pipfile_locks = [
+        [file.relative_to(repository.path) for file in inventory_files(session, repository, kind)]
+        for kind in REQUIREMENT_KINDS
+    ]
 
     repository.setups_count = len(setups)
     repository.requirements_count = len(requirements)
@@ -48,7 +52,17 @@ def find_requirements(session, repository):
 
 
 def process_requirement_files(session, repository, req_names, reqformat):
-    """ Processes a requirement file """
+    """ Processes requirement files of a format """
+    existing = {
+        requirement_file.name: requirement_file for requirement_file in
+        session.query(RequirementFile).filter(
+            RequirementFile.repository_id == repository.id,
+            RequirementFile.reqformat == reqformat,
+        )
+    }
+    blobs = inventory_blobs(session, repository)
+    loaded = 0
+
     for item in req_names:
         name = str(item)
 
@@ -58,15 +72,15 @@ def process_requirement_files(session, repository, req_names, reqformat):
         if any(keyword in name for keyword in excluded_keywords):
             continue
 
-        requirement_file = session.query(RequirementFile).filter(
-            RequirementFile.repository_id == repository.id,
-            RequirementFile.name == name,
-        ).first()
+        loaded += 1
+        if loaded % consts.FILE_BATCH_SIZE == 0:
+            session.commit()
+
+        requirement_file = existing.get(name)
 
         if requirement_file is not None:
             if requirement_file.state == REQ_FILE_L_ERROR:
                 session.delete(requirement_file)
-                session.commit()
             else:
                 vprint(2, "Python File already processed")
                 continue
@@ -74,7 +88,7 @@ def process_requirement_files(session, repository, req_names, reqformat):
         try:
             vprint(2, "Loading requirement {}".format(name))
 
-            with open(str(repository.path / name), "rb") as ofile:
+            with open_file(repository.path, name, blobs.get(name), "rb") as ofile:
                 content = ofile.read()
 
             if len(content) == 0:
@@ -101,7 +115,6 @@ def process_requirement_files(session, repository, req_names, reqformat):
                 state=REQ_FILE_LOADED,
             )
             session.add(requirement_file)
-            session.commit()
 
         except ValueError as err:
             vprint(1, "Requirement {} {!r}".format(name, err))
@@ -112,7 +125,6 @@ def process_requirement_files(session, repository, req_names, reqformat):
                 state=REQ_FILE_EMPTY,
             )
             session.add(requirement_file)
-            session.commit()
 
         except Exception as err:
             vprint(1, "Failed to load requirement {} due {!r}".format(name, err))
@@ -124,7 +136,6 @@ def process_requirement_files(session, repository, req_names, reqformat):
                 state=REQ_FILE_L_ERROR,
             )
             session.add(requirement_file)
-            session.commit()
 
 
 def process_repository(session, repository):
@@ -161,9 +172,11 @@ def main():
 
     parser = argparse.ArgumentParser(description="Extract requirement files from registered repositories")
     parser = set_up_argument_parser(parser, script_name)
+    parser = add_backend_argument(parser)
     args = parser.parse_args()
 
     consts.VERBOSE = args.verbose
+    consts.EXTRACTION_BACKEND = args.backend
     status = None
 
     if not args.count:
@@ -9,54 +9,99 @@ if src_path not in sys.path:
 import argparse
 import src.config.consts as consts
 
-from langdetect import detect
-from nltk.corpus import stopwords
-from nbconvert.filters.markdown_mistune import MarkdownWithMath
-from src.db.database import CellMarkdownFeature, connect
+from functools import partial
+
+from src.db.database import Cell, CellMarkdownFeature, connect, bulk_insert
 from src.helpers.h3_utils import vprint, check_exit, savepid
 from src.classes.c2_status_logger import StatusLogger
-from src.classes.c3_renderer import CountRenderer, LANG_MAP
 from src.helpers.h2_script_helpers import set_up_argument_parser
-from src.helpers.h4_filters import filter_markdown_cells
+from src.helpers.h4_filters import filter_markdown_cells, release, CELL_SHARD_KEYS
+from src.helpers.h11_shards import pending, plan_shards, run_shards, exit_status
 
 from src.config.states import CELL_LOADED, CELL_PROCESSED, CELL_PROCESS_ERROR
 from src.config.states import CELL_ORDER, CELL_ERRORS
 from src.config.states import states_after
 
 
+PARSER = None
+STOPWORDS = {}
+DETECTOR = None
+
+
+def markdown_parser():
+    """ Returns the MarkdownWithMath parser shared by the cells of this process.
+    Its CountRenderer is reset for each cell """
+    # Imported here to keep nbconvert and mistune out of --count
+    from nbconvert.filters.markdown_mistune import MarkdownWithMath
+    from src.classes.c3_renderer import CountRenderer
+
+    global PARSER  # pylint: disable=global-statement
+    if PARSER is None:
+        PARSER = MarkdownWithMath(renderer=CountRenderer('undetected', frozenset(), False), escape=False)
+    return PARSER
+
+
+def language_detector():
+    """ Returns the LanguageDetector shared by the cells of this process """
+    from src.classes.c8_language_detector import LanguageDetector
+
+    global DETECTOR  # pylint: disable=global-statement
+    if DETECTOR is None:
+        DETECTOR = LanguageDetector(
+            seed=consts.LANGUAGE_SEED,
+            min_letters=consts.LANGUAGE_MIN_LETTERS,
+            cache_size=consts.LANGUAGE_CACHE_SIZE
+        )
+    return DETECTOR
+
+
+def language_stopwords(language):
+    """ Returns the stopwords of a language as a frozenset, or None if nltk does not have them """
+    if language not in STOPWORDS:
+        from nltk.corpus import stopwords
+        try:
+            STOPWORDS[language] = frozenset(stopwords.words(language))
+        except Exception:  # noqa
+            STOPWORDS[language] = None
+    return STOPWORDS[language]
+
+
 def extract_features(text):
     """ Extract Features from Markdown Cells """
-    language = 'undetected'
-
+    global PARSER  # pylint: disable=global-statement
+    language = language_detector().detect(text)
+    stopwords_set = None
+    if language != 'undetected':
+        stopwords_set = language_stopwords(language)
+    using_stopwords = stopwords_set is not None
+    stopwords_set = stopwords_set or frozenset()
+
+    markdown = markdown_parser()
+    renderer = markdown.renderer
+    renderer.reset(language, stopwords_set, using_stopwords)
     try:
-        language = LANG_MAP[detect(text)]
-        stopwords_set = stopwords.words(language)
-        using_stopwords = True
-    except Exception:  # noqa
-        stopwords_set = set()
-        using_stopwords = False
-
-    renderer = CountRenderer(language, stopwords_set, using_stopwords)
-    markdown = MarkdownWithMath(renderer=renderer, escape=False)
-    markdown(text)
-
-    renderer.counter['len'] = len(text)
-    renderer.counter['lines'] = len(text.split('\n'))
+        markdown(text)
+    except Exception:
+        PARSER = None  # the parser may keep the state of the failed cell
+        raise
+
+    counter = renderer.counter
+    counter['len'] = len(text)
+    counter['lines'] = len(text.split('\n'))
     words = text.split()
-    renderer.counter['words'] = len(words)
-    renderer.counter['stopwords'] = sum(1 for word in words if word in stopwords_set)
+    counter['words'] = len(words)
+    counter['stopwords'] = sum(1 for word in words if word in stopwords_set)
 
-    renderer.counter['meaningful_lines'] = sum(
-        value for key, value in renderer.counter.items()
+    counter['meaningful_lines'] = sum(
+        value for key, value in counter.items()
         if key.endswith('_lines')
     )
 
-    return renderer.counter
-
+    return counter
 
-def process_markdown_cell(session, repository_id, notebook_id, cell, retry=False):
-    """ Processes Markdown Cells to collect features """
 
+def reset_markdown_cell(session, cell, retry=False):
+    """ Removes the features of a retried cell. Returns False if the cell was already processed """
     if retry and cell.state == CELL_PROCESS_ERROR:
         cell_markdown_features = session.query(CellMarkdownFeature).filter(
             CellMarkdownFeature.cell_id == cell.id
@@ -72,15 +117,39 @@ def process_markdown_cell(session, repository_id, notebook_id, cell, retry=False
     elif cell.state == CELL_PROCESSED \
             or cell.state in CELL_ERRORS \
             or cell.state in states_after(CELL_PROCESSED, CELL_ORDER):
+        return False
+    return True
+
+
+def notebook_markdown(session, notebook_id):
+    """ Returns the query of the markdown sources of a notebook, in order """
+    return session.query(Cell.source).filter(
+        Cell.notebook_id == notebook_id,
+        Cell.cell_type == 'markdown',
+    ).order_by(Cell.index, Cell.id)
+
+
+def cell_features(session, repository_id, notebook_id, cell):
+    """ Returns the CellMarkdownFeature row of a cell """
+    language_detector().start_notebook(
+        notebook_id, (source or '' for source, in notebook_markdown(session, notebook_id))
+    )
+    data = extract_features(cell.source)
+    data['repository_id'] = repository_id
+    data['notebook_id'] = notebook_id
+    data['cell_id'] = cell.id
+    data['index'] = cell.index
+    return data
+
+
+def process_markdown_cell(session, repository_id, notebook_id, cell, retry=False):
+    """ Processes Markdown Cells to collect features """
+
+    if not reset_markdown_cell(session, cell, retry):
         return 'already processed'
 
     try:
-        data = extract_features(cell.source)
-        data['repository_id'] = repository_id
-        data['notebook_id'] = notebook_id
-        data['cell_id'] = cell.id
-        data['index'] = cell.index
-        session.add(CellMarkdownFeature(**data))
+        session.add(CellMarkdownFeature(**cell_features(session, repository_id, notebook_id, cell)))
         cell.state = CELL_PROCESSED
         return 'done'
 
@@ -92,9 +161,40 @@ def process_markdown_cell(session, repository_id, notebook_id, cell, retry=False
         session.add(cell)
 
 
+def process_markdown_cells(session, cells, retry=False):
+    """ Processes (repository_id, notebook_id, cell) items.
+    Their features are inserted in bulk. Returns the result of each item """
+    results = []
+    rows = []
+    for repository_id, notebook_id, cell in cells:
+        if not reset_markdown_cell(session, cell, retry):
+            results.append('already processed')
+            continue
+        try:
+            rows.append(cell_features(session, repository_id, notebook_id, cell))
+            cell.state = CELL_PROCESSED
+            results.append('done')
+        except Exception as err:
+            cell.state = CELL_PROCESS_ERROR
+            results.append('Failed to process ({})'.format(err))
+        session.add(cell)
+
+    bulk_insert(session, CellMarkdownFeature, rows)
+    return results
+
+
+def process_batch(session, status, batch, retry):
+    """ Processes and counts a batch of cells. Returns the cells """
+    for (_, _, cell), result in zip(batch, process_markdown_cells(session, batch, retry)):
+        vprint(2, 'Processed cell {}: {}'.format(cell, result))
+    status.count += len(batch)
+    return [cell for _, _, cell in batch]
+
+
 def apply(session, status, selected_repositories, retry,
-          count, interval, reverse, check):
-    """Extract markdown features"""
+          count, interval, reverse, check, shard=None):
+    """Extract markdown features.
+    Cells are processed in batches of MARKDOWN_BATCH_SIZE from the same repository"""
 
     query = filter_markdown_cells(
         session=session,
@@ -102,10 +202,14 @@ def apply(session, status, selected_repositories, retry,
         count=count,
         interval=interval,
         reverse=reverse,
+        stream_rows=True,
+        shard=shard,
        )
 
     repository_id = None
     notebook_id = None
+    batch = []
+    processed = []
 
     for cell in query:
 
@@ -114,26 +218,40 @@ def apply(session, status, selected_repositories, retry,
             return
         status.report()
 
+        if repository_id != cell.repository_id or len(batch) >= consts.MARKDOWN_BATCH_SIZE:
+            processed += process_batch(session, status, batch, retry)
+            batch = []
+
         if repository_id != cell.repository_id:
             session.commit()
+            release(session, processed)
+            processed = []
             repository_id = cell.repository_id
             vprint(0, 'Processing repository: {}'.format(repository_id))
 
         if notebook_id != cell.notebook_id:
             notebook_id = cell.notebook_id
             vprint(1, 'Processing notebook: {}'.format(notebook_id))
-        vprint(2, 'Processing cell: {}'.format(cell))
+        batch.append((repository_id, notebook_id, cell))
+
+    process_batch(session, status, batch, retry)
+    session.commit()
 
-        result = process_markdown_cell(
+
+def run(args, status, shard=None):
+    """Extracts the markdown features of a shard"""
+    with connect() as session:
+        apply(
             session=session,
-            repository_id=repository_id,
-            notebook_id=notebook_id,
-            cell=cell,
-            retry=retry
+            status=status,
+            selected_repositories=args.repositories,
+            retry=True if args.retry_errors else False,
+            count=args.count,
+            interval=args.interval,
+            reverse=args.reverse,
+            check=set(args.check),
+            shard=shard
         )
-        vprint(2, result)
-        status.count += 1
-    session.commit()
 
 
 def main():
@@ -144,23 +262,27 @@ def main():
 
     args = parser.parse_args()
     consts.VERBOSE = args.verbose
-    status = None
+    consts.LANGUAGE_SEED = args.language_seed
+
+    if args.shards > 1 and not args.count:
+        with savepid():
+            with connect() as session:
+                query = filter_markdown_cells(
+                    session=session, count=False, selected_repositories=args.repositories,
+                    interval=args.interval, reverse=False
+                )
+                query = pending(query, Cell.state, CELL_PROCESSED, CELL_ORDER)
+                shards = plan_shards(query, CELL_SHARD_KEYS, Cell.source, args.shards)
+            codes = run_shards(script_name, partial(run, args), shards)
+        sys.exit(exit_status(codes))
 
+    status = None
     if not args.count:
         status = StatusLogger(script_name)
         status.report()
 
-    with connect() as session, savepid():
-        apply(
-            session=session,
-            status=status,
-            selected_repositories=args.repositories,
-            retry=True if args.retry_errors else False,
-            count=args.count,
-            interval=args.interval,
-            reverse=args.reverse,
-            check=set(args.check)
-        )
+    with savepid():
+        run(args, status)
 
 
 if __name__ == '__main__':
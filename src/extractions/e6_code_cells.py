@@ -9,6 +9,8 @@ if src_path not in sys.path:
 import argparse
 import src.config.consts as consts
 
+from functools import partial
+
 from itertools import groupby
 from future.utils.surrogateescape import register_surrogateescape
 
@@ -17,9 +19,13 @@ from src.classes.c1_safe_session import SafeSession
 from src.helpers.h3_utils import TimeoutError
 from src.helpers.h3_utils import vprint, check_exit, savepid
 from src.classes.c2_status_logger import StatusLogger
-from src.db.database import CellModule, connect, CellDataIO
+from src.classes.c6_worker_pool import WorkerPool
+from src.classes.c7_feature_cache import FeatureCache
+from src.db.database import Cell, CellModule, connect, CellDataIO, bulk_insert
 from src.helpers.h2_script_helpers import set_up_argument_parser, extract_features
-from src.helpers.h4_filters import filter_code_cells
+from src.helpers.h2_script_helpers import extract_in_pool, resolve_features, add_backend_argument
+from src.helpers.h4_filters import filter_code_cells, release, CELL_SHARD_KEYS
+from src.helpers.h11_shards import pending, plan_shards, run_shards, unpack_boundaries, exit_status
 from src.helpers.h5_loaders import load_notebook, load_repository
 
 from src.config.states import CELL_LOADED, CELL_PROCESSED, CELL_PROCESS_ERROR
@@ -28,11 +34,8 @@ from src.config.states import CELL_ORDER, CELL_ERRORS
 from src.config.states import states_after
 
 
-def process_code_cell(
-        session, repository_id, notebook_id, cell, checker,
-        retry_error=False, retry_syntax_error=False, retry_timeout=False
-):
-    """ Processes Code Cells to collect features"""
+def reset_code_cell(session, cell, retry_error=False, retry_syntax_error=False, retry_timeout=False):
+    """ Removes the features of a retried cell. Returns False if the cell was already processed """
     if (retry_error and cell.state == CELL_PROCESS_ERROR) or \
             (retry_syntax_error and cell.state == CELL_SYNTAX_ERROR) or \
             (retry_timeout and cell.state == CELL_PROCESS_TIMEOUT):
@@ -48,13 +51,29 @@ def process_code_cell(
     elif cell.state == CELL_PROCESSED \
             or cell.state in CELL_ERRORS \
             or cell.state in states_after(CELL_PROCESSED, CELL_ORDER):
+        return False
+    return True
+
+
+def process_code_cell(
+        session, repository_id, notebook_id, cell, checker,
+        retry_error=False, retry_syntax_error=False, retry_timeout=False,
+        features=None
+):
+    """ Processes Code Cells to collect features.
+    features is the (success, result) of a worker pool. Extracts inline if it is None"""
+    if not reset_code_cell(session, cell, retry_error, retry_syntax_error, retry_timeout):
         return 'already processed'
 
     try:
         vprint(2, "Extracting features")
         try:
-            modules, data_ios, \
-                extracted_args, missed_args = extract_features(cell.source, checker)
+            if features is None:
+                modules, data_ios, \
+                    extracted_args, missed_args = extract_features(cell.source, checker)
+            else:
+                modules, data_ios, \
+                    extracted_args, missed_args = resolve_features(features, checker)
         except TimeoutError:
             cell.state = CELL_PROCESS_TIMEOUT
             return 'Failed due to  Time Out Error.'
@@ -63,38 +82,35 @@ def process_code_cell(
             return 'Failed due to Syntax Error.'
 
         vprint(2, "Adding session objects")
-        for line, import_type, module_name, local in modules:
-            session.add(
-                CellModule(
-                    repository_id=repository_id,
-                    notebook_id=notebook_id,
-                    cell_id=cell.id,
-                    index=cell.index,
-
-                    line=line,
-                    import_type=import_type,
-                    module_name=module_name,
-                    local=local,
-                )
-            )
-
-        for line, caller, \
-                function_name, function_type, source, mode in data_ios:
-            session.add(
-                CellDataIO(
-                    repository_id=repository_id,
-                    notebook_id=notebook_id,
-                    cell_id=cell.id,
-                    index=cell.index,
-
-                    line=line,
-                    caller=caller,
-                    function_name=function_name,
-                    function_type=function_type,
-                    source=source,
-                    mode=mode
-                )
-            )
+        bulk_insert(session, CellModule, [
+            {
+                "repository_id": repository_id,
+                "notebook_id": notebook_id,
+                "cell_id": cell.id,
+                "index": cell.index,
+
+                "line": line,
+                "import_type": import_type,
+                "module_name": module_name,
+                "local": local,
+            } for line, import_type, module_name, local in modules
+        ])
+
+        bulk_insert(session, CellDataIO, [
+            {
+                "repository_id": repository_id,
+                "notebook_id": notebook_id,
+                "cell_id": cell.id,
+                "index": cell.index,
+
+                "line": line,
+                "caller": caller,
+                "function_name": function_name,
+                "function_type": function_type,
+                "source": source,
+                "mode": mode,
+            } for line, caller, function_name, function_type, source, mode in data_ios
+        ])
 
         cell.extracted_args = extracted_args
         cell.missed_args = missed_args
@@ -112,19 +128,17 @@ def process_code_cell(
         session.add(cell)
 
 
-def apply(
-        session, status, dispatches, selected_notebooks, selected_repositories,
-        retry_error, retry_syntax_error, retry_timeout,
-        count, interval, reverse, check
-):
-    """ Extracts code cells features """
+def commit_cells(session, chunk):
+    """ Commits the cells of a processed chunk and expunges them """
+    session.commit()
+    release(session, [cell for _, _, cell, _ in chunk])
 
-    query = filter_code_cells(
-        session=session, selected_notebooks=selected_notebooks,
-        selected_repositories=selected_repositories,
-        count=count, interval=interval, reverse=reverse
-    )
 
+def select_code_cells(
+        session, status, dispatches, query,
+        retry_error, retry_syntax_error, retry_timeout, check
+):
+    """ Yields (repository_id, notebook_id, cell, checker) for cells to process """
     skip_repo = False
     repository_id = None
     repository = None
@@ -137,10 +151,8 @@ def apply(
     for cell in query:
 
         if check_exit(check):
-            session.commit()
             vprint(0, 'Found .exit file. Exiting')
             return
-        status.report()
 
         skip_repo, repository_id, repository, archives = load_repository(
             session, cell, skip_repo, repository_id, repository, archives
@@ -156,11 +168,46 @@ def apply(
         if skip_repo or skip_notebook:
             continue
 
+        if not reset_code_cell(session, cell, retry_error, retry_syntax_error, retry_timeout):
+            vprint(2, 'Cell already processed: {}'.format(cell))
+            status.count += 1
+            continue
+
+        yield repository_id, notebook_id, cell, checker
+
+
+def apply(
+        session, status, dispatches, selected_notebooks, selected_repositories,
+        retry_error, retry_syntax_error, retry_timeout,
+        count, interval, reverse, check, pool=None, cache=None, shard=None
+):
+    """ Extracts code cells features.
+    The AST of each cell is visited by the pool, and results are saved in order """
+
+    query = filter_code_cells(
+        session=session, selected_notebooks=selected_notebooks,
+        selected_repositories=selected_repositories,
+        count=count, interval=interval, reverse=reverse,
+        stream_rows=True, shard=shard
+    )
+
+    cells = select_code_cells(
+        session, status, dispatches, query,
+        retry_error, retry_syntax_error, retry_timeout, check
+    )
+    items = extract_in_pool(
+        pool or WorkerPool(0), cells, lambda item: item[2].source, cache,
+        on_chunk=partial(commit_cells, session), on_read=lambda chunk: session.commit()
+    )
+
+    for (repository_id, notebook_id, cell, checker), features in items:
+        status.report()
         vprint(2, 'Processing cell: {}'.format(cell))
 
         result = process_code_cell(
             session, repository_id, notebook_id, cell, checker,
             retry_error, retry_syntax_error, retry_timeout,
+            features=features
         )
 
         vprint(2, result)
@@ -190,6 +237,40 @@ def pos_apply(dispatches, retry_errors, retry_timeout, verbose):
             notebook_ids = notebook_ids[20000:]
 
 
+def run(args, status, shard=None):
+    """Extracts the code cells of a shard and dispatches the other python versions"""
+    dispatches = set()
+    with connect() as session, WorkerPool(args.workers, consts.FEATURE_TIMEOUT) as pool:
+        cache = FeatureCache(session) if consts.FEATURE_CACHE else None
+        if status:
+            status.cache = cache
+        apply(
+            session=SafeSession(session),
+            status=status,
+            dispatches=dispatches,
+            selected_notebooks=args.notebooks,
+            selected_repositories=args.repositories,
+            retry_error=False if args.retry_errors else False,
+            retry_syntax_error=False if args.retry_syntaxerrors else False,
+            retry_timeout=False if args.retry_timeout else False,
+            count=args.count,
+            interval=args.interval,
+            reverse=args.reverse,
+            check=set(args.check),
+            pool=pool,
+            cache=cache,
+            shard=shard
+        )
+
+    if bool(dispatches):
+        pos_apply(
+            dispatches,
+            args.retry_errors,
+            args.retry_timeout,
+            args.verbose
+        )
+
+
 def main():
     """Main function"""
     register_surrogateescape()
@@ -197,41 +278,35 @@ def main():
 
     parser = argparse.ArgumentParser(description='Execute repositories')
     parser = set_up_argument_parser(parser, script_name, "code_cells")
+    parser = add_backend_argument(parser)
     parser.add_argument("-n", "--notebooks", type=int, default=None,
                         nargs="*", help="notebooks ids")
     args = parser.parse_args()
 
     consts.VERBOSE = args.verbose
+    consts.EXTRACTION_BACKEND = args.backend
+
+    if args.shards > 1 and not args.count:
+        with savepid():
+            with connect() as session:
+                query = filter_code_cells(
+                    session=session, selected_notebooks=args.notebooks,
+                    selected_repositories=args.repositories,
+                    count=False, interval=args.interval, reverse=False
+                )
+                query = pending(query, Cell.state, CELL_PROCESSED, CELL_ORDER)
+                shards = plan_shards(query, CELL_SHARD_KEYS, Cell.source, args.shards)
+                unpack_boundaries(session, shards)
+            codes = run_shards(script_name, partial(run, args), shards)
+        sys.exit(exit_status(codes))
+
     status = None
     if not args.count:
         status = StatusLogger(script_name)
         status.report()
 
-    dispatches = set()
     with savepid():
-        with connect() as session:
-            apply(
-                session=SafeSession(session),
-                status=status,
-                dispatches=dispatches,
-                selected_notebooks=args.notebooks,
-                selected_repositories=args.repositories,
-                retry_error=False if args.retry_errors else False,
-                retry_syntax_error=False if args.retry_syntaxerrors else False,
-                retry_timeout=False if args.retry_timeout else False,
-                count=args.count,
-                interval=args.interval,
-                reverse=args.reverse,
-                check=set(args.check)
-            )
-
-        if bool(dispatches):
-            pos_apply(
-                dispatches,
-                args.retry_errors,
-                args.retry_timeout,
-                args.verbose
-            )
+        run(args, status)
 
 
 if __name__ == '__main__':
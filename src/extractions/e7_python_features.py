@@ -7,17 +7,22 @@ if src_path not in sys.path:
     sys.path.append(src_path)
 
 import argparse
+from functools import partial
 from itertools import groupby
 import src.config.consts as consts
 
 from future.utils.surrogateescape import register_surrogateescape
-from src.db.database import PythonFileModule, connect, PythonFileDataIO
+from src.db.database import PythonFile, PythonFileModule, connect, PythonFileDataIO, bulk_insert
 from src.helpers.h3_utils import vprint, check_exit, savepid, get_next_pyexec, invoke
-from timeout_decorator import TimeoutError  # noqa: F401
+from src.helpers.h3_utils import TimeoutError
 from src.classes.c2_status_logger import StatusLogger
 from src.classes.c1_safe_session import SafeSession
+from src.classes.c6_worker_pool import WorkerPool
+from src.classes.c7_feature_cache import FeatureCache
 from src.helpers.h2_script_helpers import set_up_argument_parser, extract_features
-from src.helpers.h4_filters import filter_python_files
+from src.helpers.h2_script_helpers import extract_in_pool, resolve_features, add_backend_argument
+from src.helpers.h4_filters import filter_python_files, release, PYTHON_FILE_SHARD_KEYS
+from src.helpers.h11_shards import pending, plan_shards, run_shards, unpack_boundaries, exit_status
 from src.helpers.h5_loaders import load_files, load_repository
 
 from src.config.states import PF_LOADED, PF_PROCESSED, PF_SYNTAX_ERROR
@@ -26,12 +31,10 @@ from src.config.states import PF_ORDER, PF_ERRORS
 from src.config.states import states_after
 
 
-def process_python_file(
-    session, dispatches, repository_id, python_file, checker,
-    retry_error=False, retry_syntax_error=False, retry_timeout=False
+def reset_python_file(
+    session, python_file, retry_error=False, retry_syntax_error=False, retry_timeout=False
 ):
-    """ Processes Python File to collect features """
-
+    """ Removes the features of a retried file. Returns False if the file was already processed """
     if (retry_error and python_file.state == PF_PROCESS_ERROR) or \
             (retry_syntax_error and python_file.state == PF_SYNTAX_ERROR) or \
             (retry_timeout and python_file.state == PF_PROCESS_TIMEOUT):
@@ -47,13 +50,30 @@ def process_python_file(
     elif python_file.state == PF_PROCESSED \
             or python_file.state in PF_ERRORS \
             or python_file.state in states_after(PF_PROCESSED, PF_ORDER):
+        return False
+    return True
+
+
+def process_python_file(
+    session, dispatches, repository_id, python_file, checker,
+    retry_error=False, retry_syntax_error=False, retry_timeout=False,
+    features=None
+):
+    """ Processes Python File to collect features.
+    features is the (success, result) of a worker pool. Extracts inline if it is None """
+
+    if not reset_python_file(session, python_file, retry_error, retry_syntax_error, retry_timeout):
         return 'already processed'
 
     try:
         vprint(2, "Extracting features")
         try:
-            modules, data_ios, \
-                extracted_args, missed_args = extract_features(python_file.source, checker)
+            if features is None:
+                modules, data_ios, \
+                    extracted_args, missed_args = extract_features(python_file.source, checker)
+            else:
+                modules, data_ios, \
+                    extracted_args, missed_args = resolve_features(features, checker)
         except TimeoutError:
             python_file.state = PF_PROCESS_TIMEOUT
             return 'Failed due to  Time Out Error.'
@@ -67,35 +87,31 @@ def process_python_file(
                 return 'Failed due to Syntax Error.'
 
         vprint(2, "Adding session objects")
-        for line, import_type, module_name, local in modules:
-            session.add(
-                PythonFileModule(
-                    repository_id=repository_id,
-                    python_file_id=python_file.id,
-
-                    line=line,
-                    import_type=import_type,
-                    module_name=module_name,
-                    local=local,
-                )
-            )
-
-        for line,  caller, \
-                function_name, function_type, source, mode in data_ios:
-
-            session.add(
-                PythonFileDataIO(
-                    repository_id=repository_id,
-                    python_file_id=python_file.id,
-
-                    line=line,
-                    caller=caller,
-                    function_name=function_name,
-                    function_type=function_type,
-                    source=source,
-                    mode=mode,
-                )
-            )
+        bulk_insert(session, PythonFileModule, [
+            {
+                "repository_id": repository_id,
+                "python_file_id": python_file.id,
+
+                "line": line,
+                "import_type": import_type,
+                "module_name": module_name,
+                "local": local,
+            } for line, import_type, module_name, local in modules
+        ])
+
+        bulk_insert(session, PythonFileDataIO, [
+            {
+                "repository_id": repository_id,
+                "python_file_id": python_file.id,
+
+                "line": line,
+                "caller": caller,
+                "function_name": function_name,
+                "function_type": function_type,
+                "source": source,
+                "mode": mode,
+            } for line, caller, function_name, function_type, source, mode in data_ios
+        ])
 
         python_file.extracted_args = extracted_args
         python_file.missed_args = missed_args
@@ -112,19 +128,16 @@ def process_python_file(
         session.add(python_file)
 
 
-def apply(
-    session, status, dispatches, selected_python_files,
-    selected_repositories, retry_error, retry_syntax_error,
-    retry_timeout, count, interval, reverse, check
-):
-    """Aggregate Python Files' features"""
+def commit_python_files(session, chunk):
+    """ Commits the python files of a processed chunk and expunges them """
+    session.commit()
+    release(session, [python_file for _, python_file, _ in chunk])
 
-    query = filter_python_files(
-        session=session, selected_python_files=selected_python_files,
-        selected_repositories=selected_repositories,
-        count=count, interval=interval, reverse=reverse
-    )
 
+def select_python_files(
+    session, status, query, retry_error, retry_syntax_error, retry_timeout, check
+):
+    """ Yields (repository_id, python_file, checker) for files to process """
     skip_repo = False
     repository_id = None
     repository = None
@@ -136,10 +149,8 @@ def apply(
     for python_file in query:
 
         if check_exit(check):
-            session.commit()
             vprint(0, 'Found .exit file. Exiting')
             return
-        status.report()
 
         skip_repo, repository_id, repository, archives = load_repository(
             session, python_file, skip_repo, repository_id, repository, archives
@@ -155,11 +166,45 @@ def apply(
         if skip_repo or skip_python_file:
             continue
 
+        if not reset_python_file(session, python_file, retry_error, retry_syntax_error, retry_timeout):
+            vprint(2, 'Python File already processed: {}'.format(python_file))
+            status.count += 1
+            continue
+
+        yield repository_id, python_file, checker
+
+
+def apply(
+    session, status, dispatches, selected_python_files,
+    selected_repositories, retry_error, retry_syntax_error,
+    retry_timeout, count, interval, reverse, check, pool=None, cache=None, shard=None
+):
+    """Aggregate Python Files' features.
+    The AST of each file is visited by the pool, and results are saved in order"""
+
+    query = filter_python_files(
+        session=session, selected_python_files=selected_python_files,
+        selected_repositories=selected_repositories,
+        count=count, interval=interval, reverse=reverse,
+        stream_rows=True, shard=shard
+    )
+
+    python_files = select_python_files(
+        session, status, query, retry_error, retry_syntax_error, retry_timeout, check
+    )
+    items = extract_in_pool(
+        pool or WorkerPool(0), python_files, lambda item: item[1].source, cache,
+        on_chunk=partial(commit_python_files, session), on_read=lambda chunk: session.commit()
+    )
+
+    for (repository_id, python_file, checker), features in items:
+        status.report()
         vprint(2, 'Processing Python File: {}'.format(python_file))
 
         result = process_python_file(
             session, dispatches, repository_id, python_file, checker,
-            retry_error, retry_syntax_error, retry_timeout
+            retry_error, retry_syntax_error, retry_timeout,
+            features=features
         )
 
         vprint(2, result)
@@ -189,6 +234,40 @@ def pos_apply(dispatches, retry_errors, retry_timeout, verbose):
             python_files_ids = python_files_ids[20000:]
 
 
+def run(args, status, shard=None):
+    """Extracts the python files of a shard and dispatches the other python versions"""
+    dispatches = set()
+    with connect() as session, WorkerPool(args.workers, consts.FEATURE_TIMEOUT) as pool:
+        cache = FeatureCache(session) if consts.FEATURE_CACHE else None
+        if status:
+            status.cache = cache
+        apply(
+            session=SafeSession(session),
+            status=status,
+            dispatches=dispatches,
+            selected_python_files=args.python_files,
+            selected_repositories=args.repositories,
+            retry_error=True if args.retry_errors else False,
+            retry_syntax_error=0 if args.retry_syntaxerrors else False,
+            retry_timeout=0 if args.retry_timeout else False,
+            count=args.count,
+            interval=args.interval,
+            reverse=args.reverse,
+            check=set(args.check),
+            pool=pool,
+            cache=cache,
+            shard=shard
+        )
+
+        if bool(dispatches):
+            pos_apply(
+                dispatches,
+                args.retry_errors,
+                args.retry_timeout,
+                args.verbose
+            )
+
+
 def main():
     """Main function"""
     register_surrogateescape()
@@ -196,41 +275,35 @@ def main():
 
     parser = argparse.ArgumentParser(description='Execute repositories')
     parser = set_up_argument_parser(parser, script_name, "python_files")
+    parser = add_backend_argument(parser)
     parser.add_argument("-p", "--python-files", type=int, default=None,
                         nargs="*", help="python files ids")
     args = parser.parse_args()
 
     consts.VERBOSE = args.verbose
+    consts.EXTRACTION_BACKEND = args.backend
+
+    if args.shards > 1 and not args.count:
+        with savepid():
+            with connect() as session:
+                query = filter_python_files(
+                    session=session, selected_python_files=args.python_files,
+                    selected_repositories=args.repositories,
+                    count=False, interval=args.interval, reverse=False
+                )
+                query = pending(query, PythonFile.state, PF_PROCESSED, PF_ORDER)
+                shards = plan_shards(query, PYTHON_FILE_SHARD_KEYS, PythonFile.source, args.shards)
+                unpack_boundaries(session, shards)
+            codes = run_shards(script_name, partial(run, args), shards)
+        sys.exit(exit_status(codes))
+
     status = None
     if not args.count:
         status = StatusLogger(script_name)
         status.report()
 
-    dispatches = set()
     with savepid():
-        with connect() as session:
-            apply(
-                session=SafeSession(session),
-                status=status,
-                dispatches=dispatches,
-                selected_python_files=args.python_files,
-                selected_repositories=args.repositories,
-                retry_error=True if args.retry_errors else False,
-                retry_syntax_error=0 if args.retry_syntaxerrors else False,
-                retry_timeout=0 if args.retry_timeout else False,
-                count=args.count,
-                interval=args.interval,
-                reverse=args.reverse,
-                check=set(args.check)
-            )
-
-            if bool(dispatches):
-                pos_apply(
-                    dispatches,
-                    args.retry_errors,
-                    args.retry_timeout,
-                    args.verbose
-                )
+        run(args, status)
 
 
 if __name__ == '__main__':
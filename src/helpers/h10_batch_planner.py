@@ -0,0 +1,169 @@
+""" Plans the extraction batches of s3_extract.
+
+Selected repositories are packed once into balanced batches by disk size and
+estimated runtime. The plan is saved in planned_batches and s3_extract takes
+the next batch from it, instead of sorting all selected repositories on every
+iteration. Repositories selected after the plan are added as new batches.
+"""
+import os
+import sys
+src_path = os.path.dirname(os.path.abspath(''))
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+import heapq
+import math
+
+from sqlalchemy import func
+
+from src.config.states import REP_SELECTED, EXTRACTED_SUCCESS
+from src.db.database import Repository, PlannedBatch, Extraction, bulk_insert
+
+SECONDS_PER_REPOSITORY = 10
+SECONDS_PER_MB = 1
+SECONDS_PER_NOTEBOOK = 2
+NOTEBOOKS_PER_MB = 1  # used before any repository was extracted
+
+
+def estimate_cost(size, notebooks, scale=1.0):
+    """ Returns the estimated extraction seconds of a repository with size KB """
+    return scale * (
+        SECONDS_PER_REPOSITORY + SECONDS_PER_MB * size / 10 ** 3 + SECONDS_PER_NOTEBOOK * notebooks
+    )
+
+
+def notebook_density(session):
+    """ Returns the notebooks per KB of the repositories that were extracted """
+    notebooks, size = session.query(
+        func.sum(Repository.notebooks_count),
+        func.sum(Repository.disk_usage_kb)
+    ).filter(Repository.notebooks_count.isnot(None)).one()
+    if not notebooks or not size:
+        return NOTEBOOKS_PER_MB / 10 ** 3
+    return notebooks / size
+
+
+def calibrate(session):
+    """ Returns the ratio between the runtime of the successful extractions and their estimated cost """
+    extractions = session.query(
+        Extraction.runtime,
+        func.count(Repository.id),
+        func.sum(Repository.disk_usage_kb),
+        func.sum(Repository.notebooks_count),
+    ).join(Repository, Repository.extraction_id == Extraction.id)\
+        .filter(Extraction.state == EXTRACTED_SUCCESS)\
+        .group_by(Extraction.id)
+
+    runtime, estimated = 0.0, 0.0
+    for extraction_runtime, repositories, size, notebooks in extractions:
+        if extraction_runtime is None:
+            continue
+        runtime += extraction_runtime.total_seconds()
+        estimated += (
+            estimate_cost(size or 0, notebooks or 0)
+            + SECONDS_PER_REPOSITORY * (repositories - 1)
+        )
+    if not runtime or not estimated:
+        return 1.0
+    return runtime / estimated
+
+
+def pack(items, size_limit, time_budget=None):
+    """ Packs (repository_id, size, cost) items into balanced batches.
+
+    Batches stay under size_limit and, when it is set, under time_budget.
+    Items with size_limit or more are left out, and an item that costs
+    more than time_budget gets a batch of its own. The items are added
+    by decreasing cost to the batch with the lowest cost that fits them.
+    """
+    items = [item for item in items if item[1] < size_limit]
+    if not items:
+        return []
+
+    total_size = sum(item[1] for item in items)
+    total_cost = sum(item[2] for item in items)
+    count = max(
+        1, int(math.ceil(total_size / float(size_limit))),
+        int(math.ceil(total_cost / float(time_budget))) if time_budget else 1
+    )
+    batches = [[] for _ in range(count)]
+    heap = [(0.0, 0, index) for index in range(count)]
+
+    for item in sorted(items, key=lambda item: (-item[2], item[0])):
+        skipped = []
+        while heap:
+            cost, size, index = heapq.heappop(heap)
+            fits_cost = not time_budget or not batches[index] or cost + item[2] <= time_budget
+            if size + item[1] < size_limit and fits_cost:
+                break
+            skipped.append((cost, size, index))
+        else:
+            cost, size, index = 0.0, 0, len(batches)
+            batches.append([])
+
+        batches[index].append(item)
+        heapq.heappush(heap, (cost + item[2], size + item[1], index))
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+
+    return [batch for batch in batches if batch]
+
+
+def plan_batches(session, size_limit, time_budget=None, replan=False):
+    """ Plans the selected repositories that are not in the plan yet.
+    With replan, the repositories that are still selected are planned again.
+    Returns the number of new batches """
+    if replan:
+        selected = session.query(Repository.id).filter(Repository.state == REP_SELECTED)
+        session.query(PlannedBatch).filter(PlannedBatch.repository_id.in_(selected))\
+            .delete(synchronize_session=False)
+
+    planned = session.query(PlannedBatch.repository_id)
+    repositories = session.query(Repository.id, Repository.disk_usage_kb, Repository.notebooks_count)\
+        .filter(Repository.state == REP_SELECTED, Repository.id.notin_(planned)).all()
+    if not repositories:
+        session.commit()
+        return 0
+
+    density = notebook_density(session)
+    scale = calibrate(session)
+    notebooks = {}
+    items = []
+    for repository_id, disk_usage_kb, notebooks_count in repositories:
+        size = disk_usage_kb or 0
+        notebooks[repository_id] = notebooks_count if notebooks_count is not None else size * density
+        items.append((repository_id, size, estimate_cost(size, notebooks[repository_id], scale)))
+
+    batches = pack(items, size_limit, time_budget)
+    first = (session.query(func.max(PlannedBatch.batch)).scalar() or 0) + 1
+    bulk_insert(session, PlannedBatch, [
+        {
+            "repository_id": repository_id,
+            "batch": first + number,
+            "size": size,
+            "notebooks": notebooks[repository_id],
+            "cost": cost,
+        } for number, batch in enumerate(batches) for repository_id, size, cost in batch
+    ])
+    session.commit()
+    return len(batches)
+
+
+def next_batch(session, exclude=None):
+    """ Returns the selected repositories of the first planned batch and its estimated cost """
+    query = session.query(PlannedBatch.batch)\
+        .join(Repository, Repository.id == PlannedBatch.repository_id)\
+        .filter(Repository.state == REP_SELECTED)
+    if exclude:
+        query = query.filter(PlannedBatch.repository_id.notin_(exclude))
+    batch = query.order_by(PlannedBatch.batch).limit(1).scalar()
+    if batch is None:
+        return [], 0.0
+
+    rows = session.query(Repository, PlannedBatch.cost)\
+        .join(PlannedBatch, Repository.id == PlannedBatch.repository_id)\
+        .filter(PlannedBatch.batch == batch, Repository.state == REP_SELECTED)
+    if exclude:
+        rows = rows.filter(Repository.id.notin_(exclude))
+    rows = rows.order_by(Repository.id).all()
+    return [repository for repository, _ in rows], sum(cost for _, cost in rows)
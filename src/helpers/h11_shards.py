@@ -0,0 +1,114 @@
+""" Splits the pending work of e5, e6 and e7 into shards of similar cost.
+
+A shard is a (lower, upper) keyset range over the shard keys of a filter
+(h4_filters.CELL_SHARD_KEYS or PYTHON_FILE_SHARD_KEYS). The cost of each key
+is its number of rows times ROW_BYTES plus the bytes of their sources, so a
+repository that holds most of the cells is split across shards instead of
+skewing a repository interval. run_shards runs each shard in a forked process
+and merges the counts of their StatusLoggers into a single StatusLogger.
+"""
+import os
+import sys
+src_path = os.path.dirname(os.path.abspath(''))
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+import multiprocessing
+
+from multiprocessing.connection import wait
+from sqlalchemy import func
+
+from src.classes.c2_status_logger import StatusLogger, ShardStatusLogger
+from src.config.states import states_after
+from src.db.database import Repository, dispose_engines
+from src.helpers.h3_utils import vprint, unzip_repository
+
+ROW_BYTES = 200  # cost of a row besides its source
+POLL_INTERVAL = 1  # seconds between merges of the shard counts
+
+
+def pending(query, column, state, order):
+    """ Filters the rows of query whose state column did not reach state """
+    return query.filter(column.notin_([state] + states_after(state, order)))
+
+
+def key_costs(query, keys, source):
+    """ Returns [(key, cost)] of the rows of query grouped by keys, in key order """
+    rows = query.order_by(None).with_entities(
+        *(keys + [func.count(), func.coalesce(func.sum(func.length(source)), 0)])
+    ).group_by(*keys).order_by(*keys)
+    return [
+        (tuple(row[:len(keys)]), row[-2] * ROW_BYTES + row[-1])
+        for row in rows
+    ]
+
+
+def split(costs, shards):
+    """ Splits (key, cost) pairs in key order into at most shards contiguous ranges.
+    Returns (lower, upper) pairs. lower is inclusive, upper is exclusive and None is open """
+    total = sum(cost for _, cost in costs)
+    starts = []
+    accumulated = 0
+    for key, cost in costs:
+        if not starts or (len(starts) < shards and accumulated >= total * len(starts) / float(shards)):
+            starts.append(key)
+        accumulated += cost
+    if not starts:
+        return []
+    return list(zip([None] + starts[1:], starts[1:] + [None]))
+
+
+def plan_shards(query, keys, source, shards):
+    """ Returns up to shards keyset ranges of the rows of query with similar cost """
+    return split(key_costs(query, keys, source), shards)
+
+
+def unpack_boundaries(session, shards):
+    """ Unpacks the repositories that start a shard, since the previous shard
+    may also process them. Otherwise, both shards could unpack them at once """
+    for lower, _ in shards:
+        if lower is None:
+            continue
+        repository = session.query(Repository).get(lower[0])
+        if repository is not None:
+            unzip_repository(repository)
+
+
+def exit_status(codes):
+    """ Returns 0 if all shards finished successfully """
+    return 1 if any(code != 0 for code in codes) else 0
+
+
+def run_shard(function, script, counts, index, shard):
+    """ Runs function(status, shard) in the forked process of a shard """
+    dispose_engines()
+    status = ShardStatusLogger(script, counts, index)
+    status.report()
+    function(status, shard)
+    status.report()
+
+
+def run_shards(script, function, shards):
+    """ Runs function(status, shard) for each shard in a forked process.
+    Reports the merged counts of the shards in a StatusLogger of script.
+    Returns the exit codes of the processes """
+    context = multiprocessing.get_context("fork")
+    counts = context.Array("q", 2 * len(shards))
+    status = StatusLogger(script)
+    status.report()
+
+    processes = []
+    for index, shard in enumerate(shards):
+        vprint(0, "Starting shard {}: {} - {}".format(index, *shard))
+        process = context.Process(target=run_shard, args=(function, script, counts, index, shard))
+        process.start()
+        processes.append(process)
+
+    running = {process.sentinel: process for process in processes}
+    while running:
+        for sentinel in wait(list(running), POLL_INTERVAL):
+            running.pop(sentinel).join()
+        status.merge(zip(counts[::2], counts[1::2]))
+
+    status.write()
+    return [process.exitcode for process in processes]
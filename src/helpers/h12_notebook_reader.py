@@ -0,0 +1,280 @@
+""" Reads notebooks without their output payloads.
+
+read_notebook parses the JSON of a notebook incrementally, in chunks of
+CHUNK_SIZE characters. Strings of output payloads (images, html, tracebacks)
+and attachment payloads are skipped while they are read, so they are never kept in
+memory. Skipped values are replaced by empty values of the same JSON type.
+Outputs keep their output_type, their data keys (mime types) and a few small
+fields. The result is the NotebookNode of nbformat.read(ofile, NO_CONVERT)
+with these payloads emptied, and without validation.
+
+With fast_path, notebooks in nbformat 4 whose structure nbformat would
+accept are returned as plain dicts, with joined sources, without importing
+nbformat. Other nbformat 4 notebooks go through nbformat. Notebooks in other
+versions and files that the parser rejects are read again with nbformat.read,
+since older versions keep JSON payloads in strings that the upgrade parses.
+"""
+import json
+import re
+
+CHUNK_SIZE = 1 << 16
+
+KEEP = "keep"
+SKIP = "skip"
+OUTPUTS = "outputs"
+OUTPUT = "output"
+DATA = "data"
+ATTACHMENTS = "attachments"
+
+# Keys kept by outputs of nbformat 3 and 4. Other keys are mime types or payloads
+OUTPUT_KEYS = {"output_type", "name", "stream", "execution_count", "prompt_number", "ename"}
+# Keys of notebooks whose values are not used, but may be large
+SKIPPED_KEYS = {"widgets"}
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+SCALAR = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null")
+SCALAR_LOOKAHEAD = 64
+# Text of skipped containers until the next bracket or the next string cut by the end of the buffer
+SKIPPED_TEXT = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+
+
+class NotebookStream(object):
+    """ Recursive descent JSON parser over chunks of a text file """
+
+    def __init__(self, ofile, chunk_size=CHUNK_SIZE):
+        self.file = ofile
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """ Reads the next chunk, dropping the consumed part of the buffer.
+        Returns False at the end of the file """
+        if self.eof:
+            return False
+        data = self.file.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """ Skips whitespace and returns the next character """
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of notebook")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expected {!r} at {!r}".format(char, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+
+    def string_end(self, keep):
+        """ Returns the position of the quote that closes the string at pos.
+        Without keep, the read part of the string is dropped from the buffer """
+        start = self.pos + 1
+        while True:
+            end = self.buffer.find('"', start)
+            while end != -1:
+                if self.backslashes(end) % 2 == 0:
+                    return end
+                end = self.buffer.find('"', end + 1)
+            if not keep:
+                # Keeps only trailing backslashes, which may escape the next quote
+                trailing = self.backslashes(len(self.buffer))
+                self.buffer = '"' + self.buffer[len(self.buffer) - trailing:]
+                self.pos = 0
+            start = len(self.buffer) - self.pos
+            if not self.fill():
+                raise ValueError("Unterminated string")
+
+    def backslashes(self, end):
+        """ Counts the backslashes before end, inside the string at pos """
+        index = end - 1
+        while index > self.pos and self.buffer[index] == "\\":
+            index -= 1
+        return end - 1 - index
+
+    def string(self, keep=True):
+        end = self.string_end(keep)
+        value = json.loads(self.buffer[self.pos:end + 1]) if keep else ""
+        self.pos = end + 1
+        return value
+
+    def scalar(self):
+        while len(self.buffer) - self.pos < SCALAR_LOOKAHEAD and self.fill():
+            pass
+        match = SCALAR.match(self.buffer, self.pos)
+        if match is None:
+            raise ValueError("Invalid value at {!r}".format(self.buffer[self.pos:self.pos + 20]))
+        self.pos = match.end()
+        return json.loads(match.group())
+
+    def skip(self):
+        """ Skips the object or array at pos without parsing its values """
+        depth = 0
+        while True:
+            self.pos = SKIPPED_TEXT.match(self.buffer, self.pos).end()
+            if self.pos == len(self.buffer):
+                if not self.fill():
+                    raise ValueError("Unexpected end of notebook")
+                continue
+            char = self.buffer[self.pos]
+            if char == '"':
+                self.pos = self.string_end(keep=False) + 1
+                continue
+            self.pos += 1
+            depth += 1 if char in "[{" else -1
+            if depth == 0:
+                return
+
+    def value(self, rule=KEEP):
+        """ Parses the next value according to rule """
+        char = self.peek()
+        if char == '"':
+            return self.string(keep=rule != SKIP)
+        if rule == SKIP and char in "[{":
+            self.skip()
+            return {} if char == "{" else []
+        if char == "{":
+            return self.object(rule)
+        if char == "[":
+            return self.array(rule)
+        return self.scalar()
+
+    def object(self, rule):
+        self.expect("{")
+        result = {}
+        if self.peek() == "}":
+            self.pos += 1
+            return result
+        while True:
+            if self.peek() != '"':
+                raise ValueError("Expected a key at {!r}".format(self.buffer[self.pos:self.pos + 20]))
+            key = self.string()
+            self.expect(":")
+            value = self.value(member_rule(rule, key))
+            if rule != SKIP:
+                result[key] = value
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return result
+            if char != ",":
+                raise ValueError("Expected ',' or '}}', found {!r}".format(char))
+
+    def array(self, rule):
+        self.expect("[")
+        result = []
+        if self.peek() == "]":
+            self.pos += 1
+            return result
+        item_rule = OUTPUT if rule == OUTPUTS else rule
+        while True:
+            value = self.value(item_rule)
+            if rule != SKIP:
+                result.append(value)
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return result
+            if char != ",":
+                raise ValueError("Expected ',' or ']', found {!r}".format(char))
+
+    def document(self):
+        """ Parses the notebook and checks that nothing follows it """
+        result = self.value()
+        try:
+            self.peek()
+        except ValueError:
+            return result
+        raise ValueError("Extra data after the notebook")
+
+
+def member_rule(rule, key):
+    """ Returns the rule of the value of key in an object parsed with rule """
+    if rule == KEEP:
+        if key == "outputs":
+            return OUTPUTS
+        if key == "attachments":
+            return ATTACHMENTS
+        if key in SKIPPED_KEYS:
+            return SKIP
+        return KEEP
+    if rule == ATTACHMENTS:
+        return DATA
+    if rule == OUTPUT:
+        if key in OUTPUT_KEYS:
+            return KEEP
+        if key == "data":
+            return DATA
+        return SKIP
+    return SKIP
+
+
+def read_skeleton(ofile, chunk_size=CHUNK_SIZE):
+    """ Returns the JSON dict of a notebook file without output payloads """
+    return NotebookStream(ofile, chunk_size).document()
+
+
+def plain_v4(notebook):
+    """ Returns whether nbformat would read the notebook skeleton without errors
+    and only join the lines of its sources """
+    if notebook.get("nbformat") != 4 or type(notebook.get("nbformat")) is not int:
+        return False
+    if not isinstance(notebook.get("metadata"), dict) or not isinstance(notebook.get("cells"), list):
+        return False
+    for cell in notebook["cells"]:
+        if not isinstance(cell, dict) or not isinstance(cell.get("metadata"), dict):
+            return False
+        source = cell.get("source")
+        if isinstance(source, list) and not all(isinstance(line, str) for line in source):
+            return False
+        attachments = cell.get("attachments", {})
+        if not isinstance(attachments, dict) or not all(isinstance(bundle, dict) for bundle in attachments.values()):
+            return False
+        if cell.get("cell_type") != "code":
+            continue
+        outputs = cell.get("outputs", [])
+        if not isinstance(outputs, list) or not all(isinstance(output, dict) for output in outputs):
+            return False
+        for output in outputs:
+            if output.get("output_type") in {"execute_result", "display_data"} \
+                    and not isinstance(output.get("data", {}), dict):
+                return False
+    return True
+
+
+def read_notebook(ofile, chunk_size=CHUNK_SIZE, fast_path=True):
+    """ Reads a notebook file as nbformat.read(ofile, nbformat.NO_CONVERT),
+    without output payloads """
+    try:
+        notebook = read_skeleton(ofile, chunk_size)
+    except ValueError:
+        notebook = None
+
+    if not isinstance(notebook, dict) or notebook.get("nbformat") != 4:
+        import nbformat as nbf
+        ofile.seek(0)
+        return nbf.read(ofile, nbf.NO_CONVERT)
+
+    if fast_path and plain_v4(notebook):
+        for cell in notebook["cells"]:
+            if isinstance(cell.get("source"), list):
+                cell["source"] = "".join(cell["source"])
+        return notebook
+
+    import nbformat as nbf
+    from nbformat.reader import get_version
+
+    major, minor = get_version(notebook)
+    try:
+        return nbf.versions[major].to_notebook_json(notebook, minor=minor)
+    except AttributeError as err:
+        raise nbf.ValidationError("The notebook is missing an expected key: {}".format(err))
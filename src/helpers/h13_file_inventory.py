@@ -0,0 +1,172 @@
+""" Inventory of the files of a repository used by e2, e3 and e4.
+
+The first stage that looks for files of a repository walks it once with
+os.scandir and stores the files with a file_kind in repository_files,
+with their size and mtime. Later stages query the table instead of walking
+the repository again. Repository.inventory_files is None until then, and
+e1 clears the inventory whenever it clones again or changes Repository.commit.
+
+With the git backend, the files come from git ls-tree at Repository.commit
+instead, with the object of each file in blob. Stages read them with
+open_file through git cat-file, so the repository needs no checkout.
+"""
+import os
+
+import src.config.consts as consts
+from src.config.consts import Path
+from src.classes.c9_git_blobs import blob_reader
+from src.db.database import RepositoryFile, bulk_insert
+from src.helpers.h1_git_helpers import ls_tree, missing_objects, fetch_objects, object_sizes
+from src.helpers.h3_utils import utf8_path
+
+# Files stored by kind. Other files are not used by the stages
+KIND_NAMES = {
+    "setup.py": "setup",
+    "requirements.txt": "requirements",
+    "Pipfile": "pipfile",
+    "Pipfile.lock": "pipfile_lock",
+}
+KIND_SUFFIXES = [
+    (".ipynb", "notebook"),
+    (".py", "python"),
+]
+REQUIREMENT_KINDS = ["setup", "requirements", "pipfile", "pipfile_lock"]
+
+
+def file_kind(name):
+    """ Returns the inventory kind of a file name, or None """
+    kind = KIND_NAMES.get(name)
+    if kind is not None:
+        return kind
+    for suffix, kind in KIND_SUFFIXES:
+        if name.endswith(suffix):
+            return kind
+    return None
+
+
+def scan_files(path):
+    """ Yields the DirEntry of each file under path, in the order of os.walk.
+    As os.walk, it does not follow symbolic links to directories """
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return
+    directories = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            yield entry
+        elif not entry.is_symlink():
+            directories.append(entry)
+    for entry in directories:
+        yield from scan_files(entry.path)
+
+
+def git_backend(repository):
+    """ Checks if the files of a repository are read from its git objects.
+    Repositories cloned by e1 with the git backend have no checkout, so they
+    always are. Clones with a checkout are when EXTRACTION_BACKEND is git """
+    if not repository.commit or not (repository.path / ".git").is_dir():
+        return False
+    return repository.backend == "git" or consts.EXTRACTION_BACKEND == "git"
+
+
+def git_inventory_rows(repository):
+    """ Returns the repository_files rows of the tree of Repository.commit.
+    The blobs of the rows that a partial clone misses are downloaded in one fetch.
+    Symbolic links and submodules are not stored """
+    full_dir = repository.path
+    entries = [
+        (path, obj, file_kind(path.rsplit("/", 1)[-1]))
+        for mode, object_type, obj, path in ls_tree(full_dir, repository.commit)
+        if object_type == "blob" and mode != "120000"
+    ]
+    entries = [entry for entry in entries if entry[2] is not None]
+    objects = {obj for _, obj, _ in entries}
+    fetch_objects(full_dir, objects & missing_objects(full_dir, repository.commit))
+    sizes = object_sizes(full_dir, objects)
+    return [
+        {
+            "repository_id": repository.id,
+            "path": path,
+            "kind": kind,
+            "size": sizes.get(obj),
+            "mtime": None,
+            "blob": obj,
+        } for path, obj, kind in entries
+    ]
+
+
+def inventory_rows(repository):
+    """ Returns the repository_files rows of a repository """
+    if git_backend(repository):
+        return git_inventory_rows(repository)
+    root = str(repository.path)
+    rows = []
+    for entry in scan_files(root):
+        kind = file_kind(entry.name)
+        if kind is None:
+            continue
+        try:
+            stat = entry.stat()
+            size, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            size, mtime = None, None
+        path = utf8_path(entry.path)
+        rows.append({
+            "repository_id": repository.id,
+            "path": os.path.relpath(path, root),
+            "kind": kind,
+            "size": size,
+            "mtime": mtime,
+        })
+    return rows
+
+
+def build_inventory(session, repository):
+    """ Stores the inventory of a repository, unless it already exists """
+    if repository.inventory_files is not None:
+        return False
+    rows = inventory_rows(repository)
+    bulk_insert(session, RepositoryFile, rows)
+    repository.inventory_files = len(rows)
+    session.add(repository)
+    return True
+
+
+def clear_inventory(session, repository):
+    """ Removes the inventory of a repository, so the next stage builds it again """
+    session.query(RepositoryFile).filter(RepositoryFile.repository_id == repository.id).delete()
+    repository.inventory_files = None
+    session.add(repository)
+
+
+def inventory_files(session, repository, kind):
+    """ Returns the absolute paths of the files of a kind in a repository """
+    build_inventory(session, repository)
+    query = session.query(RepositoryFile.path).filter(
+        RepositoryFile.repository_id == repository.id,
+        RepositoryFile.kind == kind,
+    ).order_by(RepositoryFile.id)
+    return [Path(str(repository.path)) / path for path, in query]
+
+
+def inventory_blobs(session, repository):
+    """ Returns the objects of the files of a repository by path.
+    It is empty unless the inventory was built with the git backend """
+    build_inventory(session, repository)
+    query = session.query(RepositoryFile.path, RepositoryFile.blob).filter(
+        RepositoryFile.repository_id == repository.id,
+        RepositoryFile.blob.isnot(None),
+    )
+    return dict(query)
+
+
+def open_file(path, name, blob=None, mode="r"):
+    """ Opens a file of the repository in path, from its git object when it has one """
+    if blob is None:
+        return open(os.path.join(str(path), name), mode)
+    return blob_reader(path).open(blob, mode)
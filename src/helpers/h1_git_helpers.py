@@ -31,6 +31,82 @@ def git_output(*args, cwd=None):
     return subprocess.check_output(["git"] + list(args), cwd=cwd)
 
 
+def git_lines(*args, cwd=None):
+    """Invoke git command and stream its output line by line"""
+    process = subprocess.Popen(["git"] + list(args), cwd=cwd, stdout=subprocess.PIPE)
+    try:
+        for line in process.stdout:
+            yield line.decode("utf-8").rstrip("\n")
+    finally:
+        process.stdout.close()
+        status = process.wait()
+    if status != 0:
+        raise subprocess.CalledProcessError(status, ["git"] + list(args))
+
+
+def ls_tree(full_dir, commit, trees=False):
+    """ Returns the (mode, type, object, path) entries of the tree of a commit.
+    Paths that are not valid UTF-8 have their invalid bytes replaced """
+    args = ["--git-dir", str(full_dir / ".git"), "ls-tree", "-r", "-z"]
+    if trees:
+        args.append("-t")
+    output = git_output(*(args + [commit]))
+    entries = []
+    for line in output.split(b"\0"):
+        if not line:
+            continue
+        info, path = line.split(b"\t", 1)
+        mode, object_type, obj = info.decode("ascii").split(" ")
+        entries.append((mode, object_type, obj, path.decode("utf-8", "replace")))
+    return entries
+
+
+def missing_objects(full_dir, commit):
+    """ Returns the objects of the tree of a commit that a partial clone did not download """
+    output = git_output(
+        "--git-dir", str(full_dir / ".git"), "rev-list", "--objects", "--no-walk",
+        "--no-object-names", "--missing=print", commit
+    )
+    return {
+        line[1:] for line in output.decode("ascii").splitlines()
+        if line.startswith("?")
+    }
+
+
+def fetch_objects(full_dir, objects):
+    """ Downloads the objects of a partial clone in a single fetch, as checkout does """
+    objects = list(objects)
+    if not objects:
+        return
+    env = os.environ.copy()
+    env["GIT_TERMINAL_PROMPT"] = "0"
+    subprocess.run(
+        ["git", "--git-dir", str(full_dir / ".git"),
+         "-c", "fetch.negotiationAlgorithm=noop", "fetch", "origin",
+         "--no-tags", "--no-write-fetch-head", "--recurse-submodules=no",
+         "--filter=blob:none", "--stdin"],
+        input="\n".join(objects).encode("ascii"), env=env, check=True
+    )
+
+
+def object_sizes(full_dir, objects):
+    """ Returns the size of each object in a single git cat-file --batch-check """
+    objects = list(objects)
+    if not objects:
+        return {}
+    process = subprocess.run(
+        ["git", "--git-dir", str(full_dir / ".git"), "cat-file",
+         "--batch-check=%(objectname) %(objectsize)"],
+        input="\n".join(objects).encode("ascii"), stdout=subprocess.PIPE, check=True
+    )
+    sizes = {}
+    for line in process.stdout.decode("ascii").splitlines():
+        obj, size = line.split(" ", 1)
+        if size != "missing":
+            sizes[obj] = int(size)
+    return sizes
+
+
 def format_commit(line, commit_type):
     try:
         commit_datetime, commit_hash, author, message = line.split('$_$', 3)
@@ -49,6 +125,18 @@ def format_commit(line, commit_type):
         raise EnvironmentError("Invalid commit.")
 
 
+def format_log_line(line):
+    """Format a git log line with parents, tagging merges by their parent count"""
+    try:
+        commit_datetime, commit_hash, author, parents, message = line.split('$_$', 4)
+    except ValueError:
+        raise EnvironmentError("Invalid commit.")
+    commit_type = "merge" if len(parents.split()) > 1 else "commit"
+    return format_commit(
+        "$_$".join([commit_datetime, commit_hash, author, message]), commit_type
+    )
+
+
 def remove_repo_and_prepare(session, repository):
     if repository.dir_path:
         shutil.rmtree(str(repository.dir_path), ignore_errors=True)
@@ -2,6 +2,8 @@ import ast
 import os
 import sys
 
+from itertools import islice
+from src.classes.c4_local_checkers import DeferredLocalChecker
 from src.classes.c5_cell_visitor import CellVisitor
 
 src_path = os.path.dirname(os.path.abspath(''))
@@ -10,7 +12,7 @@ if src_path not in sys.path:
 
 import src.config.consts as consts
 from src.helpers.h4_filters import filter_repositories
-from src.helpers.h3_utils import vprint, check_exit, timeout
+from src.helpers.h3_utils import vprint, check_exit
 
 
 def set_up_argument_parser(parser, script_name, script_type="repository"):
@@ -34,10 +36,28 @@ def set_up_argument_parser(parser, script_name, script_type="repository"):
                             action='store_true')
         parser.add_argument('-t', '--retry-timeout', help='retry timeout',
                             action='store_true')
+        parser.add_argument('-w', '--workers', help='feature extraction processes',
+                            type=int, default=consts.FEATURE_WORKERS)
+
+    if script_type == "markdown_cells":
+        parser.add_argument('--language-seed', help='seed of the language detection',
+                            type=int, default=consts.LANGUAGE_SEED)
+
+    if script_type in ("markdown_cells", "code_cells", "python_files"):
+        parser.add_argument('--shards', help='processes that split the pending work',
+                            type=int, default=1)
 
     return parser
 
 
+def add_backend_argument(parser):
+    """ Adds the extraction backend option of the scripts that read repository files """
+    parser.add_argument("--backend", type=str, default=consts.EXTRACTION_BACKEND,
+                        choices=["worktree", "git"],
+                        help="read files from a checkout (worktree) or from git objects (git)")
+    return parser
+
+
 def apply(session, status, selected_repositories, retry,
           count, interval, reverse, check,
           process_repository, model_type, params=3):
@@ -67,7 +87,6 @@ def apply(session, status, selected_repositories, retry,
         session.commit()
 
 
-@timeout(2 * 60, use_signals=False)
 def extract_features(text, checker):
     """Use cell visitor to extract features from cell text"""
     visitor = CellVisitor(checker)
@@ -78,3 +97,60 @@ def extract_features(text, checker):
     visitor.visit(parsed)
 
     return visitor.modules, visitor.data_ios, visitor.extracted_args, visitor.missed_args
+
+
+def extract_source_features(text):
+    """Extract features without checking module locality. Runs in worker processes"""
+    return extract_features(text, DeferredLocalChecker())
+
+
+def resolve_features(features, checker):
+    """Unpack a (success, result) from extract_source_features and resolve module locality"""
+    success, result = features
+    if not success:
+        raise result
+    modules, data_ios, extracted_args, missed_args = result
+    modules = [
+        (line, import_type, module_name, checker.is_local(module_name))
+        for line, import_type, module_name, _ in modules
+    ]
+    return modules, data_ios, extracted_args, missed_args
+
+
+def extract_in_pool(pool, items, source, cache=None, chunk_size=1000, on_chunk=None, on_read=None):
+    """Yield (item, features) pairs in the order of items.
+
+    Items are read in chunks. Sources found in the cache skip the pool, and
+    the others are extracted by the pool and stored in the cache.
+    The pool extracts the whole chunk before its first item is yielded, so the
+    writes of a chunk do not keep a transaction open while the pool works.
+    on_read is called with each chunk after it was read, before the pool
+    extracts it. on_chunk is called with each chunk after all of its items
+    were consumed.
+    """
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            break
+        if on_read:
+            on_read(chunk)
+        texts = [source(item) for item in chunk]
+        cached = [cache.get(text) if cache else None for text in texts]
+        results = iter(list(pool.imap(extract_source_features, [
+            (text,) for text, features in zip(texts, cached) if features is None
+        ])))
+
+        for item, text, features in zip(chunk, texts, cached):
+            if features is None:
+                features = next(results)
+                if cache and features[0]:
+                    cache.add(text, features[1])
+            else:
+                features = (True, features)
+            yield item, features
+        if on_chunk:
+            on_chunk(chunk)
+
+    if cache:
+        cache.save()
@@ -16,7 +16,6 @@ import src.config.consts as consts
 
 from src.config.consts import Path, LOGS_DIR
 from contextlib import contextmanager
-from timeout_decorator import timeout, TimeoutError, timeout_decorator  # noqa: F401
 
 
 def to_unicode(text):
@@ -58,14 +57,20 @@ def savepid():
             ) + "\n")
 
 
+def utf8_path(path):
+    """ Renames a file whose path is not valid UTF-8, replacing the invalid bytes.
+    Returns the new path. Valid paths are not renamed """
+    new_path = path.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
+    if new_path != path:
+        os.rename(path, new_path)
+    return new_path
+
+
 def find_files(path, pattern):
     """ Find files recursively """
     for root, _, filenames in os.walk(str(path)):
         for filename in fnmatch.filter(filenames, pattern):
-            f = Path(root) / filename
-            new_name = str(f).encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
-            f.rename(new_name)
-            yield Path(new_name)
+            yield Path(utf8_path(os.path.join(root, filename)))
 
 
 def find_names(names, pattern, fn=Path):
@@ -86,18 +91,15 @@ def find_files_in_path(full_dir, patterns):
     ]
 
 
-def _target(queue, function, *args, **kwargs):
-    """Run a function with arguments and return output via a queue.
-    This is a helper function for the Process created in _Timeout. It runs
-    the function with positional arguments and keyword arguments and then
-    returns the function's output by way of a queue. If an exception gets
-    raised, it is returned to _Timeout that raises it by the value property.
-    """
-    try:
-        queue.put((True, function(*args, **kwargs)))
-    except:  # noqa
-        # traceback.print_exc()
-        queue.put((False, sys.exc_info()[1]))
+class TimeoutError(AssertionError):  # pylint: disable=redefined-builtin
+    """ Raised when a task exceeds its time limit in WorkerPool """
+
+    def __init__(self, value="Timed Out"):
+        super(TimeoutError, self).__init__(value)
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
 
 
 def check_exit(matches):
@@ -111,9 +113,6 @@ def check_exit(matches):
     return False
 
 
-timeout_decorator._target = _target
-
-
 def unzip_repository(repository):
     """Process repository"""
     if not repository.path.exists():
@@ -4,9 +4,78 @@ src_path = os.path.dirname(os.path.abspath(''))
 if src_path not in sys.path:
     sys.path.append(src_path)
 
+from sqlalchemy import and_, or_, not_, inspect
+
+import src.config.consts as consts
 from src.db.database import Repository, Cell, PythonFile, Notebook
 from src.config.states import PF_EMPTY, NB_GENERIC_LOAD_ERROR
 
+# Keys of the shard ranges of each filter
+CELL_SHARD_KEYS = [Cell.repository_id, Cell.notebook_id]
+PYTHON_FILE_SHARD_KEYS = [PythonFile.repository_id, PythonFile.id]
+
+
+def order_by(query, order):
+    """ Orders query by (column, descending) pairs """
+    return query.order_by(*[
+        column.desc() if descending else column.asc()
+        for column, descending in order
+    ])
+
+
+def after(order, values):
+    """ Returns the condition for rows that come after values in order """
+    conditions = []
+    for position, (column, descending) in enumerate(order):
+        equal = [previous == value for (previous, _), value in zip(order[:position], values)]
+        comparison = column < values[position] if descending else column > values[position]
+        conditions.append(and_(*(equal + [comparison])))
+    first, descending = order[0]
+    bound = first <= values[0] if descending else first >= values[0]
+    return and_(bound, or_(*conditions))
+
+
+def in_shard(keys, shard):
+    """ Returns the condition for rows whose keys are in the [lower, upper) range of shard.
+    None bounds are open """
+    lower, upper = shard
+    descending = [(key, True) for key in keys]
+    conditions = []
+    if lower is not None:
+        conditions += [keys[0] >= lower[0], not_(after(descending, lower))]
+    if upper is not None:
+        conditions += [keys[0] <= upper[0], after(descending, upper)]
+    return and_(*conditions)
+
+
+def stream(query, order, batch_size=None):
+    """ Iterates query by keyset pages of batch_size rows.
+
+    Each page starts after the order values of the last row of the previous
+    page, so the iteration survives commits and only one page is loaded at a
+    time. The columns of order must identify the rows.
+    """
+    batch_size = batch_size or consts.STREAM_BATCH_SIZE
+    values = None
+    while True:
+        page = query if values is None else query.filter(after(order, values))
+        rows = order_by(page, order).limit(batch_size).all()
+        if not rows:
+            return
+        values = [getattr(rows[-1], column.key) for column, _ in order]
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+
+
+def release(session, objects):
+    """ Expunges the objects that the session already committed """
+    for obj in objects:
+        state = inspect(obj)
+        if state.persistent and not state.modified:
+            session.expunge(obj)
+
 
 def filter_repositories(session, selected_repositories,
                         count, interval, reverse):
@@ -34,7 +103,7 @@ def filter_repositories(session, selected_repositories,
 
 
 def filter_markdown_cells(session, count, selected_repositories,
-                          interval, reverse):
+                          interval, reverse, stream_rows=False, shard=None):
     filters = [
         Cell.cell_type == 'markdown',
     ]
@@ -48,30 +117,28 @@ def filter_markdown_cells(session, count, selected_repositories,
             Cell.repository_id <= interval[1],
         ]
 
+    if shard:
+        filters += [in_shard(CELL_SHARD_KEYS, shard)]
+
     query = (session.query(Cell) .filter(*filters))
 
     if count:
         print(query.count())
         return
 
-    if reverse:
-        query = query.order_by(
-            Cell.repository_id.desc(),
-            Cell.notebook_id.asc(),
-            Cell.index.asc(),
-        )
-    else:
-        query = query.order_by(
-            Cell.repository_id.asc(),
-            Cell.notebook_id.asc(),
-            Cell.index.asc(),
-        )
-
-    return query
+    order = [
+        (Cell.repository_id, reverse),
+        (Cell.notebook_id, False),
+        (Cell.index, False),
+        (Cell.id, False),
+    ]
+    if stream_rows:
+        return stream(query, order)
+    return order_by(query, order)
 
 
 def filter_code_cells(session, selected_notebooks, selected_repositories,
-                      count, interval, reverse):
+                      count, interval, reverse, stream_rows=False, shard=None):
     filters = [
         Cell.cell_type == 'code',
         Cell.python.is_(True),
@@ -89,30 +156,28 @@ def filter_code_cells(session, selected_notebooks, selected_repositories,
             Cell.repository_id <= interval[1],
         ]
 
+    if shard:
+        filters += [in_shard(CELL_SHARD_KEYS, shard)]
+
     query = (session.query(Cell).filter(*filters))
 
     if count:
         print(query.count())
         return
 
-    if reverse:
-        query = query.order_by(
-            Cell.repository_id.desc(),
-            Cell.notebook_id.asc(),
-            Cell.index.asc(),
-        )
-    else:
-        query = query.order_by(
-            Cell.repository_id.asc(),
-            Cell.notebook_id.asc(),
-            Cell.index.asc(),
-        )
-
-    return query
+    order = [
+        (Cell.repository_id, reverse),
+        (Cell.notebook_id, False),
+        (Cell.index, False),
+        (Cell.id, False),
+    ]
+    if stream_rows:
+        return stream(query, order)
+    return order_by(query, order)
 
 
 def filter_python_files(session, selected_python_files, selected_repositories,
-                        count, interval, reverse):
+                        count, interval, reverse, stream_rows=False, shard=None):
     filters = [
         PythonFile.state != PF_EMPTY
     ]
@@ -129,6 +194,9 @@ def filter_python_files(session, selected_python_files, selected_repositories,
             PythonFile.repository_id <= interval[1],
         ]
 
+    if shard:
+        filters += [in_shard(PYTHON_FILE_SHARD_KEYS, shard)]
+
     query = (
         session.query(PythonFile)
         .filter(*filters)
@@ -138,19 +206,16 @@ def filter_python_files(session, selected_python_files, selected_repositories,
         print(query.count())
         return
 
-    if reverse:
-        query = query.order_by(
-            PythonFile.repository_id.desc(),
-        )
-    else:
-        query = query.order_by(
-            PythonFile.repository_id.asc()
-        )
-
-    return query
+    order = [
+        (PythonFile.repository_id, reverse),
+        (PythonFile.id, False),
+    ]
+    if stream_rows:
+        return stream(query, order)
+    return order_by(query, order)
 
 
-def filter_notebooks(session, selected_repositories, count, interval, reverse):
+def filter_notebooks(session, selected_repositories, count, interval, reverse, stream_rows=False):
     filters = [
         Notebook.state != NB_GENERIC_LOAD_ERROR
     ]
@@ -170,15 +235,10 @@ def filter_notebooks(session, selected_repositories, count, interval, reverse):
         print(query.count())
         return
 
-    if reverse:
-        query = query.order_by(
-            Notebook.repository_id.desc(),
-            Notebook.id.desc(),
-        )
-    else:
-        query = query.order_by(
-            Notebook.repository_id.asc(),
-            Notebook.id.asc(),
-        )
-
-    return query
+    order = [
+        (Notebook.repository_id, reverse),
+        (Notebook.id, reverse),
+    ]
+    if stream_rows:
+        return stream(query, order)
+    return order_by(query, order)
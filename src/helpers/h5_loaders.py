@@ -9,11 +9,21 @@ import src.config.consts as consts
 
 from src.config.states import REP_UNAVAILABLE_FILES
 from src.helpers.h3_utils import vprint, to_unicode, unzip_repository, get_pyexec
+from src.helpers.h13_file_inventory import git_backend
 from src.classes.c4_local_checkers import CompressedLocalChecker, PathLocalChecker
+from src.classes.c4_local_checkers import GitTreeLocalChecker
+from src.classes.c9_git_blobs import GitTree
 
 
 def load_archives(session, repository):
 
+    if git_backend(repository):
+        vprint(1, 'Reading tree of commit {}'.format(repository.commit))
+        try:
+            return False, (GitTree(repository.path, repository.commit), "")
+        except Exception as err:  # pylint: disable=broad-except
+            vprint(1, 'Failed: {}'.format(err))
+
     if repository.zip_path.exists():
         vprint(1, 'Unzipping repository')
 
@@ -63,7 +73,9 @@ def load_files(
         tarzip, repo_path = archives
         file_path = os.path.join(repo_path, name)
 
-        if tarzip:
+        if isinstance(tarzip, GitTree):
+            checker = GitTreeLocalChecker(tarzip, file_path)
+        elif tarzip:
             checker = CompressedLocalChecker(tarzip, file_path)
         else:
             checker = PathLocalChecker(file_path)
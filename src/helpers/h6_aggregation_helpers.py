@@ -5,7 +5,7 @@ if src_path not in sys.path:
     sys.path.append(src_path)
 
 from collections import Counter, OrderedDict
-from src.db.database import CellModule, CellMarkdownFeature, PythonFileModule, CellDataIO, PythonFileDataIO, DataIO
+from src.db.database import CellModule, CellMarkdownFeature, PythonFileModule, CellDataIO, PythonFileDataIO
 from src.helpers.h3_utils import vprint
 
 IGNORE_COLUMNS = {
@@ -179,23 +179,22 @@ def calculate_data_ios(file, file_type):
         if check_index:
             index = data_io.index
 
-        row = DataIO(
-            repository_id=file.repository_id,
-            notebook_id=notebook_id,
-            python_file_id=python_file_id,
-            type=file_type,
-            index=index,
-            line=data_io.line,
-            infered_type=infered_function_type,
-            caller=data_io.caller,
-            function_name=data_io.function_name,
-            function_type=data_io.function_type,
-            source=data_io.source,
-            infered_source_type=infered_source_type,
-            infered_file=infered_file,
-            infered_file_extension=infered_file_extension
-
-        )
+        row = {
+            "repository_id": file.repository_id,
+            "notebook_id": notebook_id,
+            "python_file_id": python_file_id,
+            "type": file_type,
+            "index": index,
+            "line": data_io.line,
+            "infered_type": infered_function_type,
+            "caller": data_io.caller,
+            "function_name": data_io.function_name,
+            "function_type": data_io.function_type,
+            "source": data_io.source,
+            "infered_source_type": infered_source_type,
+            "infered_file": infered_file,
+            "infered_file_extension": infered_file_extension
+        }
 
         dtiorows.append(row)
     return dtiorows
@@ -6,10 +6,27 @@ that were collected in `s1_collect.py` and then filtered and selected
 in `s2_filter.py`.
 
 It consists of loop that goes through the repositories in waves of a certing
-SIZE_LIMIT that you can set. The extraction is done by executing a series of
+SIZE_LIMIT that you can set. The waves are planned once (h10_batch_planner)
+and can also be limited by an estimated runtime with --time-budget. The extraction is done by executing a series of
 extraction scripts that are located in the `src/extractions` folder in a certain
 order that you can also set.
 
+By default, the scripts run in processes forked from a fork server that
+s3_extract starts before its threads, with the scripts already imported.
+Forking s3_extract itself could copy a lock held by one of its threads.
+With --runner subprocess, each script starts in a new MAIN_VERSION interpreter.
+
+Scripts run as soon as the scripts they depend on (DEPENDENCIES) finish,
+with at most --max-parallel-stages scripts at once. The runtime of each script
+is saved in the Extraction.
+
+With --backend git, e1 clones without checkout and the scripts read the
+repository files from git objects (BACKEND_SCRIPTS receive the option).
+
+With --pipeline, the download of the next batch runs while the current batch
+is extracted, as long as both batches fit in the disk budget. Repositories
+left inbetween states by an interrupted run are extracted first.
+
 There's also a second thread that allows you two pause
 the loop if and when you want to, by typing stop.
 """
@@ -20,22 +37,32 @@ dir_path = os.path.dirname(os.path.abspath(''))
 if dir_path not in sys.path:
     sys.path.append(dir_path)
 
+import json
+import time
+import shutil
 import select
+import argparse
+import importlib
 import subprocess
+import multiprocessing
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 
-from sqlalchemy import func, Integer, cast # noqa
+from sqlalchemy import func
 
 from src.classes.c2_status_logger import StatusLogger
-from src.config.consts import EXTRACTION_DIR, LOGS_DIR, MAIN_VERSION, MACHINE
+import src.config.consts as consts
+from src.config.consts import EXTRACTION_DIR, LOGS_DIR, MAIN_VERSION, MACHINE, REPOS_DIR
 from src.config.states import *
-from src.db.database import connect, Repository, Extraction
+from src.db.database import connect, dispose_engines, Repository, Extraction, RepositoryStateCount
 from src.helpers.h3_utils import check_exit, savepid, vprint, remove_repositorires
+from src.helpers.h10_batch_planner import plan_batches, next_batch
 
 stop = False
 
 SIZE_LIMIT = 500 * (10 ** 3)  # 100 MB (since disk usage already comes in KB)
+DISK_BUDGET = 2 * SIZE_LIMIT  # both batches on disk in pipelined mode
 
 ORDER = [
     "e1_download",
@@ -49,23 +76,65 @@ ORDER = [
     "ag2_python_aggregate"
 ]
 
+# Scripts that run ahead for the next batch in pipelined mode
+PREFETCH = {"e1_download"}
+
+# Scripts that read repository files, and take the extraction backend (--backend)
+BACKEND_SCRIPTS = [
+    "e1_download",
+    "e2_notebooks_and_cells",
+    "e3_python_files",
+    "e4_requirement_files",
+    "e6_code_cells",
+    "e7_python_features",
+]
+
+# Scripts that must finish before each script starts. Scripts missing here
+# depend on the previous script in ORDER. e4 waits for e3 because it only
+# processes repositories with the state set by e3 (REP_PF_EXTRACTED).
+DEPENDENCIES = {
+    "e1_download": [],
+    "e2_notebooks_and_cells": ["e1_download"],
+    "e3_python_files": ["e2_notebooks_and_cells"],
+    "e4_requirement_files": ["e3_python_files"],
+    "e5_markdown_cells": ["e2_notebooks_and_cells"],
+    "e6_code_cells": ["e2_notebooks_and_cells"],
+    "e7_python_features": ["e3_python_files"],
+    "ag1_notebook_aggregate": ["e5_markdown_cells", "e6_code_cells"],
+    "ag2_python_aggregate": ["e7_python_features"],
+}
+
+
+# Package of the extraction scripts imported by the fork server
+STAGE_PACKAGE = "src.extractions"
+
+
+class StageError(Exception):
+    """ Extraction script failure. Keeps the runtimes of the scripts that finished """
+
+    def __init__(self, script, runtimes):
+        super(StageError, self).__init__("Extraction failed on {}.".format(script))
+        self.script = script
+        self.runtimes = runtimes
+
 
-def save_extraction(session, start, end, selected_repositories, error=False, failure=None):
+def save_extraction(session, start, end, selected_repositories, error=False, failure=None, runtimes=None):
     repositories_ids = [int(item) for item in selected_repositories if item.isdigit()]
     repositories = session.query(Repository).filter(Repository.id.in_(repositories_ids))
+    stage_runtimes = json.dumps(runtimes) if runtimes is not None else None
 
     if not error:
         extract = Extraction(
             start=start, end=end, runtime=end - start,
             repositores=len(repositories_ids),
-            state=EXTRACTED_SUCCESS
+            state=EXTRACTED_SUCCESS, stage_runtimes=stage_runtimes
         )
 
     else:
         extract = Extraction(
             start=start, end=end, runtime=end - start,
             repositores=len(repositories_ids),
-            state=EXTRACTED_ERROR, failure=failure
+            state=EXTRACTED_ERROR, failure=failure, stage_runtimes=stage_runtimes
         )
 
     session.add(extract)
@@ -80,46 +149,34 @@ def save_extraction(session, start, end, selected_repositories, error=False, fai
     remove_repositorires(repositories)
 
 
-def inform(session, iteration, selected_output):
-    query = session.query(Repository)
-    processed = query.filter(Repository.state == REP_FINISHED).count()
-    inbetween = query.filter(Repository.state.in_(REP_EXTRACT_ORDER)).count()
-    unprocessed = query.filter(Repository.state == REP_SELECTED).count()
-    failed = query.filter(Repository.state.in_(REP_ERRORS)).count()
-
-    # size_processed
-    result_processed = query.filter(Repository.state == REP_FINISHED).with_entities(
-        func.sum(func.cast(Repository.disk_usage, Integer))).one()[0]
-    if result_processed is not None:
-        size_processed = int(result_processed) / (10 ** 6)
+def state_counts(session):
+    """ Returns {state: (repositories, disk_usage_kb)}.
+    Reads repository_state_counts, or groups the repositories by state """
+    if consts.MATERIALIZED_STATE_COUNTS:
+        rows = session.query(
+            RepositoryStateCount.state, RepositoryStateCount.repositories, RepositoryStateCount.disk_usage_kb
+        )
     else:
-        size_processed = 0
+        rows = session.query(
+            Repository.state, func.count(Repository.id), func.sum(Repository.disk_usage_kb)
+        ).group_by(Repository.state)
+    return {state: (count, size or 0) for state, count, size in rows}
 
-    # size_inbetween
-    result_inbetween = query.filter(Repository.state.in_(REP_EXTRACT_ORDER)).with_entities(
-        func.sum(func.cast(Repository.disk_usage, Integer))).one()[0]
-    if result_inbetween is not None:
-        size_inbetween = int(result_inbetween) / (10 ** 6)
-    else:
-        size_inbetween = 0
 
-    # size_unprocessed
-    result_unprocessed = query.filter(Repository.state == REP_SELECTED).with_entities(
-        func.sum(func.cast(Repository.disk_usage, Integer))).one()[0]
-    if result_unprocessed is not None:
-        size_unprocessed = int(result_unprocessed) / (10 ** 6)
-    else:
-        size_unprocessed = 0
+def inform(session, iteration, selected_output):
+    counts = state_counts(session)
 
-    # size_failed
-    result_failed = query.filter(Repository.state.in_(REP_ERRORS)).with_entities(
-        func.sum(func.cast(Repository.disk_usage, Integer))).one()[0]
-    if result_failed is not None:
-        size_failed = int(result_failed) / (10 ** 6)
-    else:
-        size_failed = 0
+    def count_states(states):
+        repositories = sum(counts.get(state, (0, 0))[0] for state in states)
+        size = sum(counts.get(state, (0, 0))[1] for state in states)
+        return repositories, size / (10 ** 6)
+
+    processed, size_processed = count_states([REP_FINISHED])
+    inbetween, size_inbetween = count_states(REP_EXTRACT_ORDER)
+    unprocessed, size_unprocessed = count_states([REP_SELECTED])
+    failed, size_failed = count_states(REP_ERRORS)
 
-    total = size_processed + size_unprocessed + size_failed
+    total = (size_processed + size_unprocessed + size_failed) or 1
 
     vprint(1, "Processed Repositories: {} ({:.2f}GB - {:.2f}%)"
            .format(processed, size_processed, (size_processed/total)*100),
@@ -138,6 +195,50 @@ def inform(session, iteration, selected_output):
     vprint(2, selected_output + "\n\n")
 
 
+def stage_module(script):
+    """ Returns the module name of an extraction script """
+    return STAGE_PACKAGE + "." + script
+
+
+def start_stage_server(scripts):
+    """ Starts the fork server with the extraction scripts imported.
+    It must start before s3_extract starts threads. The server does not
+    inherit sys.path, so the repository is added to its PYTHONPATH """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ["PYTHONPATH"] = os.pathsep.join(
+        [root] + [path for path in os.environ.get("PYTHONPATH", "").split(os.pathsep) if path]
+    )
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([stage_module(script) for script in scripts])
+    multiprocessing.forkserver.ensure_running()
+
+
+def run_stage(name, args, out):
+    """ Runs the main function of an extraction module in a process of the fork server """
+    with open(out, "ab") as outf:
+        os.dup2(outf.fileno(), 1)
+        os.dup2(outf.fileno(), 2)
+    sys.stdout = os.fdopen(1, "w", buffering=1)
+    sys.stderr = os.fdopen(2, "w", buffering=1)
+    dispose_engines()
+    module = importlib.import_module(name)
+    sys.argv = [module.__file__] + [str(arg) for arg in args]
+    module.main()
+
+
+def fork_script(script, args, outf):
+    """ Runs an extraction script in a process forked from the fork server.
+    The child uses the interpreter of s3_extract instead of MAIN_VERSION.
+    Returns the exit code """
+    outf.flush()
+    process = multiprocessing.get_context("forkserver").Process(
+        target=run_stage, args=(stage_module(script), args, outf.name)
+    )
+    process.start()
+    process.join()
+    return process.exitcode
+
+
 def execute_script(script, args, iteration):
     """ Execute script and save log """
     start = datetime.now()
@@ -152,11 +253,14 @@ def execute_script(script, args, iteration):
         out = str(out) + ".2"
 
     with open(str(out), "wb") as outf:
-        python = MAIN_VERSION
+        if consts.STAGE_RUNNER == "forkserver":
+            status = fork_script(script, args, outf)
+        else:
+            python = MAIN_VERSION
 
-        options = [str(python), '-u', EXTRACTION_DIR + os.sep + script + ".py"] + args
+            options = [str(python), '-u', EXTRACTION_DIR + os.sep + script + ".py"] + args
 
-        status = subprocess.call(options, stdout=outf, stderr=outf)
+            status = subprocess.call(options, stdout=outf, stderr=outf)
         end = datetime.now()
 
         if status != 0:
@@ -167,48 +271,260 @@ def execute_script(script, args, iteration):
         return status
 
 
-def filtered_repositories(session):
-    return session.query(Repository)\
-        .filter(Repository.state == REP_SELECTED)\
-        .count()
+def stage_arguments(backend):
+    """ Returns the arguments of each script in ORDER, without the selected repositories """
+    return {
+        script: ["--backend", backend] if script in BACKEND_SCRIPTS else []
+        for script in ORDER
+    }
+
+
+def stage_dependencies(script, order):
+    """ Returns the scripts of order that must finish before script """
+    index = order.index(script)
+    dependencies = DEPENDENCIES.get(script, order[index - 1:index])
+    return [dependency for dependency in dependencies if dependency in order]
+
+
+def critical_path(runtimes, order):
+    """ Returns the runtime of the longest chain of dependent scripts.
+    order must list dependencies before the scripts that depend on them """
+    finish = {}
+    for script in order:
+        if script in runtimes:
+            finish[script] = runtimes[script] + max(
+                [finish.get(dependency, 0) for dependency in stage_dependencies(script, order)] or [0]
+            )
+    return max(finish.values()) if finish else 0
+
+
+def timed_script(script, args, iteration):
+    """ Executes a script and returns its runtime in seconds """
+    start = time.time()
+    if script.endswith(".py"):
+        script = script[:-3]
+    execute_script(script, args, iteration)
+    return time.time() - start
+
+
+def run_stages(to_execute, selected_repositories, iteration, max_parallel=None):
+    """ Executes each script as soon as its dependencies finish, at most max_parallel at once
+    (consts.MAX_PARALLEL_STAGES by default).
+    Returns {script: seconds}, or None if it found an .exit file.
+    On failure, it waits for the running scripts and raises StageError """
+    order = list(to_execute)
+    waiting = {script: set(stage_dependencies(script, order)) for script in order}
+    runtimes = {}
+    running = {}
+    failed = None
+    exiting = False
+    max_parallel = max_parallel or consts.MAX_PARALLEL_STAGES
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+        while True:
+            if not failed and not exiting and check_exit({"all", "main", "main.py"}):
+                vprint(0, "Found .exit file. Exiting")
+                exiting = True
+
+            if not failed and not exiting:
+                ready = [script for script in order if script in waiting and not waiting[script]]
+                for script in ready[:max(1, max_parallel) - len(running)]:
+                    del waiting[script]
+                    args = to_execute[script] + selected_repositories
+                    running[executor.submit(timed_script, script, args, iteration)] = script
+
+            if not running:
+                break
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                script = running.pop(future)
+                try:
+                    runtimes[script] = future.result()
+                except Exception:  # pylint: disable=broad-except
+                    failed = failed or script
+                    continue
+                for dependencies in waiting.values():
+                    dependencies.discard(script)
+
+    if failed:
+        raise StageError(failed, runtimes)
+    if exiting:
+        return None
+    return runtimes
+
+
+def inform_stages(runtimes, order, wall):
+    """ Shows the runtime of each script and the speedup over running them in sequence """
+    sequential = sum(runtimes.values())
+    critical = critical_path(runtimes, order)
+    vprint(2, "Stages: {}".format(", ".join(
+        "{} {:.0f}s".format(script, runtimes[script]) for script in order if script in runtimes
+    )))
+    vprint(2, "Sequential {:.0f}s, critical path {:.0f}s, wall {:.0f}s. Speedup {:.2f}x (bound {:.2f}x)".format(
+        sequential, critical, wall,
+        sequential / wall if wall else 0,
+        sequential / critical if critical else 0
+    ))
+
+
+def select_repositories(session, size_limit=SIZE_LIMIT, exclude=None):
+    """ Selects the next planned batch. Returns False if it does not fit in size_limit """
+    plan_batches(session, SIZE_LIMIT, consts.BATCH_TIME_BUDGET)
+    repositories, cost = next_batch(session, exclude)
+    if batch_size(repositories) >= size_limit:
+        return False, None
 
+    options_to_all, selected_output = repositories_options(repositories, "Selected")
+    if options_to_all:
+        selected_output += " - Estimated {:.0f}s".format(cost)
+    return options_to_all, selected_output
 
-def select_repositories(session):
-    filtered_repos = session.query(Repository).filter(Repository.state == REP_SELECTED)\
-        .order_by(cast(Repository.disk_usage, Integer).desc())
-    iteration_repositories = []
-    iteration_size = 0
-    options_to_all = ['-sr']
 
-    # to set a limit of repositories per iteration
-    limit = False
-    count = 0
+def recover_repositories(session):
+    """ Selects the repositories left inbetween states by an interrupted iteration """
+    recovered = session.query(Repository).filter(
+        Repository.state.in_(REP_EXTRACT_ORDER),
+        Repository.extraction_id.is_(None)
+    ).order_by(Repository.id).all()
+    return repositories_options(recovered, "Recovered")
 
-    for rep in filtered_repos:
 
-        """
-        disk_usage: The number of KBs (kilobytes) this repository occupies on disk.
-        """
-        if limit and count >= 100:
-            break
+def repositories_options(repositories, action):
+    if len(repositories) == 0:
+        return False, None
 
-        if iteration_size + int(rep.disk_usage) < SIZE_LIMIT:
-            iteration_size = iteration_size + int(rep.disk_usage)
-            iteration_repositories.append(rep)
-            count = count + 1
+    ids = [repo.id for repo in repositories]
+    size = batch_size(repositories)
+    options_to_all = ['-sr'] + [str(id_) for id_ in ids]
 
-    if len(iteration_repositories) == 0:
-        return False, None
+    selected_output = "{} {} Repositories:{} ({:.2f}KB / {:.2f}MB / {:.2f}GB)"\
+        .format(action, len(ids), ids, size, size / (10 ** 3), size / (10 ** 6))
 
-    ids = [repo.id for repo in iteration_repositories]
+    return options_to_all, selected_output
 
-    selected_output = "Selected {} Repositories:{} ({:.2f}KB / {:.2f}MB / {:.2f}GB)"\
-        .format(len(ids), ids, iteration_size, iteration_size / (10 ** 3), iteration_size / (10 ** 6))
 
-    for id_ in ids:
-        options_to_all.append(str(id_))
+def batch_size(repositories):
+    """ Returns the disk usage of the repositories in KB """
+    return sum(int(rep.disk_usage or 0) for rep in repositories)
 
-    return options_to_all, selected_output
+
+def selected_ids(selected_repositories):
+    return [int(item) for item in selected_repositories if item.isdigit()]
+
+
+def prefetch_limit(session, selected_repositories, disk_budget=DISK_BUDGET):
+    """ Returns the size limit of the next batch while the current one is on disk.
+    Both batches must fit in disk_budget and in the free space of REPOS_DIR """
+    current = session.query(Repository).filter(Repository.id.in_(selected_ids(selected_repositories)))
+    free = shutil.disk_usage(REPOS_DIR).free // 1024 if os.path.exists(REPOS_DIR) else disk_budget
+    return min(SIZE_LIMIT, disk_budget - batch_size(current), free)
+
+
+def prefetch(to_execute, selected_repositories, iteration):
+    """ Downloads a batch. Returns its start, and its runtimes, None on .exit or the StageError """
+    start = datetime.utcnow()
+    download = {script: args for script, args in to_execute.items() if script in PREFETCH}
+    try:
+        return start, run_stages(download, selected_repositories, iteration)
+    except StageError as err:
+        return start, err
+
+
+def next_iteration(session):
+    previous_iteration = session.query(func.max(Extraction.id)).scalar()
+    return (previous_iteration + 1) if previous_iteration is not None else 1
+
+
+def run_iteration(session, to_execute, selected_repositories, iteration, start, done=None):
+    """ Executes the scripts that are not done for the selected repositories and saves the Extraction.
+    done holds the runtimes of scripts that already ran. Returns False if it found an .exit file """
+    done = done or {}
+    try:
+        pending = {script: args for script, args in to_execute.items() if script not in done}
+        runtimes = run_stages(pending, selected_repositories, iteration)
+        if runtimes is None:
+            return False
+        runtimes.update(done)
+        end = datetime.utcnow()
+
+        save_extraction(session, start, end, selected_repositories, runtimes=runtimes)
+        vprint(4, "\033[92mRepositories from iteration {} extracted successfully!! Duration:{}\033[0m"
+               .format(iteration, end - start))
+        inform_stages(runtimes, list(to_execute), (end - start).total_seconds())
+
+    except StageError as err:
+        vprint(4, "\033[91mError extracting repositories from iteration {} \n{}\033[0m"
+               .format(iteration, err))
+
+        end = datetime.utcnow()
+        runtimes = dict(done, **err.runtimes)
+        save_extraction(session, start, end, selected_repositories,
+                        error=True, failure=err.script, runtimes=runtimes)
+
+    except Exception as err:
+        vprint(4, "\033[91mError extracting repositories from iteration {} \n{}\033[0m"
+               .format(iteration, err))
+
+        end = datetime.utcnow()
+        save_extraction(session, start, end, selected_repositories, error=True)
+
+    return True
+
+
+def run_sequential(session, to_execute, selected_repositories, selected_output):
+    """ Downloads and extracts one batch at a time """
+    while selected_repositories and not stop:
+        iteration = next_iteration(session)
+        inform(session, iteration, selected_output)
+
+        if not run_iteration(session, to_execute, selected_repositories, iteration, datetime.utcnow()):
+            return
+
+        vprint(4, "\033[93mFiles from {} were removed from memory.\033[0m"
+               .format(selected_output))
+        selected_repositories, selected_output = select_repositories(session)
+
+
+def run_pipelined(session, to_execute, selected_repositories, selected_output, disk_budget=DISK_BUDGET):
+    """ Downloads the next batch while the current batch is extracted """
+    with ThreadPoolExecutor(max_workers=1) as downloader:
+        iteration = next_iteration(session)
+        download = downloader.submit(prefetch, to_execute, selected_repositories, iteration)
+
+        while selected_repositories:
+            inform(session, iteration, selected_output)
+            start, downloaded = download.result()
+            if downloaded is None:
+                return
+
+            next_repositories, next_output = False, None
+            limit = prefetch_limit(session, selected_repositories, disk_budget)
+            if not stop and limit > 0:
+                next_repositories, next_output = select_repositories(
+                    session, limit, exclude=selected_ids(selected_repositories)
+                )
+            if next_repositories:
+                vprint(2, "Prefetching {}".format(next_output))
+                download = downloader.submit(prefetch, to_execute, next_repositories, iteration + 1)
+
+            if isinstance(downloaded, StageError):
+                vprint(4, "\033[91mError downloading repositories from iteration {} \n{}\033[0m"
+                       .format(iteration, downloaded))
+                save_extraction(session, start, datetime.utcnow(), selected_repositories, error=True,
+                                failure=downloaded.script, runtimes=downloaded.runtimes)
+            elif not run_iteration(session, to_execute, selected_repositories, iteration, start, downloaded):
+                return
+            vprint(4, "\033[93mFiles from {} were removed from memory.\033[0m"
+                   .format(selected_output))
+
+            iteration = next_iteration(session)
+            if not next_repositories and not stop:
+                # the budget did not fit both batches. Select the next one without the current
+                next_repositories, next_output = select_repositories(session)
+                if next_repositories:
+                    download = downloader.submit(prefetch, to_execute, next_repositories, iteration)
+            selected_repositories, selected_output = next_repositories, next_output
 
 
 def get_stop():
@@ -225,11 +541,40 @@ def get_stop():
 
 def main():
     """ Main function """
+    parser = argparse.ArgumentParser(description="Extract features from the selected repositories")
+    parser.add_argument("-p", "--pipeline", action="store_true",
+                        help="download the next batch while the current batch is extracted")
+    parser.add_argument("-b", "--disk-budget", type=int, default=DISK_BUDGET,
+                        help="KB of repositories on disk in pipelined mode")
+    parser.add_argument("-t", "--time-budget", type=int, default=consts.BATCH_TIME_BUDGET,
+                        help="estimated seconds per iteration when planning batches")
+    parser.add_argument("--replan", action="store_true",
+                        help="plan the batches of the selected repositories again")
+    parser.add_argument("--max-parallel-stages", type=int, default=consts.MAX_PARALLEL_STAGES,
+                        help="extraction scripts that run at once")
+    parser.add_argument("--runner", choices=["forkserver", "subprocess"], default=consts.STAGE_RUNNER,
+                        help="run the extraction scripts in processes of a fork server or in new interpreters")
+    parser.add_argument("--backend", choices=["worktree", "git"], default=consts.EXTRACTION_BACKEND,
+                        help="read repository files from a checkout (worktree) or from git objects (git)")
+    args = parser.parse_args()
+    consts.BATCH_TIME_BUDGET = args.time_budget
+    consts.MAX_PARALLEL_STAGES = args.max_parallel_stages
+    consts.STAGE_RUNNER = args.runner
+    consts.EXTRACTION_BACKEND = args.backend
+    if consts.STAGE_RUNNER == "forkserver":
+        start_stage_server(ORDER)
+
     with connect() as session, savepid():
 
         global stop
-        to_execute = {script: [] for script in ORDER}
-        selected_repositories, selected_output = select_repositories(session)
+        to_execute = stage_arguments(args.backend)
+        if args.replan:
+            vprint(2, "Planned {} batches".format(
+                plan_batches(session, SIZE_LIMIT, consts.BATCH_TIME_BUDGET, replan=True)
+            ))
+        selected_repositories, selected_output = recover_repositories(session)
+        if not selected_repositories:
+            selected_repositories, selected_output = select_repositories(session)
 
         if not selected_repositories:
             vprint(2, "\033[92mThere are no selected repositories to process.\033[0m")
@@ -239,43 +584,10 @@ def main():
         input_thread.start()
         vprint(0, "Starting extraction...\n")
 
-        while filtered_repositories(session) > 0 and selected_repositories and not stop:
-            try:
-                previous_iteration = session.query(func.max(Extraction.id)).scalar()
-                iteration = (previous_iteration + 1) if previous_iteration is not None else 1
-                inform(session, iteration, selected_output)
-
-                start = datetime.utcnow()
-                current_script = None
-                for script, args in to_execute.items():
-                    current_script = script
-
-                    if check_exit({"all", "main", "main.py"}):
-                        vprint(0, "Found .exit file. Exiting")
-                        return
-
-                    if script.endswith(".py"):
-                        script = script[:-3]
-
-                    args = args + selected_repositories
-                    execute_script(script, args, iteration)
-                end = datetime.utcnow()
-
-                save_extraction(session, start, end, selected_repositories)
-                vprint(4, "\033[92mRepositories from iteration {} extracted successfully!! Duration:{}\033[0m"
-                       .format(iteration, end - start))
-
-            except Exception as err:
-                vprint(4, "\033[91mError extracting repositories from iteration {} \n{}\033[0m"
-                       .format(iteration, err))
-
-                end = datetime.utcnow()
-                save_extraction(session, start, end, selected_repositories,
-                                error=True, failure=current_script)
-
-            vprint(4, "\033[93mFiles from {} were removed from memory.\033[0m"
-                   .format(selected_output))
-            selected_repositories, selected_output = select_repositories(session)
+        if args.pipeline:
+            run_pipelined(session, to_execute, selected_repositories, selected_output, args.disk_budget)
+        else:
+            run_sequential(session, to_execute, selected_repositories, selected_output)
 
         stop = True
         vprint(4, "\033[92mDone!\033[0m")
@@ -0,0 +1,68 @@
+""" Compares the unit of work and the bulk insert paths for Cell rows.
+
+Run with `python -m tests.benchmarks.bulk_insert_benchmark [rows]`
+"""
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.config.states import CELL_LOADED
+from src.db.database import Base, Cell, bulk_insert
+
+
+def cell_rows(total):
+    return [
+        {
+            "repository_id": 1,
+            "notebook_id": index // 50,
+            "index": index % 50,
+            "cell_type": "code",
+            "execution_count": str(index),
+            "lines": 2,
+            "output_formats": "text/plain",
+            "source": "import pandas as pd\ndf = pd.read_csv('data{}.csv')".format(index),
+            "python": True,
+            "state": CELL_LOADED,
+        } for index in range(total)
+    ]
+
+
+def orm_path(session, rows):
+    for row in rows:
+        session.add(Cell(**row))
+
+
+def bulk_path(session, rows):
+    bulk_insert(session, Cell, rows)
+
+
+def measure(path, total):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    rows = cell_rows(total)
+
+    start = time.perf_counter()
+    path(session, rows)
+    session.commit()
+    elapsed = time.perf_counter() - start
+
+    assert session.query(Cell).count() == total
+    session.close()
+    return elapsed
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    orm = measure(orm_path, total)
+    bulk = measure(bulk_path, total)
+    print("{} cells".format(total))
+    print("unit of work: {:.2f}s ({:.0f} rows/s)".format(orm, total / orm))
+    print("bulk insert:  {:.2f}s ({:.0f} rows/s)".format(bulk, total / bulk))
+    print("speedup: {:.1f}x".format(orm / bulk))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+""" Compares the InteractiveShell and the TransformerManager cell transformers.
+
+Startup is measured in a fresh interpreter for each path. Throughput is
+measured on a mix of plain python, magics and shell commands.
+
+Run with `python -m tests.benchmarks.cell_transformer_benchmark [cells]`
+"""
+import subprocess
+import sys
+import time
+
+
+SHELL_SETUP = (
+    "from IPython.core.interactiveshell import InteractiveShell\n"
+    "transform = InteractiveShell.instance().input_transformer_manager.transform_cell\n"
+)
+
+MANAGER_SETUP = (
+    "from IPython.core.inputtransformer2 import TransformerManager\n"
+    "transform = TransformerManager().transform_cell\n"
+)
+
+CELLS = [
+    "import pandas as pd\ndf = pd.read_csv('data.csv')\ndf.head()",
+    "%matplotlib inline\nimport matplotlib.pyplot as plt",
+    "!pip install numpy\nfiles = !ls",
+    "%%time\nfor i in range(10):\n    print(i)",
+    "def f(x):\n    return x * 2\n\nf(3)",
+    "df?",
+]
+
+
+def startup(setup, repeat=5):
+    """ Returns the best wall time to import and create a transformer """
+    code = "import time\nstart = time.perf_counter()\n{}print(time.perf_counter() - start)".format(setup)
+    times = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", code])
+        times.append(float(output.decode("utf-8").strip().splitlines()[-1]))
+    return min(times)
+
+
+def throughput(transform, total):
+    """ Returns transformed cells per second """
+    start = time.perf_counter()
+    for index in range(total):
+        transform(CELLS[index % len(CELLS)])
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    shell_startup = startup(SHELL_SETUP)
+    manager_startup = startup(MANAGER_SETUP)
+
+    namespace = {}
+    exec(SHELL_SETUP, namespace)  # pylint: disable=exec-used
+    shell_rate = throughput(namespace["transform"], total)
+    exec(MANAGER_SETUP, namespace)  # pylint: disable=exec-used
+    manager_rate = throughput(namespace["transform"], total)
+
+    print("startup  InteractiveShell:   {:.3f}s".format(shell_startup))
+    print("startup  TransformerManager: {:.3f}s".format(manager_startup))
+    print("cells/s  InteractiveShell:   {:.0f}".format(shell_rate))
+    print("cells/s  TransformerManager: {:.0f}".format(manager_rate))
+
+
+if __name__ == "__main__":
+    main()
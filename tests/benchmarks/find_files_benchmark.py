@@ -0,0 +1,85 @@
+""" Measures the file discovery of e2, e3 and e4 on a synthetic tree.
+
+The tree has [files] files (200000 by default) in directories of 200 files,
+a mix of notebooks, python files, requirement files and other files.
+It compares:
+- rename all: find_files renaming every match, as before
+- find_files: find_files renaming only names that are not valid UTF-8
+- six walks: find_files for e2 and e3 and find_files_in_path for e4
+- inventory: the single scandir traversal of h13_file_inventory
+
+Run with `python -m tests.benchmarks.find_files_benchmark [files]`
+"""
+import fnmatch
+import os
+import sys
+import tempfile
+import time
+
+from src.config.consts import Path
+from src.helpers.h3_utils import find_files, find_files_in_path
+from src.helpers.h13_file_inventory import scan_files, file_kind
+
+NAMES = ["model{}.py", "analysis{}.ipynb", "data{}.csv", "README{}.md", "image{}.png"]
+REQUIREMENTS = ["setup.py", "requirements.txt", "Pipfile", "Pipfile.lock"]
+FILES_PER_DIRECTORY = 200
+
+
+def create_tree(root, total):
+    """ Creates total empty files under root """
+    for index in range(total):
+        directory = os.path.join(root, "d{}".format(index // 2000), "s{}".format(index // FILES_PER_DIRECTORY))
+        if index % FILES_PER_DIRECTORY == 0:
+            os.makedirs(directory)
+        if index % FILES_PER_DIRECTORY < len(REQUIREMENTS) and index % 1000 < FILES_PER_DIRECTORY:
+            name = REQUIREMENTS[index % FILES_PER_DIRECTORY]
+        else:
+            name = NAMES[index % len(NAMES)].format(index)
+        open(os.path.join(directory, name), "w").close()
+
+
+def rename_all(path, pattern):
+    """ find_files before it skipped valid names """
+    for root, _, filenames in os.walk(str(path)):
+        for filename in fnmatch.filter(filenames, pattern):
+            f = Path(root) / filename
+            new_name = str(f).encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
+            f.rename(new_name)
+            yield Path(new_name)
+
+
+def six_walks(root):
+    return (
+        len(list(find_files(root, "*.ipynb"))) + len(list(find_files(root, "*.py")))
+        + sum(len(files) for files in find_files_in_path(root, REQUIREMENTS))
+    )
+
+
+def inventory(root):
+    return sum(1 for entry in scan_files(root) if file_kind(entry.name) is not None)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as root:
+        create_tree(root, total)
+        results = [
+            ("rename all", timed(lambda: sum(1 for _ in rename_all(root, "*.py")))),
+            ("find_files", timed(lambda: sum(1 for _ in find_files(root, "*.py")))),
+            ("six walks", timed(six_walks, root)),
+            ("inventory", timed(inventory, root)),
+        ]
+
+    print("files: {}".format(total))
+    for name, (elapsed, matches) in results:
+        print("{:<12} {:.2f}s  {} matches".format(name, elapsed, matches))
+
+
+if __name__ == "__main__":
+    main()
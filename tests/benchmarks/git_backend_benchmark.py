@@ -0,0 +1,109 @@
+""" Compares the worktree and git extraction backends on a synthetic repository.
+
+The repository has [files] files (20000 by default) in directories of 200 files,
+a mix of notebooks, python files and data files. Each backend clones it
+from a local remote and reads every notebook and python file:
+- worktree: clone with checkout, inventory by scandir, files opened by path
+- git: partial clone without checkout, inventory by git ls-tree, files read
+  from one git cat-file --batch
+
+Run with `python -m tests.benchmarks.git_backend_benchmark [files]`
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.classes.c9_git_blobs import GitBlobReader
+from src.config.consts import Path
+from src.helpers.h13_file_inventory import git_inventory_rows, inventory_rows
+
+NAMES = ["model{}.py", "analysis{}.ipynb", "data{}.csv", "image{}.png"]
+FILES_PER_DIRECTORY = 200
+
+
+class Repository(object):
+    """ The Repository columns used by h13_file_inventory """
+
+    def __init__(self, path, backend):
+        self.id = 1
+        self.path = Path(path)
+        self.commit = "HEAD"
+        self.backend = backend
+
+
+def git(*args, cwd=None):
+    subprocess.check_call(
+        ["git", "-c", "user.name=b", "-c", "user.email=b@b"] + list(args),
+        cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def create_origin(root, total):
+    """ Creates a repository with total files under root """
+    for index in range(total):
+        directory = os.path.join(root, "d{}".format(index // FILES_PER_DIRECTORY))
+        if index % FILES_PER_DIRECTORY == 0:
+            os.makedirs(directory)
+        name = NAMES[index % len(NAMES)].format(index)
+        with open(os.path.join(directory, name), "w") as ofile:
+            ofile.write('{"cells": []}\n' if name.endswith(".ipynb") else "x = {}\n".format(index) * 50)
+    git("init", "-q", cwd=root)
+    git("add", ".", cwd=root)
+    git("commit", "-qm", "init", cwd=root)
+    git("config", "uploadpack.allowFilter", "true", cwd=root)
+    git("config", "uploadpack.allowAnySHA1InWant", "true", cwd=root)
+
+
+def worktree(origin, target):
+    git("clone", "-q", "file://" + origin, target)
+    total = 0
+    for row in inventory_rows(Repository(target, "worktree")):
+        with open(os.path.join(target, row["path"])) as ofile:
+            total += len(ofile.read())
+    return total
+
+
+def git_objects(origin, target):
+    git("clone", "-q", "--no-checkout", "--filter=blob:none", "file://" + origin, target)
+    total = 0
+    with GitBlobReader(target) as reader:
+        for row in git_inventory_rows(Repository(target, "git")):
+            with reader.open(row["blob"], "r") as ofile:
+                total += len(ofile.read())
+    return total
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def disk_usage(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    ) / 1024 / 1024
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as root:
+        origin = os.path.join(root, "origin")
+        os.makedirs(origin)
+        create_origin(origin, total)
+        results = []
+        for name, function in [("worktree", worktree), ("git", git_objects)]:
+            target = os.path.join(root, name)
+            elapsed, characters = timed(function, origin, target)
+            results.append((name, elapsed, characters, disk_usage(target)))
+
+    print("files: {}".format(total))
+    for name, elapsed, characters, usage in results:
+        print("{:<10} {:.2f}s  {} characters  {:.1f} MB on disk".format(name, elapsed, characters, usage))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+""" Compares the per-cell and the shared markdown feature extraction of e5.
+
+per-cell builds a CountRenderer, a MarkdownWithMath parser and a stopwords
+list for every cell, as e5 did before. shared reuses the parser of
+e5.extract_features, the stopword frozensets and its LanguageDetector. Inserts compare one
+CellMarkdownFeature object per cell with the bulk rows of
+e5.process_markdown_cells.
+
+Run with `python -m tests.benchmarks.markdown_features_benchmark [cells]`
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+import src.extractions.e5_markdown_cells as e5
+from src.db.database import CellMarkdownFeature, get_engine, bulk_insert
+
+
+PARAGRAPHS = [
+    "This notebook analyzes the data of the survey and compares the results with the last year.",
+    "Este notebook tem o propósito de analisar o nível de escolaridade brasileiro no ano de 2022.",
+    "We use $\\alpha = 0.05$ and the model $$y = X\\beta + \\epsilon$$ for the regression.",
+    "See the [documentation](https://example.com/docs) and the `read_csv` **function** for *details*.",
+]
+
+BLOCKS = [
+    "# {title}\n\n{paragraph}",
+    "## {title}\n\n- {paragraph}\n- second item\n- third item",
+    "{paragraph}\n\n| column | value |\n|---|---|\n| a | 1 |\n| b | 2 |",
+    "> {paragraph}\n\n```python\nimport pandas as pd\n```",
+    "### {title}",
+]
+
+
+def corpus(total, seed=0):
+    """ Returns total markdown cells """
+    generator = random.Random(seed)
+    return [
+        generator.choice(BLOCKS).format(
+            title="Section {}".format(index),
+            paragraph=" ".join(generator.sample(PARAGRAPHS, 2))
+        ) for index in range(total)
+    ]
+
+
+def per_cell_features(text):
+    """ Feature extraction with the per-cell setup """
+    from langdetect import detect
+    from nltk.corpus import stopwords
+    from nbconvert.filters.markdown_mistune import MarkdownWithMath
+    from src.classes.c3_renderer import CountRenderer, LANG_MAP
+
+    language = 'undetected'
+    try:
+        language = LANG_MAP[detect(text)]
+        stopwords_set = stopwords.words(language)
+        using_stopwords = True
+    except Exception:  # noqa
+        stopwords_set = set()
+        using_stopwords = False
+
+    renderer = CountRenderer(language, stopwords_set, using_stopwords)
+    MarkdownWithMath(renderer=renderer, escape=False)(text)
+    words = text.split()
+    renderer.counter['stopwords'] = sum(1 for word in words if word in stopwords_set)
+    return renderer.counter
+
+
+def rate(function, texts):
+    """ Returns the cells per second of function """
+    start = time.perf_counter()
+    for text in texts:
+        function(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def insert_rate(session, rows, bulk):
+    """ Returns the inserted rows per second """
+    start = time.perf_counter()
+    if bulk:
+        bulk_insert(session, CellMarkdownFeature, rows)
+    else:
+        for row in rows:
+            session.add(CellMarkdownFeature(**row))
+    session.commit()
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    texts = corpus(total)
+
+    per_cell = rate(per_cell_features, texts)
+    shared = rate(e5.extract_features, texts)
+
+    rows = []
+    for index, text in enumerate(texts):
+        row = dict(e5.extract_features(text))
+        row.update(repository_id=1, notebook_id=1, cell_id=index + 1, index=index)
+        rows.append(row)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = get_engine("sqlite:///" + os.path.join(directory, "benchmark.sqlite"))
+        session = sessionmaker(bind=engine)()
+        objects = insert_rate(session, rows, bulk=False)
+        session.query(CellMarkdownFeature).delete()
+        session.commit()
+        bulk = insert_rate(session, rows, bulk=True)
+        session.close()
+        engine.dispose()
+
+    print("cells/s  per-cell setup: {:.0f}".format(per_cell))
+    print("cells/s  shared parser:  {:.0f}".format(shared))
+    print("rows/s   session.add:    {:.0f}".format(objects))
+    print("rows/s   bulk insert:    {:.0f}".format(bulk))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+""" Compares nbformat.read with the streaming reader of e2 on a notebook with large outputs.
+
+The notebook has code cells whose outputs hold base64 images and html tables,
+as notebooks with plots do. read_notebook runs with and without its nbformat 4
+fast path (e2 --nbformat). The readers are measured by time and peak memory
+(tracemalloc), including the conversion to nbformat 4 of load_notebook.
+
+Run with `python -m tests.benchmarks.notebook_reader_benchmark [cells] [output KB]`
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import nbformat as nbf
+
+from src.helpers.h12_notebook_reader import read_notebook
+
+
+def synthetic_notebook(cells, output_size):
+    """ Returns a notebook with code cells with image and html outputs """
+    return {
+        "nbformat": 4,
+        "nbformat_minor": 4,
+        "metadata": {"language_info": {"name": "python", "version": "3.8.16"}},
+        "cells": [
+            {
+                "cell_type": "code", "execution_count": index, "metadata": {},
+                "source": "df.plot()\ndf.head({})".format(index),
+                "outputs": [
+                    {"output_type": "display_data", "metadata": {},
+                     "data": {"image/png": "iVBORw0K" * (output_size // 8), "text/plain": ["<Figure>"]}},
+                    {"output_type": "execute_result", "execution_count": index, "metadata": {},
+                     "data": {"text/html": ["<tr><td>1</td></tr>\n"] * (output_size // 20)}},
+                ],
+            } for index in range(cells)
+        ],
+    }
+
+
+def measure(function, path):
+    """ Returns (seconds, peak MB) of function(ofile) """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(path) as ofile:
+        nbf.convert(function(ofile), 4)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    cells = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    output_size = int(sys.argv[2]) * 1024 if len(sys.argv) > 2 else 256 * 1024
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.ipynb")
+        with open(path, "w") as ofile:
+            json.dump(synthetic_notebook(cells, output_size), ofile)
+        size = os.path.getsize(path) / 1024 / 1024
+
+        results = {
+            "nbformat.read": measure(lambda ofile: nbf.read(ofile, nbf.NO_CONVERT), path),
+            "read_notebook": measure(read_notebook, path),
+            "read_notebook --nbformat": measure(lambda ofile: read_notebook(ofile, fast_path=False), path),
+        }
+
+    print("notebook: {:.1f} MB".format(size))
+    for name, (elapsed, peak) in results.items():
+        print("{:<26} {:.2f}s  peak {:.1f} MB".format(name, elapsed, peak))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+""" Measures small committed transactions per second with the default
+SQLite settings and with the connection profile of src.db.database.
+
+Run with `python -m tests.benchmarks.sqlite_profile_benchmark [commits]`
+"""
+import os
+import sys
+import time
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.db.database import Base, Commit, get_engine
+
+
+def default_engine(connection_string):
+    engine = create_engine(connection_string)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def measure(engine, total):
+    session = sessionmaker(bind=engine)()
+
+    start = time.perf_counter()
+    for index in range(total):
+        session.add(Commit(repository_id=1, type="commit", hash=str(index), author="bench"))
+        session.commit()
+    elapsed = time.perf_counter() - start
+
+    session.close()
+    return elapsed
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    directory = tempfile.mkdtemp()
+    results = []
+
+    for name, factory in (("default", default_engine), ("profile", get_engine)):
+        path = os.path.join(directory, name + ".sqlite")
+        elapsed = measure(factory("sqlite:////{}".format(path)), total)
+        results.append(elapsed)
+        print("{}: {:.2f}s ({:.0f} commits/s)".format(name, elapsed, total / elapsed))
+
+    print("speedup: {:.1f}x".format(results[0] / results[1]))
+
+
+if __name__ == "__main__":
+    main()
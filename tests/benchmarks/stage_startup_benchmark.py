@@ -0,0 +1,109 @@
+""" Compares the startup of the s3_extract stage runners.
+
+subprocess starts a new interpreter for each extraction script, which imports
+the script and creates the database engine. forkserver starts each script with
+s3_extract.fork_script from the fork server of start_stage_server, which
+imported all scripts once. Each runner starts all scripts of s3_extract.ORDER,
+as in one iteration.
+
+Each script is replaced by a stage module that imports it and only opens a
+database connection in main, so the runtime is the startup of the script.
+
+Run with `python -m tests.benchmarks.stage_startup_benchmark [repeat]`
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import src.s3_extract as s3
+
+STAGE_PACKAGE = "startup_stages"
+
+STAGE_CODE = (
+    "import sys\n"
+    "import src.extractions.{script}\n"
+    "from src.db.database import get_engine\n"
+    "\n"
+    "\n"
+    "def main():\n"
+    "    get_engine(sys.argv[1]).connect().close()\n"
+    "\n"
+    "\n"
+    "if __name__ == '__main__':\n"
+    "    main()\n"
+)
+
+
+def create_stages(directory):
+    """ Creates the stage module of each script of s3_extract.ORDER in directory """
+    package = os.path.join(directory, STAGE_PACKAGE)
+    os.makedirs(package)
+    open(os.path.join(package, "__init__.py"), "w").close()
+    for script in s3.ORDER:
+        with open(os.path.join(package, script + ".py"), "w") as ofile:
+            ofile.write(STAGE_CODE.format(script=script))
+
+
+def subprocess_start(script, connection, env):
+    """ Returns the wall time to start a script in a new interpreter """
+    start = time.perf_counter()
+    subprocess.check_call(
+        [sys.executable, "-m", "{}.{}".format(STAGE_PACKAGE, script), connection], env=env
+    )
+    return time.perf_counter() - start
+
+
+def forkserver_start(script, connection, out):
+    """ Returns the wall time to start a script from the fork server """
+    start = time.perf_counter()
+    with open(out, "wb") as outf:
+        status = s3.fork_script(script, [connection], outf)
+    if status != 0:
+        raise RuntimeError("{} failed. See {}".format(script, out))
+    return time.perf_counter() - start
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    with tempfile.TemporaryDirectory() as directory:
+        connection = "sqlite:///" + os.path.join(directory, "benchmark.sqlite")
+        out = os.path.join(directory, "stage.outerr")
+        create_stages(directory)
+        sys.path.insert(0, directory)
+        os.environ["PYTHONPATH"] = os.pathsep.join(
+            [directory, os.getcwd()] + [path for path in os.environ.get("PYTHONPATH", "").split(os.pathsep) if path]
+        )
+        s3.STAGE_PACKAGE = STAGE_PACKAGE
+
+        # The server imports the scripts after ensure_running returns, so the
+        # preload also includes the first script it starts
+        preload = time.perf_counter()
+        s3.start_stage_server(s3.ORDER)
+        forkserver_start(s3.ORDER[0], connection, out)
+        preload = time.perf_counter() - preload
+
+        subprocess_times = {
+            script: min(subprocess_start(script, connection, os.environ) for _ in range(repeat))
+            for script in s3.ORDER
+        }
+        forkserver_times = {
+            script: min(forkserver_start(script, connection, out) for _ in range(repeat))
+            for script in s3.ORDER
+        }
+
+    for script in s3.ORDER:
+        print("{:<24} subprocess: {:.3f}s  forkserver: {:.3f}s".format(
+            script, subprocess_times[script], forkserver_times[script]
+        ))
+    subprocess_total = sum(subprocess_times.values())
+    forkserver_total = sum(forkserver_times.values())
+    print("preload (once per s3_extract run): {:.3f}s".format(preload))
+    print("startup per iteration  subprocess: {:.3f}s  forkserver: {:.3f}s  saved: {:.3f}s".format(
+        subprocess_total, forkserver_total, subprocess_total - forkserver_total
+    ))
+
+
+if __name__ == "__main__":
+    main()
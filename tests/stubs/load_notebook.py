@@ -11,9 +11,15 @@ cells = [
      'python': True, 'state': CELL_LOADED}]
 
 
-def stub_load_notebook(repository_id, path, notebook_file, _nbrow):  # noqa: F841
+def stub_load_notebook(repository_id, path, notebook_file, _nbrow, _blob=None):  # noqa: F841
     return nbrow, cells
 
 
-def stub_load_notebook_error(_repository_id, _path, _notebook_file, _nbrow):
+def stub_load_notebook_error(_repository_id, _path, _notebook_file, _nbrow, _blob=None):
     raise AttributeError()
+
+
+def stub_load_notebook_by_name(_repository_id, _path, notebook_file, _nbrow, _blob=None):
+    if notebook_file == 'error.ipynb':
+        raise AttributeError()
+    return dict(nbrow, name=notebook_file), [dict(cell) for cell in cells]
@@ -0,0 +1,43 @@
+from src.config.states import NB_STOPPED, NB_LOADED, CELL_LOADED
+from src.classes.c1_safe_session import SafeSession
+from src.db.database import Notebook, Cell, bulk_insert
+from tests.factories.models import RepositoryFactory, NotebookFactory
+from tests.database_config import connection, session  # noqa: F401
+
+
+class TestSafeSessionBulk:
+    def test_bulk_insert(self, session):
+        repository = RepositoryFactory(session).create()
+        notebook = NotebookFactory(session).create(repository_id=repository.id)
+        rows = [
+            {"repository_id": repository.id, "notebook_id": notebook.id,
+             "index": index, "cell_type": "code", "source": "", "state": CELL_LOADED}
+            for index in range(3)
+        ]
+
+        inserted = bulk_insert(session, Cell, rows)
+        session.commit()
+
+        assert inserted == 3
+        assert session.query(Cell).count() == 3
+        assert session.query(Cell).first().machine is not None
+
+    def test_bulk_insert_empty(self, session):
+        assert bulk_insert(session, Cell, []) == 0
+
+    def test_dependent_bulk_add(self, session):
+        safe_session = SafeSession(session, interrupted=NB_STOPPED)
+        repository = RepositoryFactory(session).create()
+        notebook = Notebook(repository_id=repository.id, name="file.ipynb")
+        rows = [{"repository_id": repository.id, "notebook_id": None, "index": 0}]
+
+        safe_session.dependent_bulk_add(notebook, Cell, rows, "notebook_id")
+        assert notebook.state == NB_STOPPED
+
+        status, _ = safe_session.commit()
+        cell = session.query(Cell).first()
+
+        assert status is True
+        assert notebook.state == NB_LOADED
+        assert cell.notebook_id == notebook.id
+        assert safe_session.future == []
@@ -0,0 +1,63 @@
+import os
+import time
+
+from src.helpers.h3_utils import TimeoutError
+from src.classes.c6_worker_pool import WorkerPool
+
+
+def square(value):
+    return value * value
+
+
+def sleep_or_square(value):
+    if value < 0:
+        time.sleep(60)
+    return value * value
+
+
+def fail(value):
+    raise ValueError(value)
+
+
+def pid(_value):
+    return os.getpid()
+
+
+class TestWorkerPool:
+    def test_imap_in_order(self):
+        with WorkerPool(3) as pool:
+            results = list(pool.imap(square, [(value,) for value in range(20)]))
+
+        assert results == [(True, value * value) for value in range(20)]
+
+    def test_imap_exception(self):
+        with WorkerPool(2) as pool:
+            success, result = list(pool.imap(fail, [(1,)]))[0]
+
+        assert success is False
+        assert isinstance(result, ValueError)
+
+    def test_imap_timeout_replaces_only_stuck_worker(self):
+        with WorkerPool(2, timeout=0.5) as pool:
+            results = list(pool.imap(sleep_or_square, [(2,), (-1,), (3,)]))
+            respawned = pool.respawned
+
+        assert results[0] == (True, 4)
+        assert results[1][0] is False
+        assert isinstance(results[1][1], TimeoutError)
+        assert results[2] == (True, 9)
+        assert respawned == 1
+
+    def test_workers_are_reused(self):
+        with WorkerPool(2) as pool:
+            first = {result for _, result in pool.imap(pid, [(value,) for value in range(10)])}
+            second = {result for _, result in pool.imap(pid, [(value,) for value in range(10)])}
+
+        assert first == second
+        assert os.getpid() not in first
+
+    def test_imap_inline(self):
+        pool = WorkerPool(0)
+        results = list(pool.imap(pid, [(1,)]))
+
+        assert results == [(True, os.getpid())]
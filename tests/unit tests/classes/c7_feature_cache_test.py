@@ -0,0 +1,69 @@
+from src.db.database import CachedFeature
+from src.classes.c7_feature_cache import FeatureCache
+from src.helpers.h2_script_helpers import extract_source_features, extract_in_pool
+from src.classes.c6_worker_pool import WorkerPool
+from tests.database_config import connection, session  # noqa: F401
+
+
+SOURCE = "import pandas as pd\ndf = pd.read_csv('data.csv')"
+
+
+class TestFeatureCache:
+    def test_miss_then_hit(self, session):
+        cache = FeatureCache(session)
+        features = extract_source_features(SOURCE)
+
+        assert cache.get(SOURCE) is None
+        cache.add(SOURCE, features)
+        assert cache.get(SOURCE) == features
+        assert cache.hits == 1
+        assert cache.misses == 1
+        assert cache.hit_rate == 0.5
+
+    def test_persistent(self, session):
+        cache = FeatureCache(session)
+        features = extract_source_features(SOURCE)
+        cache.add(SOURCE, features)
+        cache.save()
+        session.commit()
+
+        other = FeatureCache(session)
+        modules, data_ios, extracted_args, missed_args = other.get(SOURCE)
+
+        assert session.query(CachedFeature).count() == 1
+        assert modules == [(1, "import", "pandas", None)]
+        assert data_ios == features[1]
+        assert (extracted_args, missed_args) == features[2:]
+
+    def test_save_ignores_existing(self, session):
+        features = extract_source_features(SOURCE)
+        first = FeatureCache(session)
+        first.add(SOURCE, features)
+        first.save()
+        second = FeatureCache(session)
+        second.add(SOURCE, features)
+        second.save()
+        session.commit()
+
+        assert session.query(CachedFeature).count() == 1
+
+    def test_version_key(self, session):
+        cache = FeatureCache(session)
+        cache.add(SOURCE, extract_source_features(SOURCE))
+        cache.save()
+
+        other = FeatureCache(session)
+        other.version += 1
+        assert other.get(SOURCE) is None
+
+    def test_extract_in_pool_skips_cached_sources(self, session):
+        cache = FeatureCache(session)
+        items = [SOURCE, "import numpy", SOURCE, "x = (", SOURCE]
+        with WorkerPool(1) as pool:
+            results = list(extract_in_pool(pool, items, lambda item: item, cache, chunk_size=2))
+
+        assert [item for item, _ in results] == items
+        assert [success for _, (success, _) in results] == [True, True, True, False, True]
+        assert cache.hits == 2
+        assert cache.misses == 3
+        assert session.query(CachedFeature).count() == 2
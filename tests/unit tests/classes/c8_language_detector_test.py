@@ -0,0 +1,68 @@
+from src.classes.c8_language_detector import LanguageDetector, script_language
+
+
+PORTUGUESE = "Este notebook tem o propósito de analisar o nível de escolaridade brasileiro no ano de 2022"
+ENGLISH = "This notebook analyzes the data of the survey and compares the results with the last year"
+
+
+class TestScriptLanguage:
+    def test_ascii(self):
+        assert script_language("# Data 2022") == (4, None)
+
+    def test_unique_script(self):
+        assert script_language("Ανάλυση δεδομένων")[1] == "greek"
+        assert script_language("데이터 분석")[1] == "korean"
+        assert script_language("データの分析")[1] == "japanese"
+
+    def test_shared_script(self):
+        assert script_language("Анализ данных")[1] is None
+        assert script_language("数据分析")[1] is None
+        assert script_language(PORTUGUESE)[1] is None
+
+    def test_minority_script(self):
+        assert script_language("We use α and β as the parameters of the model")[1] is None
+
+
+class TestLanguageDetector:
+    def test_full_detection(self):
+        detector = LanguageDetector()
+
+        assert detector.detect(PORTUGUESE) == "portuguese"
+        assert detector.detect(ENGLISH) == "english"
+        assert detector.detections == 2
+
+    def test_short_text_bypass(self, monkeypatch):
+        detector = LanguageDetector()
+        monkeypatch.setattr(detector, "full_detection", None)
+
+        assert detector.detect("# Results") == "undetected"
+        assert detector.detect("## Ανάλυση") == "greek"
+
+    def test_notebook_prior(self):
+        detector = LanguageDetector()
+        detector.start_notebook(1, ["## Resultados", PORTUGUESE])
+
+        assert detector.detect("## Resultados") == "portuguese"
+        assert detector.detect(PORTUGUESE) == "portuguese"
+        detector.start_notebook(1, [ENGLISH, ENGLISH])
+        assert detector.detect("## Conclusão") == "portuguese"
+        detector.start_notebook(2, ["## Conclusion"])
+        assert detector.detect("## Conclusion") == "undetected"
+        assert detector.detections == 1
+
+    def test_memoised(self):
+        detector = LanguageDetector(cache_size=1)
+
+        detector.detect(PORTUGUESE)
+        detector.detect(PORTUGUESE)
+        detector.detect(ENGLISH)
+        detector.detect(PORTUGUESE)
+
+        assert (detector.detections, detector.hits) == (3, 1)
+        assert len(detector.cache) == 1
+
+    def test_seed(self):
+        text = "Lorem ipsum dolor sit amet consectetur adipiscing"
+        languages = {LanguageDetector(seed=7).detect(text) for _ in range(5)}
+
+        assert len(languages) == 1
@@ -0,0 +1,108 @@
+import subprocess
+
+import pytest
+
+import src.classes.c9_git_blobs as c9
+from src.classes.c9_git_blobs import GitBlobReader, GitTree, blob_reader
+
+
+def git(*args, cwd=None):
+    return subprocess.check_output(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@test"] + list(args), cwd=cwd
+    ).decode("utf-8").strip()
+
+
+@pytest.fixture
+def repository(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "model.py").write_text("import numpy\n")
+    (tmp_path / "large.txt").write_bytes(b"x" * 100000 + b"\n")
+    (tmp_path / "empty.txt").write_text("")
+    git("init", "-q", cwd=str(tmp_path))
+    git("add", ".", cwd=str(tmp_path))
+    git("commit", "-qm", "init", cwd=str(tmp_path))
+    return tmp_path
+
+
+def blob(repository, path):
+    return git("rev-parse", "HEAD:" + path, cwd=str(repository))
+
+
+class TestGitBlobReader:
+
+    def test_read(self, repository):
+        with GitBlobReader(repository) as reader:
+            assert reader.read(blob(repository, "src/model.py")) == b"import numpy\n"
+            assert reader.read(blob(repository, "large.txt")) == b"x" * 100000 + b"\n"
+            assert reader.read(blob(repository, "empty.txt")) == b""
+
+    def test_unread_content_is_skipped(self, repository):
+        with GitBlobReader(repository) as reader:
+            stream = reader.open(blob(repository, "large.txt"))
+            assert stream.read(10) == b"x" * 10
+            assert reader.read(blob(repository, "src/model.py")) == b"import numpy\n"
+
+    def test_text_and_rewind(self, repository):
+        with GitBlobReader(repository) as reader:
+            with reader.open(blob(repository, "src/model.py"), "r") as stream:
+                assert stream.read(6) == "import"
+                stream.seek(0)
+                assert stream.read() == "import numpy\n"
+            assert reader.read(blob(repository, "empty.txt")) == b""
+
+    def test_missing_and_tree_objects(self, repository):
+        with GitBlobReader(repository) as reader:
+            with pytest.raises(FileNotFoundError):
+                reader.open("0" * 40)
+            with pytest.raises(IsADirectoryError):
+                reader.open(blob(repository, "src"))
+            assert reader.read(blob(repository, "src/model.py")) == b"import numpy\n"
+
+    def test_blob_reader_per_repository(self, repository, tmp_path_factory, monkeypatch):
+        monkeypatch.setattr(c9, "READER", None)
+        other = tmp_path_factory.mktemp("other")
+        git("init", "-q", cwd=str(other))
+
+        reader = blob_reader(repository)
+        assert blob_reader(repository) is reader
+        assert blob_reader(other) is not reader
+        assert reader.process.poll() is not None
+        c9.READER.close()
+
+    def test_restart_after_process_stops(self, repository, monkeypatch):
+        monkeypatch.setattr(c9, "READER", None)
+        model = blob(repository, "src/model.py")
+
+        reader = blob_reader(repository)
+        assert reader.read(model) == b"import numpy\n"
+        reader.process.kill()
+        reader.process.wait()
+
+        assert blob_reader(repository).read(model) == b"import numpy\n"
+        assert c9.READER is not reader
+        c9.READER.close()
+
+    def test_restart_after_eof_inside_blob(self, repository, monkeypatch):
+        monkeypatch.setattr(c9, "READER", None)
+        reader = blob_reader(repository)
+        stream = reader.open(blob(repository, "large.txt"))
+        stream.read(10)
+        reader.process.kill()
+        reader.process.wait()
+
+        with pytest.raises(EOFError):
+            stream.read()
+
+        assert reader.broken
+        assert blob_reader(repository).read(blob(repository, "src/model.py")) == b"import numpy\n"
+        c9.READER.close()
+
+
+class TestGitTree:
+
+    def test_exists(self, repository):
+        tree = GitTree(repository, "HEAD")
+
+        assert tree.exists("src")
+        assert tree.exists("src/model.py")
+        assert not tree.exists("src/other.py")
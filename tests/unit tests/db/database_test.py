@@ -0,0 +1,102 @@
+import sys
+from sqlalchemy import text
+
+from src.db.database import SCHEMA_VERSION, Repository
+from src.db.database import get_engine, create_schema
+from src.db.migrate import migrate, migration_engine
+import src.db.migrate as migrate_script
+
+
+class TestDatabaseEngine:
+    def test_engine_pragmas(self, tmp_path):
+        engine = get_engine("sqlite:////{}".format(tmp_path / "profile.sqlite"))
+
+        with engine.connect() as connection:
+            journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+            synchronous = connection.execute(text("PRAGMA synchronous")).scalar()
+            temp_store = connection.execute(text("PRAGMA temp_store")).scalar()
+
+        assert journal_mode == "wal"
+        assert synchronous == 1  # NORMAL
+        assert temp_store == 2  # MEMORY
+
+    def test_engine_is_reused(self, tmp_path):
+        connection_string = "sqlite:////{}".format(tmp_path / "reused.sqlite")
+
+        assert get_engine(connection_string) is get_engine(connection_string)
+
+    def test_create_schema_once(self, tmp_path):
+        engine = get_engine("sqlite:////{}".format(tmp_path / "schema.sqlite"))
+
+        with engine.connect() as connection:
+            version = connection.execute(text("PRAGMA user_version")).scalar()
+            tables = engine.dialect.get_table_names(connection)
+
+        assert version == SCHEMA_VERSION
+        assert Repository.__tablename__ in tables
+        assert create_schema(engine) is False
+
+    def test_migrate_creates_indexes(self, tmp_path):
+        engine = get_engine("sqlite:////{}".format(tmp_path / "migrate.sqlite"))
+
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_cells_code"))
+            connection.execute(text("PRAGMA user_version = 0"))
+
+        assert migrate(engine) == ["ix_cells_code"]
+        assert migrate(engine) == []
+        assert create_schema(engine) is False
+
+    def test_migrate_creates_columns(self, tmp_path):
+        engine = get_engine("sqlite:////{}".format(tmp_path / "columns.sqlite"))
+
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE extractions DROP COLUMN stage_runtimes"))
+            connection.execute(text("PRAGMA user_version = 0"))
+
+        assert migrate(engine) == ["extractions.stage_runtimes"]
+        assert migrate(engine) == []
+
+    def test_migrate_state_counts(self, tmp_path):
+        engine = get_engine("sqlite:////{}".format(tmp_path / "counts.sqlite"))
+
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO repositories (state, disk_usage) VALUES ('a', '10')"))
+            connection.execute(text("DROP TRIGGER tr_repository_state_counts_insert"))
+            connection.execute(text("INSERT INTO repositories (state, disk_usage) VALUES ('a', '5')"))
+            connection.execute(text("PRAGMA user_version = 0"))
+
+        migrate(engine)
+
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO repositories (state, disk_usage) VALUES ('b', '1')"))
+            counts = connection.execute(text(
+                "SELECT state, repositories, disk_usage_kb FROM repository_state_counts ORDER BY state"
+            )).fetchall()
+
+        assert [tuple(row) for row in counts] == [("a", 2, 15), ("b", 1, 1)]
+
+    def test_connect_leaves_indexes_to_migrate(self, tmp_path):
+        path = tmp_path / "indexes.sqlite"
+        with get_engine("sqlite:////{}".format(path)).begin() as connection:
+            connection.execute(text("DROP INDEX ix_cells_code"))
+            connection.execute(text("PRAGMA user_version = 0"))
+
+        engine = get_engine("sqlite:///{}".format(path))
+        with engine.connect() as connection:
+            indexes = {index["name"] for index in engine.dialect.get_indexes(connection, "cells")}
+            version = connection.execute(text("PRAGMA user_version")).scalar()
+
+        assert "ix_cells_code" not in indexes
+        assert version == SCHEMA_VERSION
+        assert migrate(migration_engine(str(path))) == ["ix_cells_code"]
+
+    def test_migrate_main_relative_path(self, tmp_path, monkeypatch, capsys):
+        with get_engine("sqlite:////{}".format(tmp_path / "main.sqlite")).begin() as connection:
+            connection.execute(text("DROP INDEX ix_cells_code"))
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(sys, "argv", ["migrate.py", "-d", "main.sqlite"])
+
+        migrate_script.main()
+
+        assert "1 columns and indexes created" in capsys.readouterr().out
@@ -6,8 +6,9 @@ if src not in sys.path:
     sys.path.append(src)
 
 from src.config.consts import TEST_REPOS_DIR
-from src.db.database import Commit
+from src.db.database import Commit, RepositoryFile
 from src.classes.c1_safe_session import SafeSession
+from src.classes.c2_status_logger import StatusLogger
 from src.config.states import *
 
 from tests.database_config import connection, session  # noqa: F401
@@ -15,6 +16,8 @@ from tests.factories.models import RepositoryFactory
 from tests.stubs.commits import stub_repo_commits, mock_load_rep_and_commits
 
 import shutil
+import threading
+import time
 import pytest
 import src.config.consts as consts
 import src.extractions.e1_download as e1
@@ -60,6 +63,23 @@ class TestDownloadProcessRepository:
         assert "redownloading" in captured.out
         shutil.rmtree(TEST_REPOS_DIR, ignore_errors=True)
 
+    def test_process_repository_retry_stopped(self, session, monkeypatch, capsys):
+        repository = RepositoryFactory(session).create(state=REP_STOPPED, commit="1")
+        downloads = []
+
+        def stub_load(_session, _repository, branch, commit, retry):
+            downloads.append((commit, _repository.path.exists()))
+            _repository.state = REP_LOADED
+
+        monkeypatch.setattr(e1, 'load_repository_and_commits', stub_load)
+        os.makedirs(repository.path, exist_ok=True)
+        output = e1.process_repository(session=session, repository=repository, retry=True)
+
+        assert output == "done"
+        assert downloads == [("1", False)]
+        assert "redownloading" in capsys.readouterr().out
+        shutil.rmtree(TEST_REPOS_DIR, ignore_errors=True)
+
     def test_process_repository_retry_failed_to_clone(self, session, monkeypatch, capsys):
         repository = RepositoryFactory(session).create(state=REP_FAILED_TO_CLONE)
 
@@ -125,6 +145,26 @@ class TestDownloadLoadRepositoryAndCommits:
         assert safe_session.query(Commit).count() == 0
         assert repository.state == REP_LOADED
 
+    @pytest.mark.parametrize("already_exists, commit, cleared", [
+        (False, "1", True), (True, "2", True), (True, "1", False),
+    ])
+    def test_load_repository_clears_inventory(self, session, monkeypatch, already_exists, commit, cleared):
+        repository = RepositoryFactory(session).create(state=REP_FILTERED, commit="1", inventory_files=1)
+        session.add(RepositoryFile(repository_id=repository.id, path="a.py", kind="python"))
+        session.commit()
+        safe_session = SafeSession(session, interrupted=REP_STOPPED)
+
+        monkeypatch.setattr(e1, 'clone', lambda *args: (repository.path, iter(stub_repo_commits()), already_exists))
+        monkeypatch.setattr(e1, 'git_output', lambda *args, cwd: commit.encode("utf-8"))
+
+        e1.load_repository_and_commits(safe_session, repository, retry=True)
+        safe_session.commit()
+
+        assert repository.commit == commit
+        assert (repository.inventory_files is None) == cleared
+        assert repository.backend == (None if already_exists else consts.EXTRACTION_BACKEND)
+        assert session.query(RepositoryFile).count() == (0 if cleared else 1)
+
     def test_load_repository_already_loaded(self, session, monkeypatch, capsys):
         repository = RepositoryFactory(session).create(state=REP_LOADED)
         safe_session = SafeSession(session, interrupted=REP_STOPPED)
@@ -210,6 +250,7 @@ class TestDownloadClone:
 
         full_dir, commits, already_exists = e1.clone(part, end, repo, remote,
                                                      branch=None, commit=commit)
+        commits = list(commits)
         last_commit = commits[5]
 
         assert already_exists is False
@@ -229,6 +270,7 @@ class TestDownloadClone:
 
         full_dir, commits, already_exists = e1.clone(part, end, repo, remote,
                                                      branch=branch, commit=None)
+        commits = list(commits)
 
         assert already_exists is False
         assert full_dir == consts.SELECTED_REPOS_DIR / "content" / part / end
@@ -273,47 +315,181 @@ class TestDownloadClone:
 
 
 class TestDownloadLoadCommits:
-    def test_load_commits(self, session, monkeypatch):
-        part = "test"
-        end = "test1"
-        remote = "https://github.com/luamz/save-marine"
-        repo = "luamz/save-marine"
-
-        commit = b'2022-12-20 09:01:24 -0300$_$d504211$_$luamz$_$Fixing path problems in linux\n'
-        merge = b"2022-12-20 09:01:43 -0300$_$f55de22$_$luamz$_$Merge branch 'master'\n"
+    def test_load_commits(self, monkeypatch):
+        commit = '2022-12-20 09:01:24 -0300$_$d504211$_$luamz$_$a1b2c3d$_$Fixing path problems in linux'
+        merge = "2022-12-20 09:01:43 -0300$_$f55de22$_$luamz$_$d504211 e4f5a6b$_$Merge branch 'master'"
 
-        def stub_git(*args):
-            if "--no-merges" in args:
-                return commit
-            elif "--merges" in args:
-                return merge
-        monkeypatch.setattr(e1, 'git_output', stub_git)
+        def stub_git_lines(*args):
+            assert "--no-merges" not in args and "--merges" not in args
+            yield merge
+            yield commit
+        monkeypatch.setattr(e1, 'git_lines', stub_git_lines)
 
-        full_dir, commits, already_exists = e1.clone(part, end, repo, remote,
-                                                     branch=None, commit=None)
+        commits = list(e1.load_commits(consts.Path(TEST_REPOS_DIR)))
 
-        assert full_dir.exists() is True
         assert len(commits) == 2
-        assert commits[0]["type"] == "commit"
-        assert commits[1]["type"] == "merge"
+        assert commits[0]["type"] == "merge"
+        assert commits[0]["hash"] == "f55de22"
+        assert commits[1]["type"] == "commit"
+        assert commits[1]["message"] == "Fixing path problems in linux"
 
-        shutil.rmtree(consts.TEST_REPOS_DIR, ignore_errors=True)
-        assert full_dir.exists() is False
+    def test_load_commits_invalid_commit(self, monkeypatch):
+        invalid_commit = '2022-12-20 09:01:24 -0300$_$d504211$_$luamz'
 
-    def test_load_commits_invalid_commit(self, session, monkeypatch):
-        part = "test"
-        end = "test1"
-        remote = "https://github.com/luamz/save-marine"
-        repo = "luamz/save-marine"
+        def stub_git_lines(*args):
+            yield invalid_commit
+        monkeypatch.setattr(e1, 'git_lines', stub_git_lines)
 
-        invalid_commit = b'2022-12-20 09:01:24 -0300$_$d504211$_$luamz\n'
+        with pytest.raises(EnvironmentError):
+            list(e1.load_commits(consts.Path(TEST_REPOS_DIR)))
 
-        def stub_git(*args):
-            if "--no-merges" in args:
-                return invalid_commit
-        monkeypatch.setattr(e1, 'git_output', stub_git)
+    def test_clone_git_backend_logs_from_commit(self, monkeypatch, tmp_path):
+        calls = []
+        monkeypatch.setattr(consts, 'SELECTED_REPOS_DIR', tmp_path)
+        monkeypatch.setattr(consts, 'EXTRACTION_BACKEND', "git")
+        monkeypatch.setattr(consts, 'CLONE_MODE', "partial")
+        monkeypatch.setattr(e1, 'git', lambda *args: calls.append(args) or 0)
+        monkeypatch.setattr(e1, 'git_lines', lambda *args: calls.append(args) or iter([]))
 
-        with pytest.raises(EnvironmentError):
-            e1.clone(part, end, repo, remote, branch=None, commit=None)
+        _, commits, _ = e1.clone("test", "test1", "a/b", "remote", commit="ab142cf")
+        list(commits)
 
-        shutil.rmtree(consts.TEST_REPOS_DIR, ignore_errors=True)
+        assert "--no-checkout" in calls[0]
+        assert not any("checkout" in args for args in calls)
+        assert calls[-1][2] == "log" and calls[-1][-1] == "ab142cf"
+
+    def test_clone_options(self):
+        assert e1.clone_options("full") == []
+        assert e1.clone_options("partial") == ["--filter=blob:none"]
+        assert e1.clone_options("shallow")[:2] == ["--depth", str(consts.CLONE_DEPTH)]
+
+
+class TestDownloadSaveCommits:
+    def test_save_commits_in_batches(self, session):
+        repository = RepositoryFactory(session).create(state=REP_LOADED)
+
+        count = e1.save_commits(session, repository, iter(stub_repo_commits()), batch_size=2)
+        session.commit()
+
+        assert count == 3
+        assert repository.state == REP_LOADED
+        assert session.query(Commit).filter(Commit.repository_id == repository.id).count() == 3
+
+    def test_save_commits_replaces_interrupted(self, session):
+        repository = RepositoryFactory(session).create(state=REP_LOADED)
+
+        e1.save_commits(session, repository, iter(stub_repo_commits()), batch_size=2)
+        session.commit()
+        e1.save_commits(session, repository, iter(stub_repo_commits()), batch_size=2)
+        session.commit()
+
+        assert session.query(Commit).count() == 3
+
+
+class TestDownloadApplyParallel:
+    def test_apply_parallel_same_states_as_serial(self, session, monkeypatch):
+        repositories = RepositoryFactory(session).create_batch(4, state=REP_FILTERED, commit=None)
+        safe_session = SafeSession(session, interrupted=REP_STOPPED)
+        commit_hash = b'8a34a4f653bdbdc01415a94dc20d4e9b97438965\n'
+
+        def stub_clone(_part, _end, repo, _remote, _branch, _commit):
+            if repo == repositories[1].repository:
+                raise EnvironmentError("Clone failed for {}".format(repo))
+            if repo == repositories[2].repository:
+                return repositories[2].path, None, False
+            return consts.SELECTED_REPOS_DIR, stub_repo_commits(), False
+
+        monkeypatch.setattr(e1, 'clone', stub_clone)
+        monkeypatch.setattr(e1, 'git_output', lambda *args, cwd: commit_hash)
+        monkeypatch.setattr(consts, 'LOGS_DIR', consts.Path(TEST_REPOS_DIR) / "logs")
+
+        e1.apply(
+            session=safe_session, status=StatusLogger("test"),
+            selected_repositories=None, retry=False, count=False,
+            interval=None, reverse=False, check=set(),
+            branch=None, commit=None, jobs=3
+        )
+
+        assert [rep.state for rep in repositories] == [REP_LOADED, REP_FAILED_TO_CLONE, REP_EMPTY, REP_LOADED]
+        assert session.query(Commit).count() == 6
+        assert session.query(Commit).filter(Commit.repository_id == repositories[3].id).count() == 3
+        shutil.rmtree(TEST_REPOS_DIR, ignore_errors=True)
+
+    def test_apply_parallel_reads_log_in_workers(self, session, monkeypatch):
+        repositories = RepositoryFactory(session).create_batch(2, state=REP_FILTERED, commit=None)
+        safe_session = SafeSession(session, interrupted=REP_STOPPED)
+        main_thread = threading.current_thread()
+        readers = []
+
+        def stub_log():
+            readers.append(threading.current_thread())
+            yield from stub_repo_commits()
+
+        monkeypatch.setattr(e1, 'clone', lambda *args: (consts.SELECTED_REPOS_DIR, stub_log(), False))
+        monkeypatch.setattr(e1, 'git_output', lambda *args, cwd: b'8a34a4f\n')
+        monkeypatch.setattr(consts, 'LOGS_DIR', consts.Path(TEST_REPOS_DIR) / "logs")
+
+        e1.apply(
+            session=safe_session, status=StatusLogger("test"),
+            selected_repositories=None, retry=False, count=False,
+            interval=None, reverse=False, check=set(),
+            branch=None, commit=None, jobs=2
+        )
+
+        assert [rep.state for rep in repositories] == [REP_LOADED, REP_LOADED]
+        assert len(readers) == 2 and main_thread not in readers
+        assert [commit.hash for commit in session.query(Commit).order_by(Commit.id)] == \
+            [row["hash"] for row in stub_repo_commits()] * 2
+        shutil.rmtree(TEST_REPOS_DIR, ignore_errors=True)
+
+    def test_apply_parallel_exit_saves_started(self, session, monkeypatch):
+        repositories = RepositoryFactory(session).create_batch(3, state=REP_FILTERED, commit=None)
+        safe_session = SafeSession(session, interrupted=REP_STOPPED)
+        started = []
+        both_started = threading.Event()
+
+        def stub_fetch(repo, _commit, _branch):
+            started.append(repo)
+            if len(started) == 2:
+                both_started.set()
+            time.sleep(0.1)
+            return ("test", repo.replace("/", "_"), "8a34a4f", iter(stub_repo_commits()), False), None
+
+        def stub_check_exit(_check):
+            both_started.wait(5)
+            return True
+
+        monkeypatch.setattr(e1, 'fetch_repository', stub_fetch)
+        monkeypatch.setattr(e1, 'check_exit', stub_check_exit)
+        monkeypatch.setattr(consts, 'LOGS_DIR', consts.Path(TEST_REPOS_DIR) / "logs")
+
+        e1.apply(
+            session=safe_session, status=StatusLogger("test"),
+            selected_repositories=None, retry=False, count=False,
+            interval=None, reverse=False, check=set(),
+            branch=None, commit=None, jobs=2
+        )
+
+        assert [rep.state for rep in repositories] == [REP_LOADED, REP_LOADED, REP_FILTERED]
+        assert session.query(Commit).count() == 6
+        shutil.rmtree(TEST_REPOS_DIR, ignore_errors=True)
+
+    def test_apply_parallel_skips_processed(self, session, monkeypatch):
+        repository = RepositoryFactory(session).create(state=REP_N_EXTRACTED)
+        safe_session = SafeSession(session, interrupted=REP_STOPPED)
+
+        def stub_fetch(*_args):
+            raise AssertionError("should not download")
+
+        monkeypatch.setattr(e1, 'fetch_repository', stub_fetch)
+        monkeypatch.setattr(consts, 'LOGS_DIR', consts.Path(TEST_REPOS_DIR) / "logs")
+
+        e1.apply(
+            session=safe_session, status=StatusLogger("test"),
+            selected_repositories=None, retry=False, count=False,
+            interval=None, reverse=False, check=set(),
+            branch=None, commit=None, jobs=2
+        )
+
+        assert repository.state == REP_N_EXTRACTED
+        shutil.rmtree(TEST_REPOS_DIR, ignore_errors=True)
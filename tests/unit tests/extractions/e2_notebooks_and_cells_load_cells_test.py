@@ -191,3 +191,27 @@ class TestNotebooksAndCellsLoadCells:
 
         assert status == NB_LOAD_FORMAT_ERROR
         assert "Error on cell extraction" in captured.out
+
+    def test_load_cell_magics(self, session):
+        repository = RepositoryFactory(session).create(state=REP_LOADED)
+        name = "file.ipynb"
+        nbrow = get_notebook_nbrow(repository.id, name)
+        notebook = get_notebook_node('code_cell')
+        status = 0
+        notebook["cells"][0]["source"] = '%matplotlib inline\n!pip install numpy'
+
+        nbrow, cells_info, exec_count, status = e2.load_cells(repository.id, nbrow, notebook, status)
+        cell = cells_info[0]
+
+        assert status == 0
+        assert cell["source"] == (
+            "get_ipython().run_line_magic('matplotlib', 'inline')\n"
+            "get_ipython().system('pip install numpy')\n"
+        )
+
+    def test_transform_cell_reuses_transformer(self):
+        e2.transform_cell("x = 1")
+        transformer = e2.TRANSFORMER
+        e2.transform_cell("%time x = 1")
+        assert isinstance(transformer, TransformerManager)
+        assert e2.TRANSFORMER is transformer
@@ -4,6 +4,9 @@ src = os.path.dirname(os.path.dirname(os.path.abspath(''))) + '/src'
 if src not in sys.path:
     sys.path.append(src)
 
+import json
+import pytest
+
 from unittest.mock import mock_open  # noqa
 from src.config.states import REP_LOADED, NB_LOADED
 from src.config.states import NB_LOAD_ERROR, NB_LOAD_FORMAT_ERROR
@@ -14,7 +17,6 @@ from tests.stubs.notebook_dict import get_empty_nbrow
 from tests.stubs.nbf_read import stub_nbf_read, stub_nbf_readOSError, stub_nbf_readException
 from tests.stubs.load_cells import stub_load_cells, stub_load_no_cells
 
-import nbformat as nbf
 import src.extractions.e2_notebooks_and_cells as e2
 
 
@@ -26,7 +28,7 @@ class TestNotebooksAndCellsLoadNotebooks:
         nbrow = get_empty_nbrow(repository, name)
 
         monkeypatch.setattr('builtins.open', mock_open())
-        monkeypatch.setattr(nbf, 'read', stub_nbf_read)
+        monkeypatch.setattr(e2, 'read_notebook', stub_nbf_read)
         monkeypatch.setattr(e2, 'load_cells', stub_load_cells)
 
         nbrow, cells_info = e2.load_notebook(repository.id, repository.path, name, nbrow)
@@ -41,7 +43,7 @@ class TestNotebooksAndCellsLoadNotebooks:
         nbrow = get_empty_nbrow(repository, name)
 
         monkeypatch.setattr('builtins.open', mock_open())
-        monkeypatch.setattr(nbf, 'read', stub_nbf_readOSError)
+        monkeypatch.setattr(e2, 'read_notebook', stub_nbf_readOSError)
 
         nbrow, cells_info = e2.load_notebook(repository.id, repository.path, name, nbrow)
 
@@ -61,7 +63,7 @@ class TestNotebooksAndCellsLoadNotebooks:
         nbrow = get_empty_nbrow(repository, name)
 
         monkeypatch.setattr('builtins.open', mock_open())
-        monkeypatch.setattr(nbf, 'read', stub_nbf_readOSError)
+        monkeypatch.setattr(e2, 'read_notebook', stub_nbf_readOSError)
         monkeypatch.setattr('os.path.islink', lambda path: True)
 
         nbrow, cells_info = e2.load_notebook(repository.id, repository.path, name, nbrow)
@@ -83,7 +85,7 @@ class TestNotebooksAndCellsLoadNotebooks:
         nbrow = get_empty_nbrow(repository, name)
 
         monkeypatch.setattr('builtins.open', mock_open())
-        monkeypatch.setattr(nbf, 'read', stub_nbf_readException)
+        monkeypatch.setattr(e2, 'read_notebook', stub_nbf_readException)
 
         nbrow, cells_info = e2.load_notebook(repository.id, repository.path, name, nbrow)
 
@@ -102,10 +104,54 @@ class TestNotebooksAndCellsLoadNotebooks:
         nbrow = get_empty_nbrow(repository, name)
 
         monkeypatch.setattr('builtins.open', mock_open())
-        monkeypatch.setattr(nbf, 'read', stub_nbf_read)
+        monkeypatch.setattr(e2, 'read_notebook', stub_nbf_read)
         monkeypatch.setattr(e2, 'load_cells', stub_load_no_cells)
 
         nbrow, cells_info = e2.load_notebook(repository.id, repository.path, name, nbrow)
 
         assert len(cells_info) == 0
         assert nbrow["state"] == NB_LOAD_FORMAT_ERROR
+
+
+class TestNotebooksAndCellsFastPath:
+
+    @pytest.mark.parametrize("notebook", [
+        {"nbformat": 4, "nbformat_minor": 2, "metadata": {"language_info": {"name": "python", "version": "3.8"}},
+         "cells": [{"cell_type": "code", "execution_count": 1, "metadata": {}, "source": ["a = 1\n", "a"],
+                    "outputs": [{"output_type": "execute_result", "execution_count": 1, "metadata": {},
+                                 "data": {"text/plain": ["1"]}}]},
+                   {"cell_type": "markdown", "metadata": {}, "source": "# Title"}]},
+        {"nbformat": 4, "nbformat_minor": 2, "metadata": {},
+         "cells": [{"cell_type": "markdown", "source": "# Title"}]},
+        {"nbformat": 3, "nbformat_minor": 0, "metadata": {},
+         "worksheets": [{"cells": [{"cell_type": "code", "input": "a = 1", "language": "python",
+                                    "metadata": {}, "outputs": []}]}]},
+    ])
+    def test_same_rows(self, session, monkeypatch, tmp_path, notebook):
+        repository = RepositoryFactory(session).create(state=REP_LOADED)
+        (tmp_path / "file.ipynb").write_text(json.dumps(notebook))
+
+        rows = []
+        for fast_path in (True, False):
+            monkeypatch.setattr(e2.consts, 'NOTEBOOK_FAST_PATH', fast_path)
+            nbrow = get_empty_nbrow(repository, "file.ipynb")
+            rows.append(e2.load_notebook(repository.id, tmp_path, "file.ipynb", nbrow))
+
+        assert rows[0] == rows[1]
+
+    def test_nbformat3_json_output(self, session, tmp_path):
+        repository = RepositoryFactory(session).create(state=REP_LOADED)
+        notebook = {"nbformat": 3, "nbformat_minor": 0, "metadata": {},
+                    "worksheets": [{"cells": [{"cell_type": "code", "input": "a", "language": "python",
+                                               "metadata": {}, "prompt_number": 1,
+                                               "outputs": [{"output_type": "pyout", "prompt_number": 1,
+                                                            "metadata": {}, "json": "{\"a\": 1}"}]}]}]}
+        (tmp_path / "file.ipynb").write_text(json.dumps(notebook))
+
+        nbrow, cells_info = e2.load_notebook(
+            repository.id, tmp_path, "file.ipynb", get_empty_nbrow(repository, "file.ipynb")
+        )
+
+        assert nbrow["state"] == NB_LOADED
+        assert nbrow["code_cells_with_output"] == 1
+        assert cells_info[0]["output_formats"] == "application/json"
@@ -12,6 +12,8 @@ from tests.database_config import connection, session  # noqa: F401
 from tests.factories.models import RepositoryFactory, NotebookFactory
 from tests.stubs.others import stub_unzip
 from tests.stubs.load_notebook import stub_load_notebook, stub_load_notebook_error
+from tests.stubs.load_notebook import stub_load_notebook_by_name
+from src.classes.c6_worker_pool import WorkerPool
 
 import src.extractions.e2_notebooks_and_cells as e2
 
@@ -25,12 +27,12 @@ class TestNotebooksAndCellsFindNotebooks:
         file2_relative_path = 'to/file.ipynb'
         file3_relative_path = 'file.ipynb_checkpoints'
 
-        def mock_find_files(path, pattern):  # noqa: F841
+        def mock_inventory_files(session, repository, kind):  # noqa: F841
             return [Path('{}/{}'.format(repository.path, file1_relative_path)),
                     Path('{}/{}'.format(repository.path, file2_relative_path)),
                     Path('{}/{}'.format(repository.path, file3_relative_path))]
 
-        monkeypatch.setattr(e2, 'find_files', mock_find_files)
+        monkeypatch.setattr(e2, 'inventory_files', mock_inventory_files)
         monkeypatch.setattr(Path, 'exists', lambda path: True)
 
         notebooks = e2.find_notebooks(session, repository)
@@ -75,6 +77,23 @@ class TestNotebooksAndCellsProcessNotebook:
         assert notebook.repository_id == repository.id
         assert cell.notebook_id == notebook.id
 
+    def test_process_notebooks_pool(self, session, monkeypatch):
+        safe_session = SafeSession(session, interrupted=NB_STOPPED)
+        repository = RepositoryFactory(session).create(state=REP_LOADED, notebooks_count=2)
+        repository_notebooks_names = ['file.ipynb', 'error.ipynb', 'other.ipynb']
+
+        monkeypatch.setattr(Path, 'exists', lambda path: True)
+        monkeypatch.setattr(e2, 'load_notebook', stub_load_notebook_by_name)
+
+        with WorkerPool(2) as pool:
+            count, repository = e2.process_notebooks(safe_session, repository, repository_notebooks_names, pool)
+        safe_session.commit()
+
+        assert count == 3
+        assert repository.state == REP_N_ERROR
+        assert [notebook.name for notebook in session.query(Notebook)] == ['file.ipynb', 'other.ipynb']
+        assert (session.query(Cell).count()) == 2
+
     def test_process_notebooks_no_name(self, session):
         safe_session = SafeSession(session, interrupted=NB_STOPPED)
         repository = RepositoryFactory(session).create(state=REP_LOADED, notebooks_count=2)
@@ -169,7 +188,7 @@ class TestNotebooksAndCellsProcessRepository:
         repository.notebooks_count = 1
         monkeypatch.setattr(e2, 'find_notebooks', lambda _session, _repository: [])
         monkeypatch.setattr(e2, 'process_notebooks',
-                            lambda _session, _repository, _repository_notebooks_names: (1, repository))
+                            lambda _session, _repository, _repository_notebooks_names, _pool=None: (1, repository))
         output = e2.process_repository(safe_session, repository)
 
         assert output == "done"
@@ -182,7 +201,7 @@ class TestNotebooksAndCellsProcessRepository:
 
         monkeypatch.setattr(e2, 'find_notebooks', lambda _session, _repository: [])
         monkeypatch.setattr(e2, 'process_notebooks',
-                            lambda _session, _repository, _repository_notebooks_names: (1, repository))
+                            lambda _session, _repository, _repository_notebooks_names, _pool=None: (1, repository))
         output = e2.process_repository(safe_session, repository)
 
         assert output == "done"
@@ -199,7 +218,7 @@ class TestNotebooksAndCellsProcessRepository:
 
         monkeypatch.setattr(e2, 'find_notebooks', mock_unavailable_files)
         monkeypatch.setattr(e2, 'process_notebooks',
-                            lambda _session, _repository, _repository_notebooks_names: (1, repository))
+                            lambda _session, _repository, _repository_notebooks_names, _pool=None: (1, repository))
         output = e2.process_repository(safe_session, repository)
 
         assert output == "done"
@@ -213,7 +232,7 @@ class TestNotebooksAndCellsProcessRepository:
 
         monkeypatch.setattr(e2, 'find_notebooks', lambda _session, _repository: [])
         monkeypatch.setattr(e2, 'process_notebooks',
-                            lambda _session, _repository, _repository_notebooks_names: (1, repository))
+                            lambda _session, _repository, _repository_notebooks_names, _pool=None: (1, repository))
         monkeypatch.setattr(safe_session, 'commit', lambda: (None, 'error 1'))
 
         output = e2.process_repository(safe_session, repository, retry=True)
@@ -228,7 +247,7 @@ class TestNotebooksAndCellsProcessRepository:
 
         monkeypatch.setattr(e2, 'find_notebooks', lambda _session, _repository: [])
         monkeypatch.setattr(e2, 'process_notebooks',
-                            lambda _session, _repository, _repository_notebooks_names: (1, repository))
+                            lambda _session, _repository, _repository_notebooks_names, _pool=None: (1, repository))
         output = e2.process_repository(safe_session, repository, retry=True)
         repository = safe_session.query(Repository).first()
 
@@ -243,7 +262,7 @@ class TestNotebooksAndCellsProcessRepository:
 
         monkeypatch.setattr(e2, 'find_notebooks', lambda _session, _repository: [])
         monkeypatch.setattr(e2, 'process_notebooks',
-                            lambda _session, _repository, _repository_notebooks_names: (1, repository))
+                            lambda _session, _repository, _repository_notebooks_names, _pool=None: (1, repository))
         output = e2.process_repository(safe_session, repository, retry=True)
         repository = safe_session.query(Repository).first()
 
@@ -7,6 +7,7 @@ if src not in sys.path:
 
 from unittest.mock import mock_open  # noqa
 
+from sqlalchemy import event
 from src.config.consts import Path
 from src.config.states import *
 from src.db.database import Repository, PythonFile
@@ -15,6 +16,7 @@ from tests.factories.models import RepositoryFactory
 from tests.factories.models import PythonFileFactory
 from tests.stubs.others import stub_unzip, stub_unzip_failed
 
+import src.config.consts as consts
 import src.extractions.e3_python_files as e3
 
 
@@ -27,13 +29,13 @@ class TestPythonFilesFindPythonFiles:
         file3_relative_path = 'setup.py'
         file4_relative_path = 'abc123/setup.py'
 
-        def mock_find_python_files(path, pattern):  # noqa: F841
+        def mock_find_python_files(session, repository, kind):  # noqa: F841
             return [Path('{}/{}'.format(repository.path, file1_relative_path)),
                     Path('{}/{}'.format(repository.path, file2_relative_path)),
                     Path('{}/{}'.format(repository.path, file3_relative_path)),
                     Path('{}/{}'.format(repository.path, file4_relative_path))]
 
-        monkeypatch.setattr(e3, 'find_files', mock_find_python_files)
+        monkeypatch.setattr(e3, 'inventory_files', mock_find_python_files)
         monkeypatch.setattr(Path, 'exists', lambda path: True)
 
         python_files = e3.find_python_files(session, repository)
@@ -51,14 +53,14 @@ class TestPythonFilesFindPythonFiles:
         file4_relative_path = 'abc123/setup.py'
         file5_relative_path = 'venv/aaaa.py'
 
-        def mock_find_python_files(path, pattern):  # noqa: F841
+        def mock_find_python_files(session, repository, kind):  # noqa: F841
             return [Path('{}/{}'.format(repository.path, file1_relative_path)),
                     Path('{}/{}'.format(repository.path, file2_relative_path)),
                     Path('{}/{}'.format(repository.path, file3_relative_path)),
                     Path('{}/{}'.format(repository.path, file4_relative_path)),
                     Path('{}/{}'.format(repository.path, file5_relative_path))]
 
-        monkeypatch.setattr(e3, 'find_files', mock_find_python_files)
+        monkeypatch.setattr(e3, 'inventory_files', mock_find_python_files)
         monkeypatch.setattr(Path, 'exists', lambda path: False)
         monkeypatch.setattr(e3, 'unzip_repository', stub_unzip)
 
@@ -157,6 +159,28 @@ class TestPythonFilesProcessPythonFiles:
         assert python_file.source == source
         assert python_file.state == PF_LOADED
 
+    def test_process_python_files_single_lookup(self, session, monkeypatch):
+        repository = RepositoryFactory(session).create(state=REP_N_EXTRACTED)
+        PythonFileFactory(session).create(repository_id=repository.id, name="a.py", state=PF_LOADED)
+        python_files_names = ['a.py', 'b.py', 'c.py', 'd.py', 'e.py']
+        statements = []
+
+        def count_select(conn, cursor, statement, *args):
+            if statement.startswith("SELECT") and "FROM python_files" in statement:
+                statements.append(statement)
+
+        monkeypatch.setattr(consts, 'FILE_BATCH_SIZE', 2)
+        monkeypatch.setattr('builtins.open', mock_open(read_data="import pandas\n"))
+        event.listen(session.bind, "before_cursor_execute", count_select)
+
+        count = e3.process_python_files(session, repository, python_files_names, 0)
+        session.commit()
+        event.remove(session.bind, "before_cursor_execute", count_select)
+
+        assert count == 5
+        assert len(statements) == 1
+        assert session.query(PythonFile).count() == 5
+
     def test_process_python_files_no_name(self, session, monkeypatch, capsys):
         repository = RepositoryFactory(session).create(state=REP_N_EXTRACTED)
         python_files_names = ['']
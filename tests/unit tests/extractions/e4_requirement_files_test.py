@@ -28,13 +28,15 @@ class TestRequiremtFilesFindRequirements:
         file3_relative_path = 'Pipfile'
         file4_relative_path = 'Pipfile.lock'
 
-        def mock_find_requirement_files(path, pattern):  # noqa: F841
-            return [[Path('{}'.format(file1_relative_path))],
-                    [Path('{}'.format(file2_relative_path))],
-                    [Path('{}'.format(file3_relative_path))],
-                    [Path('{}'.format(file4_relative_path))]]
-
-        monkeypatch.setattr(e4, 'find_files_in_path', mock_find_requirement_files)
+        def mock_find_requirement_files(session, repository, kind):  # noqa: F841
+            return {
+                'setup': [repository.path / file1_relative_path],
+                'requirements': [repository.path / file2_relative_path],
+                'pipfile': [repository.path / file3_relative_path],
+                'pipfile_lock': [repository.path / file4_relative_path],
+            }[kind]
+
+        monkeypatch.setattr(e4, 'inventory_files', mock_find_requirement_files)
         monkeypatch.setattr(Path, 'exists', lambda path: True)
 
         setups, requirements, pipfiles, pipfile_locks = e4.find_requirements(session, repository)
@@ -57,15 +59,17 @@ class TestRequiremtFilesFindRequirements:
         file3_relative_path = 'Pipfile'
         file4_relative_path = 'Pipfile.lock'
 
-        def mock_find_requirement_files(path, pattern):  # noqa: F841
-            return [[Path('{}'.format(file1_relative_path))],
-                    [Path('{}'.format(file2_relative_path))],
-                    [Path('{}'.format(file3_relative_path))],
-                    [Path('{}'.format(file4_relative_path))]]
+        def mock_find_requirement_files(session, repository, kind):  # noqa: F841
+            return {
+                'setup': [repository.path / file1_relative_path],
+                'requirements': [repository.path / file2_relative_path],
+                'pipfile': [repository.path / file3_relative_path],
+                'pipfile_lock': [repository.path / file4_relative_path],
+            }[kind]
 
         monkeypatch.setattr(Path, 'exists', lambda path: False)
         monkeypatch.setattr(e4, 'unzip_repository', stub_unzip)
-        monkeypatch.setattr(e4, 'find_files_in_path', mock_find_requirement_files)
+        monkeypatch.setattr(e4, 'inventory_files', mock_find_requirement_files)
 
         setups, requirements, pipfiles, pipfile_locks = e4.find_requirements(session, repository)
 
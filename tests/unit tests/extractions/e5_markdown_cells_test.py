@@ -151,6 +151,7 @@ class TestMarkdownCellsExtractFeatures:
             raise LookupError
 
         monkeypatch.setattr(stopwords, 'words', stub_stopwords_error)
+        monkeypatch.setattr(e5, 'STOPWORDS', {})
         data = e5.extract_features(cell.source)
 
         assert data["language"] == "portuguese"
@@ -158,3 +159,101 @@ class TestMarkdownCellsExtractFeatures:
         assert data["meaningful_lines"] == 2
         assert data["words"] == 16
         assert data['stopwords'] == 0
+
+
+class StubStatus(object):
+    count = 0
+
+    def report(self):
+        pass
+
+
+class TestMarkdownCellsBatch:
+    def test_process_markdown_cells(self, session, monkeypatch):
+        repository = RepositoryFactory(session).create()
+        notebook = NotebookFactory(session).create(repository_id=repository.id)
+        loaded, processed, failed = MarkdownCellFactory(session).create_batch(
+            3, repository_id=repository.id, notebook_id=notebook.id, state=CELL_LOADED
+        )
+        processed.state = CELL_PROCESSED
+        failed.source = "fail"
+
+        def stub_extract_features_fail(cell_source):
+            if cell_source == "fail":
+                raise Exception("bad cell")
+            return stub_extract_features(cell_source)
+
+        monkeypatch.setattr(e5, 'extract_features', stub_extract_features_fail)
+
+        results = e5.process_markdown_cells(session, [
+            (repository.id, notebook.id, cell) for cell in (loaded, processed, failed)
+        ])
+        session.commit()
+
+        assert results == ['done', 'already processed', 'Failed to process (bad cell)']
+        assert [feature.cell_id for feature in session.query(CellMarkdownFeature)] == [loaded.id]
+        assert loaded.state == CELL_PROCESSED
+        assert failed.state == CELL_PROCESS_ERROR
+
+    def test_apply_batches(self, session, monkeypatch):
+        repository1, repository2 = RepositoryFactory(session).create_batch(2)
+        for repository in (repository1, repository2):
+            notebook = NotebookFactory(session).create(repository_id=repository.id)
+            MarkdownCellFactory(session).create_batch(3, repository_id=repository.id,
+                                                      notebook_id=notebook.id, state=CELL_LOADED)
+        monkeypatch.setattr(e5, 'extract_features', stub_extract_features)
+        monkeypatch.setattr(e5, 'check_exit', lambda check: False)
+        monkeypatch.setattr(e5.consts, 'MARKDOWN_BATCH_SIZE', 2)
+        status = StubStatus()
+
+        e5.apply(session, status, None, False, False, None, False, set())
+
+        features = session.query(CellMarkdownFeature).all()
+        assert status.count == 6
+        assert sorted((feature.repository_id, feature.cell_id) for feature in features) == sorted(
+            (cell.repository_id, cell.id) for cell in session.query(e5.Cell)
+        )
+
+    def test_extract_features_reuses_parser(self):
+        header = e5.extract_features("# Title\n\nSome text")
+        parser = e5.PARSER
+        items = e5.extract_features("- first\n- second")
+
+        assert e5.PARSER is parser
+        assert header['header'] == 1 and header['list'] == 0
+        assert items['header'] == 0 and items['list_items'] == 2
+
+    def test_cells_use_notebook_language(self, session, monkeypatch):
+        repository = RepositoryFactory(session).create()
+        notebook1, notebook2 = NotebookFactory(session).create_batch(2, repository_id=repository.id)
+        text = MarkdownCellFactory(session).create(
+            repository_id=repository.id, notebook_id=notebook1.id,
+            source='Este notebook tem o propósito de analisar o nível de escolaridade brasileiro'
+        )
+        header1, header2 = (
+            MarkdownCellFactory(session).create(repository_id=repository.id, notebook_id=notebook.id,
+                                                source='## Resultados')
+            for notebook in (notebook1, notebook2)
+        )
+        monkeypatch.setattr(e5, 'DETECTOR', None)
+
+        languages = [
+            e5.cell_features(session, repository.id, cell.notebook_id, cell)['language']
+            for cell in (text, header1, header2)
+        ]
+
+        assert languages == ['portuguese', 'portuguese', 'undetected']
+
+    def test_short_cell_language_does_not_depend_on_run(self, session, monkeypatch):
+        repository = RepositoryFactory(session).create()
+        notebook = NotebookFactory(session).create(repository_id=repository.id)
+        header = MarkdownCellFactory(session).create(
+            repository_id=repository.id, notebook_id=notebook.id, index=0, source='## Resultados'
+        )
+        MarkdownCellFactory(session).create(
+            repository_id=repository.id, notebook_id=notebook.id, index=1,
+            source='Este notebook tem o propósito de analisar o nível de escolaridade brasileiro'
+        )
+        monkeypatch.setattr(e5, 'DETECTOR', None)
+
+        assert e5.cell_features(session, repository.id, notebook.id, header)['language'] == 'portuguese'
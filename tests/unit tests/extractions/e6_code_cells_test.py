@@ -247,3 +247,44 @@ class TestCodeCellsProcessCodeCell:
 
         assert data_io.cell_id == cell.id
         assert cd_created_at != data_io.created_at
+
+    def test_process_code_cell_pool_features(self, session):
+        repository = RepositoryFactory(session).create(state=REP_REQ_FILE_EXTRACTED)
+        notebook = NotebookFactory(session).create(repository_id=repository.id)
+        cell = CodeCellFactory(session).create(
+            repository_id=repository.id,
+            notebook_id=notebook.id,
+            state=CELL_LOADED,
+            source="import pandas as pd"
+        )
+        checker = PathLocalChecker("")
+        features = (True, ([(1, "import", "pandas", None)], [], 0, 0))
+
+        result = process_code_cell(session=session, repository_id=repository.id,
+                                   notebook_id=notebook.id, cell=cell, checker=checker,
+                                   features=features)
+        session.commit()
+        module = session.query(CellModule).first()
+
+        assert result == 'done'
+        assert cell.state == CELL_PROCESSED
+        assert module.module_name == "pandas"
+        assert module.local is False
+
+    def test_process_code_cell_pool_time_out(self, session):
+        repository = RepositoryFactory(session).create()
+        notebook = NotebookFactory(session).create(repository_id=repository.id)
+        cell = CodeCellFactory(session).create(
+            repository_id=repository.id,
+            notebook_id=notebook.id,
+            state=CELL_LOADED
+        )
+        checker = PathLocalChecker("")
+
+        result = process_code_cell(session=session, repository_id=repository.id,
+                                   notebook_id=notebook.id, cell=cell, checker=checker,
+                                   features=(False, TimeoutError("Timed Out")))
+        session.commit()
+
+        assert result == 'Failed due to  Time Out Error.'
+        assert cell.state == CELL_PROCESS_TIMEOUT
@@ -251,3 +251,20 @@ class TestPythonFilesExtract:
         assert data_io.python_file_id == python_file.id
         assert pd_created_at != data_io.created_at
 
+
+    def test_process_python_file_pool_time_out(self, session):
+        repository = RepositoryFactory(session).create()
+        python_file = PythonFileFactory(session).create(
+            repository_id=repository.id,
+            state=PF_LOADED
+        )
+        checker = PathLocalChecker("")
+        dispatches = set()
+
+        result = process_python_file(session=session, dispatches=dispatches,
+                                     repository_id=repository.id, python_file=python_file,
+                                     checker=checker, features=(False, TimeoutError("Timed Out")))
+        session.commit()
+
+        assert result == 'Failed due to  Time Out Error.'
+        assert python_file.state == PF_PROCESS_TIMEOUT
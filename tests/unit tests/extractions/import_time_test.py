@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.s3_extract import ORDER
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Seconds to import a stage, excluding SQLAlchemy and the models
+IMPORT_BUDGET = 0.25
+
+# Dependencies that only the processing paths need
+HEAVY_MODULES = {"IPython", "nbformat", "nbconvert", "langdetect", "nltk", "mistune"}
+
+
+def import_times(module):
+    """ Returns {module: self microseconds} from python -X importtime """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(self_time)
+    return times
+
+
+@pytest.mark.parametrize("script", ORDER)
+def test_stage_import_budget(script):
+    times = import_times("src.extractions." + script)
+
+    heavy = {name for name in times if name.split(".")[0] in HEAVY_MODULES}
+    assert not heavy
+    own = sum(
+        value for name, value in times.items()
+        if not name.startswith("sqlalchemy") and name != "src.db.database"
+    )
+    assert own / 10 ** 6 < IMPORT_BUDGET
@@ -49,3 +49,18 @@ class TestArgumentParser:
         assert args.retry_syntaxerrors is True
         assert args.retry_timeout is True
         assert args.repositories == [3, 4]
+
+    def test_workers_argument(self, parser):
+        set_up_argument_parser(parser, "test_script", script_type="python_files")
+        args = parser.parse_args(["-w", "2"])
+        assert args.workers == 2
+
+    def test_shards_argument(self, parser):
+        set_up_argument_parser(parser, "test_script", script_type="markdown_cells")
+        assert parser.parse_args([]).shards == 1
+        assert parser.parse_args(["--shards", "4"]).shards == 4
+
+    def test_language_seed_argument(self, parser):
+        set_up_argument_parser(parser, "test_script", script_type="markdown_cells")
+        assert parser.parse_args([]).language_seed == 0
+        assert parser.parse_args(["--language-seed", "3"]).language_seed == 3
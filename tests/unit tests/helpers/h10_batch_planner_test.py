@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+from src.config.states import *
+from src.db.database import PlannedBatch, Extraction
+from src.helpers.h10_batch_planner import pack, plan_batches, next_batch
+from src.helpers.h10_batch_planner import calibrate, estimate_cost, notebook_density
+from tests.factories.models import RepositoryFactory
+from tests.database_config import connection, session  # noqa: F401
+
+
+class TestBatchPlannerPack:
+    def test_pack_balances_cost(self):
+        items = [(1, 10, 8.0), (2, 10, 7.0), (3, 10, 6.0), (4, 10, 5.0), (5, 10, 4.0), (6, 10, 2.0)]
+
+        batches = pack(items, size_limit=31, time_budget=None)
+        costs = sorted(sum(item[2] for item in batch) for batch in batches)
+
+        assert len(batches) == 2
+        assert costs == [15.0, 17.0]
+
+    def test_pack_size_limit(self):
+        items = [(index, 40, 1.0) for index in range(5)] + [(9, 100, 1.0)]
+
+        batches = pack(items, size_limit=100)
+
+        assert all(sum(item[1] for item in batch) < 100 for batch in batches)
+        assert sorted(item[0] for batch in batches for item in batch) == [0, 1, 2, 3, 4]
+
+    def test_pack_time_budget(self):
+        items = [(index, 1, 10.0) for index in range(6)] + [(9, 1, 50.0)]
+
+        batches = pack(items, size_limit=1000, time_budget=30)
+
+        assert all(
+            sum(item[2] for item in batch) <= 30 or len(batch) == 1
+            for batch in batches
+        )
+        assert [9] in [[item[0] for item in batch] for batch in batches]
+
+    def test_pack_empty(self):
+        assert pack([], size_limit=10) == []
+
+
+class TestBatchPlannerPlan:
+    def test_plan_and_next_batch(self, session):
+        repositories = [
+            RepositoryFactory(session).create(state=REP_SELECTED, disk_usage=str(size))
+            for size in (300, 200, 100)
+        ]
+        RepositoryFactory(session).create(state=REP_FINISHED, disk_usage="100")
+
+        assert plan_batches(session, size_limit=350) == 2
+        assert session.query(PlannedBatch).count() == 3
+        assert plan_batches(session, size_limit=350) == 0
+
+        batch, cost = next_batch(session)
+        assert [repository.id for repository in batch] == [repositories[0].id]
+        assert cost > 0
+
+        repositories[0].state = REP_LOADED
+        session.commit()
+        batch, _ = next_batch(session)
+        assert sorted(repository.id for repository in batch) == [repositories[1].id, repositories[2].id]
+
+        batch, _ = next_batch(session, exclude=[repositories[1].id])
+        assert [repository.id for repository in batch] == [repositories[2].id]
+
+    def test_plan_new_repositories(self, session):
+        RepositoryFactory(session).create(state=REP_SELECTED, disk_usage="100")
+        plan_batches(session, size_limit=1000)
+        new = RepositoryFactory(session).create(state=REP_SELECTED, disk_usage="100")
+
+        assert plan_batches(session, size_limit=1000) == 1
+        assert session.query(PlannedBatch).filter(PlannedBatch.repository_id == new.id).one().batch == 2
+
+    def test_replan(self, session):
+        for _ in range(3):
+            RepositoryFactory(session).create(state=REP_SELECTED, disk_usage="100")
+        plan_batches(session, size_limit=1000)
+
+        assert plan_batches(session, size_limit=150, replan=True) == 3
+        assert session.query(PlannedBatch).count() == 3
+
+    def test_notebook_density(self, session):
+        RepositoryFactory(session).create(state=REP_FINISHED, disk_usage="1000", notebooks_count=5)
+
+        assert notebook_density(session) == 0.005
+
+    def test_calibrate(self, session):
+        assert calibrate(session) == 1.0
+
+        start = datetime(2020, 1, 1)
+        estimated = estimate_cost(1000, 5)
+        extraction = Extraction(start=start, end=start, runtime=timedelta(seconds=2 * estimated),
+                                state=EXTRACTED_SUCCESS)
+        session.add(extraction)
+        session.flush()
+        RepositoryFactory(session).create(state=REP_FINISHED, disk_usage="1000",
+                                          notebooks_count=5, extraction_id=extraction.id)
+
+        assert abs(calibrate(session) - 2.0) < 1e-6
@@ -0,0 +1,118 @@
+import csv
+
+import src.config.consts as consts
+from src.db.database import Cell, PythonFile
+from src.config.states import CELL_LOADED, CELL_PROCESSED, CELL_ORDER
+from src.helpers.h4_filters import filter_code_cells, filter_python_files
+from src.helpers.h4_filters import CELL_SHARD_KEYS, PYTHON_FILE_SHARD_KEYS
+from src.helpers.h11_shards import split, plan_shards, pending, run_shards, exit_status
+import src.helpers.h11_shards as h11
+from tests.factories.models import RepositoryFactory, NotebookFactory
+from tests.factories.models import CodeCellFactory, PythonFileFactory
+from tests.database_config import connection, session  # noqa: F401
+
+
+def code_cells(session, shard=None):
+    return filter_code_cells(session=session, selected_notebooks=None, selected_repositories=None,
+                             count=False, interval=None, reverse=False, shard=shard).all()
+
+
+class TestSplit:
+
+    def test_split_balances_cost(self):
+        costs = [((1,), 10), ((2,), 10), ((3,), 10), ((4,), 10)]
+
+        assert split(costs, 2) == [(None, (3,)), ((3,), None)]
+
+    def test_split_skewed_key(self):
+        costs = [((1, 1), 90), ((1, 2), 5), ((2, 3), 5)]
+
+        assert split(costs, 2) == [(None, (1, 2)), ((1, 2), None)]
+
+    def test_split_more_shards_than_keys(self):
+        assert split([((1,), 10)], 4) == [(None, None)]
+        assert split([], 4) == []
+
+
+class TestPlanShards:
+
+    def test_shards_split_large_repository(self, session):
+        large, small = RepositoryFactory(session).create_batch(2)
+        notebooks = NotebookFactory(session).create_batch(3, repository_id=large.id)
+        notebooks.append(NotebookFactory(session).create(repository_id=small.id))
+        for notebook in notebooks:
+            CodeCellFactory(session).create_batch(
+                2, repository_id=notebook.repository_id, notebook_id=notebook.id, source="x" * 1000
+            )
+
+        shards = plan_shards(
+            filter_code_cells(session=session, selected_notebooks=None, selected_repositories=None,
+                              count=False, interval=None, reverse=False),
+            CELL_SHARD_KEYS, Cell.source, 2
+        )
+        cells = [code_cells(session, shard) for shard in shards]
+
+        assert len(shards) == 2
+        assert shards[1][0][0] == large.id
+        assert [len(shard_cells) for shard_cells in cells] == [4, 4]
+        assert sorted(cell.id for shard_cells in cells for cell in shard_cells) == \
+            sorted(cell.id for cell in code_cells(session))
+
+    def test_shards_only_pending(self, session):
+        repository = RepositoryFactory(session).create()
+        notebook1, notebook2 = NotebookFactory(session).create_batch(2, repository_id=repository.id)
+        CodeCellFactory(session).create_batch(3, repository_id=repository.id, notebook_id=notebook1.id,
+                                              state=CELL_PROCESSED)
+        CodeCellFactory(session).create(repository_id=repository.id, notebook_id=notebook2.id,
+                                        state=CELL_LOADED)
+        query = filter_code_cells(session=session, selected_notebooks=None, selected_repositories=None,
+                                  count=False, interval=None, reverse=False)
+
+        shards = plan_shards(pending(query, Cell.state, CELL_PROCESSED, CELL_ORDER),
+                             CELL_SHARD_KEYS, Cell.source, 2)
+
+        assert shards == [(None, None)]
+
+    def test_python_file_shards(self, session):
+        repository = RepositoryFactory(session).create()
+        python_files = PythonFileFactory(session).create_batch(4, repository_id=repository.id)
+        arguments = dict(session=session, selected_python_files=None, selected_repositories=None,
+                         count=False, interval=None, reverse=False)
+
+        shards = plan_shards(filter_python_files(**arguments), PYTHON_FILE_SHARD_KEYS, PythonFile.source, 2)
+
+        assert shards == [(None, (repository.id, python_files[2].id)), ((repository.id, python_files[2].id), None)]
+        assert filter_python_files(shard=shards[0], **arguments).all() == python_files[:2]
+        assert filter_python_files(shard=shards[1], **arguments).all() == python_files[2:]
+
+
+def count_shard(status, shard):
+    for _ in range(shard[0]):
+        status.count += 1
+        status.report()
+    if shard[1]:
+        raise ValueError("failed shard")
+
+
+class TestRunShards:
+
+    def test_run_shards_merges_status(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(consts, "LOGS_DIR", tmp_path)
+        monkeypatch.setattr(h11, "POLL_INTERVAL", 0.01)
+
+        codes = run_shards("e6_code_cells", count_shard, [(3, False), (4, False)])
+
+        with open(str(tmp_path / "status.csv")) as csvfile:
+            rows = list(csv.reader(csvfile))
+        assert codes == [0, 0]
+        assert rows[-1][1] == "e6_code_cells"
+        assert rows[-1][2] == "7"
+
+    def test_run_shards_failure(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(consts, "LOGS_DIR", tmp_path)
+
+        codes = run_shards("e6_code_cells", count_shard, [(1, False), (1, True)])
+
+        assert codes[0] == 0
+        assert codes[1] != 0
+        assert exit_status(codes) == 1
@@ -0,0 +1,153 @@
+import io
+import json
+import tracemalloc
+
+import nbformat as nbf
+import pytest
+
+from src.helpers.h3_utils import cell_output_formats
+from src.helpers.h12_notebook_reader import read_notebook, read_skeleton
+
+
+def v4_notebook(payload="iVBORw0KGgo="):
+    return {
+        "nbformat": 4,
+        "nbformat_minor": 2,
+        "metadata": {"language_info": {"name": "python", "version": "3.8.16"}, "widgets": {"state": {}}},
+        "cells": [
+            {"cell_type": "markdown", "metadata": {}, "source": ["# Title\n", "Text with \"quotes\" and \\ é"],
+             "attachments": {"image.png": {"image/png": payload}}},
+            {"cell_type": "code", "execution_count": 3, "metadata": {}, "source": "print('a\\\\')",
+             "outputs": [
+                 {"output_type": "stream", "name": "stdout", "text": ["a\\\n"]},
+                 {"output_type": "display_data", "metadata": {"image/png": {"width": 10}},
+                  "data": {"image/png": payload, "text/plain": ["<Figure>"]}},
+                 {"output_type": "execute_result", "execution_count": 3, "metadata": {},
+                  "data": {"text/html": ["<b>", "x</b>"], "application/json": {"a": [1, 2.5e3, True, None]}}},
+                 {"output_type": "error", "ename": "ValueError", "evalue": "bad", "traceback": ["line"]},
+             ]},
+            {"cell_type": "raw", "metadata": {}, "source": ""},
+        ],
+    }
+
+
+def v3_notebook():
+    return {
+        "nbformat": 3,
+        "nbformat_minor": 0,
+        "metadata": {"name": ""},
+        "worksheets": [{"cells": [
+            {"cell_type": "code", "collapsed": False, "input": ["x = 1\n", "x"], "language": "python",
+             "metadata": {}, "prompt_number": 2,
+             "outputs": [{"output_type": "pyout", "prompt_number": 2, "metadata": {}, "text": ["1"],
+                          "png": "iVBORw0KGgo="},
+                         {"output_type": "display_data", "metadata": {}, "json": "{\"a\": [1, 2]}"},
+                         {"output_type": "stream", "stream": "stdout", "text": ["a\n"]}]},
+            {"cell_type": "markdown", "metadata": {}, "source": ["text"]},
+        ]}],
+    }
+
+
+def cells(notebook):
+    notebook = nbf.convert(notebook, 4)
+    return [
+        (cell["cell_type"], cell["source"], cell.get("execution_count"), sorted(cell_output_formats(cell)))
+        for cell in notebook["cells"]
+    ]
+
+
+class TestReadSkeleton:
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64])
+    def test_chunk_boundaries(self, chunk_size):
+        notebook = v4_notebook()
+        text = json.dumps(notebook, indent=1)
+
+        skeleton = read_skeleton(io.StringIO(text), chunk_size)
+
+        assert skeleton["metadata"]["language_info"] == notebook["metadata"]["language_info"]
+        assert [cell["source"] for cell in skeleton["cells"]] == [cell["source"] for cell in notebook["cells"]]
+        assert skeleton == read_skeleton(io.StringIO(text))
+
+    def test_outputs_without_payloads(self):
+        skeleton = read_skeleton(io.StringIO(json.dumps(v4_notebook())))
+        markdown, code, _ = skeleton["cells"]
+
+        assert markdown["attachments"] == {"image.png": {"image/png": ""}}
+        assert skeleton["metadata"]["widgets"] == {}
+        assert code["outputs"] == [
+            {"output_type": "stream", "name": "stdout", "text": []},
+            {"output_type": "display_data", "metadata": {}, "data": {"image/png": "", "text/plain": []}},
+            {"output_type": "execute_result", "execution_count": 3, "metadata": {},
+             "data": {"text/html": [], "application/json": {}}},
+            {"output_type": "error", "ename": "ValueError", "evalue": "", "traceback": []},
+        ]
+
+    @pytest.mark.parametrize("text", ['{"cells": [}', '{"cells": "a', '{"a": 1} 2', '{"a": tru}', ''])
+    def test_invalid_json(self, text):
+        with pytest.raises(ValueError):
+            read_skeleton(io.StringIO(text), 2)
+
+    def test_bounded_memory(self, tmp_path):
+        path = tmp_path / "large.ipynb"
+        payload = "A" * (20 * 1024 * 1024)
+        path.write_text(json.dumps(v4_notebook(payload)))
+
+        tracemalloc.start()
+        with open(str(path)) as ofile:
+            skeleton = read_skeleton(ofile)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert skeleton["cells"][1]["outputs"][1]["data"] == {"image/png": "", "text/plain": []}
+        assert peak < 2 * 1024 * 1024
+
+
+class TestReadNotebook:
+
+    def test_same_cells_as_nbformat(self):
+        text = json.dumps(v4_notebook())
+
+        notebook = read_notebook(io.StringIO(text))
+
+        assert cells(notebook) == cells(nbf.reads(text, nbf.NO_CONVERT))
+        assert notebook["cells"][0]["source"] == "# Title\nText with \"quotes\" and \\ é"
+
+    def test_nbformat3(self):
+        text = json.dumps(v3_notebook())
+
+        notebook = read_notebook(io.StringIO(text))
+
+        assert cells(notebook) == cells(nbf.reads(text, nbf.NO_CONVERT))
+        assert cells(notebook)[0] == ("code", "x = 1\nx", 2, ["application/json", "image/png", "text/plain"])
+
+    def test_unsupported_version(self):
+        with pytest.raises(nbf.NBFormatError):
+            read_notebook(io.StringIO('{"nbformat": 9, "cells": []}'))
+
+    def test_fast_path(self):
+        text = json.dumps(v4_notebook())
+
+        notebook = read_notebook(io.StringIO(text))
+        node = read_notebook(io.StringIO(text), fast_path=False)
+
+        assert type(notebook) is dict
+        assert type(node) is nbf.NotebookNode
+        assert cells(notebook) == cells(node)
+
+    def test_fast_path_invalid_structure(self):
+        notebook = v4_notebook()
+        del notebook["cells"][2]["metadata"]
+        text = json.dumps(notebook)
+
+        with pytest.raises(nbf.ValidationError):
+            read_notebook(io.StringIO(text))
+        with pytest.raises(nbf.ValidationError):
+            nbf.reads(text, nbf.NO_CONVERT)
+
+    def test_parse_failure_uses_nbformat(self):
+        text = json.dumps(v4_notebook()).replace('"metadata": {}', '"metadata": {"value": NaN}', 1)
+
+        notebook = read_notebook(io.StringIO(text))
+
+        assert cells(notebook) == cells(nbf.reads(text, nbf.NO_CONVERT))
@@ -0,0 +1,196 @@
+import json
+import os
+import subprocess
+
+import src.config.consts as consts
+import src.helpers.h13_file_inventory as h13
+import src.extractions.e2_notebooks_and_cells as e2
+import src.extractions.e3_python_files as e3
+import src.extractions.e4_requirement_files as e4
+from src.db.database import RepositoryFile, PythonFile, RequirementFile
+from src.helpers.h5_loaders import load_archives
+from src.helpers.h13_file_inventory import file_kind, inventory_files, inventory_blobs, scan_files
+from tests.database_config import connection, session  # noqa: F401
+from tests.factories.models import RepositoryFactory
+
+FILES = [
+    "analysis.ipynb",
+    "setup.py",
+    "requirements.txt",
+    "README.md",
+    "src/model.py",
+    "src/.ipynb_checkpoints/analysis-checkpoint.ipynb",
+    "src/deep/Pipfile",
+    "src/deep/Pipfile.lock",
+    "venv/lib/site.py",
+]
+
+
+def create_repository(session, monkeypatch, tmp_path):
+    monkeypatch.setattr(consts, "SELECTED_REPOS_DIR", tmp_path)
+    repository = RepositoryFactory(session).create()
+    for name in FILES:
+        path = repository.path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x" * len(name))
+    return repository
+
+
+class TestFileInventory:
+
+    def test_file_kind(self):
+        assert file_kind("a.ipynb") == "notebook"
+        assert file_kind("setup.py") == "setup"
+        assert file_kind("other_setup.py") == "python"
+        assert file_kind("Pipfile.lock") == "pipfile_lock"
+        assert file_kind("dev-requirements.txt") is None
+
+    def test_scan_files_same_as_walk(self, session, monkeypatch, tmp_path):
+        repository = create_repository(session, monkeypatch, tmp_path)
+        os.symlink(str(repository.path / "src"), str(repository.path / "link"))
+
+        scanned = [entry.path for entry in scan_files(str(repository.path))]
+
+        assert scanned == [
+            os.path.join(root, name)
+            for root, _, names in os.walk(str(repository.path)) for name in names
+        ]
+
+    def test_inventory_rows(self, session, monkeypatch, tmp_path):
+        repository = create_repository(session, monkeypatch, tmp_path)
+
+        python_files = inventory_files(session, repository, "python")
+        rows = session.query(RepositoryFile).filter(RepositoryFile.repository_id == repository.id).all()
+
+        assert repository.inventory_files == len(FILES) - 1
+        assert sorted(row.path for row in rows) == sorted(name for name in FILES if name != "README.md")
+        assert {row.path: row.size for row in rows}["src/model.py"] == len("src/model.py")
+        assert sorted(str(file.relative_to(repository.path)) for file in python_files) == [
+            "src/model.py", "venv/lib/site.py"
+        ]
+
+    def test_inventory_rows_invalid_utf8_name(self, session, monkeypatch, tmp_path):
+        repository = create_repository(session, monkeypatch, tmp_path)
+        with open(os.path.join(os.fsencode(str(repository.path)), b"bad\xff.py"), "w") as ofile:
+            ofile.write("x = 1\n")
+
+        rows = {row["path"]: row for row in h13.inventory_rows(repository)}
+
+        assert rows["bad\ufffd.py"]["size"] == len("x = 1\n")
+        assert (repository.path / "bad\ufffd.py").exists()
+
+    def test_single_walk(self, session, monkeypatch, tmp_path):
+        repository = create_repository(session, monkeypatch, tmp_path)
+        walks = []
+        scan = h13.scan_files
+
+        def counted_scan(path):
+            if path == str(repository.path):
+                walks.append(path)
+            return scan(path)
+
+        monkeypatch.setattr(h13, "scan_files", counted_scan)
+
+        notebooks = e2.find_notebooks(session, repository)
+        python_files = e3.find_python_files(session, repository)
+        setups, requirements, pipfiles, pipfile_locks = e4.find_requirements(session, repository)
+
+        assert len(walks) == 1
+        assert notebooks == ["analysis.ipynb"]
+        assert python_files == ["src/model.py"]
+        assert [str(path) for path in setups + requirements + pipfiles + pipfile_locks] == [
+            "setup.py", "requirements.txt", "src/deep/Pipfile", "src/deep/Pipfile.lock"
+        ]
+
+
+def git(*args, cwd=None):
+    return subprocess.check_output(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@test"] + list(args), cwd=cwd
+    ).decode("utf-8").strip()
+
+
+def create_clone(session, monkeypatch, tmp_path):
+    """ Creates a repository cloned as e1 does with the git backend:
+    a partial clone without checkout """
+    origin = tmp_path / "origin"
+    notebook = {"nbformat": 4, "nbformat_minor": 2, "metadata": {}, "cells": [
+        {"cell_type": "code", "execution_count": 1, "metadata": {}, "source": ["import numpy"], "outputs": []}
+    ]}
+    for name in FILES:
+        path = origin / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(notebook) if name.endswith(".ipynb") else "x" * len(name))
+    os.symlink("setup.py", str(origin / "link.py"))
+    git("init", "-q", cwd=str(origin))
+    git("add", ".", cwd=str(origin))
+    git("commit", "-qm", "init", cwd=str(origin))
+    git("config", "uploadpack.allowFilter", "true", cwd=str(origin))
+    git("config", "uploadpack.allowAnySHA1InWant", "true", cwd=str(origin))
+
+    monkeypatch.setattr(consts, "SELECTED_REPOS_DIR", tmp_path / "selected")
+    monkeypatch.setattr(consts, "EXTRACTION_BACKEND", "git")
+    repository = RepositoryFactory(session).create()
+    repository.path.parent.mkdir(parents=True)
+    git("clone", "-q", "--no-checkout", "--filter=blob:none",
+        "file://" + str(origin), str(repository.path))
+    repository.commit = git("rev-parse", "HEAD", cwd=str(repository.path))
+    return repository
+
+
+class TestGitInventory:
+
+    def test_inventory_rows(self, session, monkeypatch, tmp_path):
+        repository = create_clone(session, monkeypatch, tmp_path)
+
+        python_files = inventory_files(session, repository, "python")
+        rows = session.query(RepositoryFile).filter(RepositoryFile.repository_id == repository.id).all()
+
+        assert os.listdir(str(repository.path)) == [".git"]
+        assert sorted(row.path for row in rows) == sorted(name for name in FILES if name != "README.md")
+        assert {row.path: row.size for row in rows}["src/model.py"] == len("src/model.py")
+        assert all(row.blob and row.mtime is None for row in rows)
+        assert sorted(str(file.relative_to(repository.path)) for file in python_files) == [
+            "src/model.py", "venv/lib/site.py"
+        ]
+        assert git("rev-list", "--objects", "--no-walk", "--missing=print", "HEAD",
+                   cwd=str(repository.path)).count("?") == 2  # README.md and link.py
+
+    def test_recorded_backend(self, session, monkeypatch, tmp_path):
+        repository = create_clone(session, monkeypatch, tmp_path)
+        monkeypatch.setattr(consts, "EXTRACTION_BACKEND", "worktree")
+
+        assert not h13.git_backend(repository)
+        repository.backend = "git"
+        assert h13.git_backend(repository)
+        assert len(inventory_files(session, repository, "python")) == 2
+
+    def test_stages_read_blobs(self, session, monkeypatch, tmp_path):
+        repository = create_clone(session, monkeypatch, tmp_path)
+
+        notebooks = e2.find_notebooks(session, repository)
+        blobs = inventory_blobs(session, repository)
+        nbrow, cells = e2.load_notebook(
+            repository.id, repository.path, notebooks[0], e2.new_nbrow(repository, notebooks[0]),
+            blobs[notebooks[0]]
+        )
+        e3.process_python_files(session, repository, e3.find_python_files(session, repository), 0)
+        setups, requirements, _, _ = e4.find_requirements(session, repository)
+        e4.process_requirement_files(session, repository, requirements, "requirements.txt")
+        session.commit()
+
+        assert nbrow["total_cells"] == 1
+        assert cells[0]["source"] == "import numpy"
+        assert [(file.name, file.source, file.total_lines) for file in session.query(PythonFile)] == [
+            ("src/model.py", "x" * len("src/model.py"), 1)
+        ]
+        assert [file.content for file in session.query(RequirementFile)] == ["x" * len("requirements.txt")]
+
+    def test_load_archives_tree(self, session, monkeypatch, tmp_path):
+        repository = create_clone(session, monkeypatch, tmp_path)
+
+        skip_repo, (tree, repo_path) = load_archives(session, repository)
+
+        assert not skip_repo
+        assert repo_path == ""
+        assert tree.exists("src/deep/Pipfile")
+        assert tree.exists("src/deep")
@@ -0,0 +1,84 @@
+from src.helpers.h3_utils import TimeoutError
+from src.helpers.h2_script_helpers import extract_source_features, resolve_features
+from src.helpers.h2_script_helpers import extract_in_pool
+from src.classes.c6_worker_pool import WorkerPool
+
+
+class LocalChecker(object):
+    def is_local(self, module):
+        return module == "utils"
+
+
+class TestScriptHelpersFeatures:
+    def test_extract_source_features_defers_locality(self):
+        modules, data_ios, extracted_args, missed_args = extract_source_features(
+            "import utils\nimport pandas as pd\ndf = pd.read_csv('data.csv')"
+        )
+
+        assert [module[2] for module in modules] == ["utils", "pandas"]
+        assert [module[3] for module in modules] == [None, None]
+        assert data_ios[0][2] == "read_csv"
+        assert extracted_args == 1
+        assert missed_args == 0
+
+    def test_resolve_features(self):
+        features = (True, extract_source_features("import utils\nimport pandas"))
+
+        modules, _, _, _ = resolve_features(features, LocalChecker())
+
+        assert [module[3] for module in modules] == [True, False]
+
+    def test_resolve_features_error(self):
+        try:
+            resolve_features((False, TimeoutError("Timed Out")), LocalChecker())
+            assert False
+        except TimeoutError:
+            pass
+
+    def test_extract_in_pool(self):
+        items = ["import a", "x = (", "import b"]
+        with WorkerPool(2) as pool:
+            results = list(extract_in_pool(pool, iter(items), lambda item: item))
+
+        assert [item for item, _ in results] == items
+        assert results[0][1][0] is True
+        assert results[1][1][0] is False
+        assert isinstance(results[1][1][1], SyntaxError)
+        assert results[2][1][1][0][0][2] == "b"
+
+    def test_extract_in_pool_on_chunk(self):
+        chunks = []
+        finished = []
+        items = ["import a", "import b", "import c"]
+
+        for _ in extract_in_pool(WorkerPool(0), items, lambda item: item,
+                                 chunk_size=2, on_chunk=chunks.append):
+            finished.append(len(chunks))
+
+        assert finished == [0, 0, 1]
+        assert chunks == [items[:2], items[2:]]
+
+    def test_extract_in_pool_extracts_chunk_before_yielding(self):
+        events = []
+
+        class RecordingPool(object):
+            def imap(self, function, tasks):
+                for args in tasks:
+                    events.append(("extract", args[0]))
+                    yield True, function(*args)
+
+        items = ["import a", "import b", "import c"]
+        for item, _ in extract_in_pool(RecordingPool(), items, lambda item: item, chunk_size=2,
+                                       on_read=lambda chunk: events.append(("read", len(chunk)))):
+            events.append(("write", item))
+
+        assert events == [
+            ("read", 2), ("extract", "import a"), ("extract", "import b"),
+            ("write", "import a"), ("write", "import b"),
+            ("read", 1), ("extract", "import c"), ("write", "import c"),
+        ]
+
+    def test_extract_in_pool_inline(self):
+        results = list(extract_in_pool(WorkerPool(0), ["import a"], lambda item: item))
+
+        assert results[0][1][0] is True
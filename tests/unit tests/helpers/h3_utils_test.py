@@ -6,6 +6,7 @@ if src not in sys.path:
 
 from src.classes.c4_local_checkers import PathLocalChecker
 from src.helpers.h2_script_helpers import extract_features
+from src.helpers.h3_utils import find_files
 from tests.database_config import connection, session  # noqa: F401
 
 import ast
@@ -34,3 +35,24 @@ class TestExtractFeatures:
         with pytest.raises(SyntaxError):
             extract_features(text, checker)
 
+
+class TestFindFiles:
+    def test_find_files_renames_only_invalid_names(self, tmp_path, monkeypatch):
+        (tmp_path / "valid.py").write_text("")
+        (tmp_path / "dir").mkdir()
+        with open(os.path.join(os.fsencode(str(tmp_path)), b"dir", b"bad\xff.py"), "w"):
+            pass
+        renamed = []
+        rename = os.rename
+
+        def recorded_rename(source, target):
+            renamed.append(target)
+            rename(source, target)
+
+        monkeypatch.setattr(os, "rename", recorded_rename)
+
+        files = sorted(str(path.relative_to(tmp_path)) for path in find_files(tmp_path, "*.py"))
+
+        assert files == ["dir/bad\ufffd.py", "valid.py"]
+        assert renamed == [str(tmp_path / "dir" / "bad\ufffd.py")]
+        assert sorted(os.listdir(str(tmp_path / "dir"))) == ["bad\ufffd.py"]
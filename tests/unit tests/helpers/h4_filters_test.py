@@ -1,7 +1,11 @@
 from src.classes.c1_safe_session import SafeSession
-from src.db.database import Repository, Cell, PythonFile
+import pytest
+from sqlalchemy import text
+from src.db.database import Repository, Cell, PythonFile, Notebook, RequirementFile
 from src.helpers.h4_filters import filter_repositories, filter_markdown_cells
-from src.helpers.h4_filters import filter_code_cells, filter_python_files
+from src.helpers.h4_filters import filter_code_cells, filter_python_files, filter_notebooks
+from src.helpers.h4_filters import after, release
+import src.helpers.h4_filters as h4
 from src.config.states import NB_STOPPED, PF_EMPTY
 from tests.factories.models import RepositoryFactory, MarkdownCellFactory
 from tests.factories.models import CodeCellFactory, NotebookFactory, PythonFileFactory
@@ -519,3 +523,102 @@ class TestFilterPythonFiles:
         assert query.count() == 1
         assert pf1 in query.all()
         assert pf2 not in query.all()
+
+
+def query_plan(session, query):
+    sql = str(query.statement.compile(session.bind, compile_kwargs={"literal_binds": True}))
+    return " ".join(row[-1] for row in session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+
+
+class TestFilterQueryPlans:
+
+    def test_code_cells_use_index(self, session):
+        query = filter_code_cells(session=session, selected_notebooks=None,
+                                  selected_repositories=[1, 2], count=False,
+                                  interval=None, reverse=False)
+
+        plan = query_plan(session, query)
+        assert "USING INDEX ix_cells_code" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_markdown_cells_use_index(self, session):
+        query = filter_markdown_cells(session=session, count=False, selected_repositories=None,
+                                      interval=[1, 10], reverse=False)
+
+        plan = query_plan(session, query)
+        assert "USING INDEX ix_cells_markdown" in plan
+
+    def test_python_files_use_index(self, session):
+        query = filter_python_files(session=session, selected_python_files=None,
+                                    selected_repositories=[1], count=False,
+                                    interval=None, reverse=False)
+
+        assert "USING INDEX ix_python_files_repository_name" in query_plan(session, query)
+
+    def test_notebooks_use_index(self, session):
+        query = filter_notebooks(session=session, selected_repositories=[1], count=False,
+                                 interval=None, reverse=False)
+
+        assert "USING INDEX ix_notebooks_repository_name" in query_plan(session, query)
+
+    def test_name_lookups_use_index(self, session):
+        for model in (Notebook, PythonFile, RequirementFile):
+            query = session.query(model).filter(model.repository_id == 1, model.name == "a")
+
+            assert "(repository_id=? AND name=?)" in query_plan(session, query)
+
+
+class TestStreamFilters:
+
+    def create_cells(self, session):
+        repo1, repo2 = RepositoryFactory(session).create_batch(2)
+        notebook1 = NotebookFactory(session).create(repository_id=repo1.id)
+        notebook2 = NotebookFactory(session).create(repository_id=repo2.id)
+        return (
+            CodeCellFactory(session).create_batch(3, repository_id=repo1.id, notebook_id=notebook1.id)
+            + CodeCellFactory(session).create_batch(2, repository_id=repo2.id, notebook_id=notebook2.id)
+        )
+
+    @pytest.mark.parametrize("reverse", [False, True])
+    def test_stream_pages(self, session, monkeypatch, reverse):
+        monkeypatch.setattr(h4.consts, "STREAM_BATCH_SIZE", 2)
+        self.create_cells(session)
+        arguments = dict(session=session, selected_notebooks=None, selected_repositories=None,
+                         count=False, interval=None, reverse=reverse)
+
+        streamed = list(filter_code_cells(stream_rows=True, **arguments))
+
+        assert streamed == filter_code_cells(**arguments).all()
+        assert len(streamed) == 5
+
+    def test_stream_survives_commits(self, session, monkeypatch):
+        monkeypatch.setattr(h4.consts, "STREAM_BATCH_SIZE", 2)
+        self.create_cells(session)
+
+        visited = []
+        for cell in filter_code_cells(session=session, selected_notebooks=None, selected_repositories=None,
+                                      count=False, interval=None, reverse=False, stream_rows=True):
+            visited.append(cell.id)
+            cell.python = False
+            session.commit()
+
+        assert len(visited) == len(set(visited)) == 5
+
+    def test_stream_page_uses_index(self, session):
+        query = filter_code_cells(session=session, selected_notebooks=None,
+                                  selected_repositories=[1, 2], count=False,
+                                  interval=None, reverse=False)
+        order = [(Cell.repository_id, False), (Cell.notebook_id, False), (Cell.index, False), (Cell.id, False)]
+
+        plan = query_plan(session, query.filter(after(order, [1, 1, 0, 1])).limit(10))
+        assert "USING INDEX ix_cells_code" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_release_committed(self, session):
+        cell1, cell2 = self.create_cells(session)[:2]
+        cell1.python = False
+
+        release(session, [cell1, cell2])
+
+        assert cell1 in session
+        assert cell2 not in session
@@ -0,0 +1,318 @@
+import json
+import threading
+import time
+
+import pytest
+
+import src.s3_extract as s3
+from src.config.states import *
+from src.db.database import Extraction
+from tests.factories.models import RepositoryFactory
+from tests.database_config import connection, session  # noqa: F401
+
+
+class StubExecution(object):
+    def __init__(self, durations=None, fail=None):
+        self.durations = durations or {}
+        self.fail = fail
+        self.lock = threading.Lock()
+        self.started = []
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, script, args, iteration):
+        with self.lock:
+            self.started.append(script)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.durations.get(script, 0.01))
+        with self.lock:
+            self.running -= 1
+        if script == self.fail:
+            raise Exception("Extraction failed.")
+        return 0
+
+
+@pytest.fixture
+def no_exit(monkeypatch):
+    monkeypatch.setattr(s3, "check_exit", lambda check: False)
+
+
+class TestExtractStages:
+    def test_stage_dependencies(self):
+        assert s3.stage_dependencies("e5_markdown_cells", s3.ORDER) == ["e2_notebooks_and_cells"]
+        assert s3.stage_dependencies("e4_requirement_files", s3.ORDER) == ["e3_python_files"]
+        assert s3.stage_dependencies("custom", ["e1_download", "custom"]) == ["e1_download"]
+        assert s3.stage_dependencies("e3_python_files", ["e3_python_files"]) == []
+
+    def test_run_stages_respects_dependencies(self, monkeypatch, no_exit):
+        execution = StubExecution()
+        monkeypatch.setattr(s3, "execute_script", execution)
+        to_execute = {script: [] for script in s3.ORDER}
+
+        runtimes = s3.run_stages(to_execute, ["-sr", "1"], 1, max_parallel=3)
+
+        assert set(runtimes) == set(s3.ORDER)
+        for script in s3.ORDER:
+            for dependency in s3.stage_dependencies(script, s3.ORDER):
+                assert execution.started.index(dependency) < execution.started.index(script)
+
+    def test_run_stages_max_parallel(self, monkeypatch, no_exit):
+        execution = StubExecution(durations={
+            "e5_markdown_cells": 0.2, "e6_code_cells": 0.2, "e3_python_files": 0.2
+        })
+        monkeypatch.setattr(s3, "execute_script", execution)
+        to_execute = {script: [] for script in s3.ORDER}
+
+        s3.run_stages(to_execute, [], 1, max_parallel=3)
+        assert execution.max_running == 3
+
+        execution = StubExecution()
+        monkeypatch.setattr(s3, "execute_script", execution)
+        s3.run_stages(to_execute, [], 1, max_parallel=1)
+        assert execution.max_running == 1
+        assert execution.started == s3.ORDER
+
+    def test_run_stages_max_parallel_option(self, monkeypatch, no_exit):
+        execution = StubExecution()
+        monkeypatch.setattr(s3, "execute_script", execution)
+        monkeypatch.setattr(s3.consts, "MAX_PARALLEL_STAGES", 1)
+
+        s3.run_stages({script: [] for script in s3.ORDER}, [], 1)
+
+        assert execution.max_running == 1
+        assert execution.started == s3.ORDER
+
+    def test_run_stages_failure(self, monkeypatch, no_exit):
+        execution = StubExecution(fail="e3_python_files")
+        monkeypatch.setattr(s3, "execute_script", execution)
+        to_execute = {script: [] for script in s3.ORDER}
+
+        with pytest.raises(s3.StageError) as err:
+            s3.run_stages(to_execute, [], 1, max_parallel=3)
+
+        assert err.value.script == "e3_python_files"
+        assert "e4_requirement_files" not in execution.started
+        assert "e7_python_features" not in execution.started
+        assert "e2_notebooks_and_cells" in err.value.runtimes
+
+    def test_run_stages_exit(self, monkeypatch):
+        execution = StubExecution()
+        monkeypatch.setattr(s3, "execute_script", execution)
+        monkeypatch.setattr(s3, "check_exit", lambda check: bool(execution.started))
+        to_execute = {script: [] for script in s3.ORDER}
+
+        assert s3.run_stages(to_execute, [], 1) is None
+        assert execution.started == ["e1_download"]
+
+    def test_stage_arguments(self):
+        arguments = s3.stage_arguments("git")
+
+        assert list(arguments) == s3.ORDER
+        assert arguments["e1_download"] == ["--backend", "git"]
+        assert arguments["e7_python_features"] == ["--backend", "git"]
+        assert arguments["e5_markdown_cells"] == []
+        assert arguments["ag1_notebook_aggregate"] == []
+
+    def test_critical_path(self):
+        runtimes = {script: 1 for script in s3.ORDER}
+        runtimes["e6_code_cells"] = 10
+
+        # e1 -> e2 -> e6 -> ag1
+        assert s3.critical_path(runtimes, s3.ORDER) == 13
+
+    def test_save_extraction_runtimes(self, session, monkeypatch):
+        monkeypatch.setattr(s3, "remove_repositorires", lambda repositories: None)
+        start = s3.datetime.utcnow()
+
+        s3.save_extraction(session, start, start, ["-sr"], runtimes={"e1_download": 2.5})
+
+        extraction = session.query(Extraction).first()
+        assert json.loads(extraction.stage_runtimes) == {"e1_download": 2.5}
+
+
+class TestExtractBatches:
+    def test_select_repositories_limit_and_exclude(self, session, monkeypatch):
+        monkeypatch.setattr(s3, "SIZE_LIMIT", 450)
+        first = RepositoryFactory(session).create(state=REP_SELECTED, disk_usage="300")
+        second = RepositoryFactory(session).create(state=REP_SELECTED, disk_usage="200")
+        RepositoryFactory(session).create(state=REP_LOADED, disk_usage="100")
+
+        selected, output = s3.select_repositories(session)
+        assert selected == ["-sr", str(first.id)]
+        assert "Estimated" in output
+
+        selected, output = s3.select_repositories(session, exclude=[first.id])
+        assert selected == ["-sr", str(second.id)]
+        assert output.startswith("Selected 1 Repositories")
+
+        assert s3.select_repositories(session, size_limit=100) == (False, None)
+
+    def test_recover_repositories(self, session):
+        RepositoryFactory(session).create(state=REP_SELECTED)
+        RepositoryFactory(session).create(state=REP_FINISHED)
+        loaded = RepositoryFactory(session).create(state=REP_LOADED)
+        extracted = RepositoryFactory(session).create(state=REP_N_EXTRACTED)
+        RepositoryFactory(session).create(state=REP_PF_EXTRACTED, extraction_id=1)
+
+        selected, output = s3.recover_repositories(session)
+
+        assert selected == ["-sr", str(loaded.id), str(extracted.id)]
+        assert output.startswith("Recovered 2 Repositories")
+
+    def test_prefetch_limit(self, session, monkeypatch):
+        repository = RepositoryFactory(session).create(state=REP_LOADED, disk_usage="300")
+        monkeypatch.setattr(s3, "SIZE_LIMIT", 500)
+
+        assert s3.prefetch_limit(session, ["-sr", str(repository.id)], disk_budget=1000) == 500
+        assert s3.prefetch_limit(session, ["-sr", str(repository.id)], disk_budget=600) == 300
+        assert s3.prefetch_limit(session, ["-sr", str(repository.id)], disk_budget=300) == 0
+
+
+class TestExtractPipeline:
+    def test_run_pipelined(self, monkeypatch, no_exit):
+        events = []
+        saved = []
+        batches = [(["-sr", "2"], "batch 2"), (["-sr", "3"], "batch 3")]
+
+        def execute(script, args, iteration):
+            events.append((script, args[-1]))
+            time.sleep(0.02 if script == "e1_download" else 0.01)
+
+        monkeypatch.setattr(s3, "execute_script", execute)
+        monkeypatch.setattr(s3, "inform", lambda *args: None)
+        monkeypatch.setattr(s3, "inform_stages", lambda *args: None)
+        monkeypatch.setattr(s3, "next_iteration", lambda session: 1)
+        monkeypatch.setattr(s3, "prefetch_limit", lambda *args: 100)
+        monkeypatch.setattr(s3, "select_repositories",
+                            lambda *args, **kwargs: batches.pop(0) if batches else (False, None))
+        monkeypatch.setattr(s3, "save_extraction", lambda session, start, end, selected, **kwargs:
+                            saved.append((selected[-1], kwargs)))
+
+        to_execute = {script: [] for script in s3.ORDER}
+        s3.run_pipelined(None, to_execute, ["-sr", "1"], "batch 1")
+
+        assert [repository for repository, _ in saved] == ["1", "2", "3"]
+        assert all(set(kwargs["runtimes"]) == set(s3.ORDER) for _, kwargs in saved)
+        assert events.index(("e1_download", "2")) < events.index(("ag2_python_aggregate", "1"))
+        assert events.index(("e1_download", "3")) < events.index(("ag2_python_aggregate", "2"))
+        assert events.count(("e1_download", "1")) == 1
+
+    def test_run_pipelined_batch_larger_than_prefetch_limit(self, monkeypatch, no_exit):
+        saved = []
+        batches = [(["-sr", "2"], "batch 2", 500), (["-sr", "3"], "batch 3", 50)]
+
+        def select_repositories(session, size_limit=s3.SIZE_LIMIT, exclude=None):
+            if not batches or batches[0][2] >= size_limit:
+                return False, None
+            selected, output, _ = batches.pop(0)
+            return selected, output
+
+        monkeypatch.setattr(s3, "execute_script", lambda script, args, iteration: 0)
+        monkeypatch.setattr(s3, "inform", lambda *args: None)
+        monkeypatch.setattr(s3, "inform_stages", lambda *args: None)
+        monkeypatch.setattr(s3, "next_iteration", lambda session: 1)
+        monkeypatch.setattr(s3, "prefetch_limit", lambda *args: 100)
+        monkeypatch.setattr(s3, "select_repositories", select_repositories)
+        monkeypatch.setattr(s3, "save_extraction", lambda session, start, end, selected, **kwargs:
+                            saved.append((selected[-1], kwargs)))
+
+        to_execute = {script: [] for script in s3.ORDER}
+        s3.run_pipelined(None, to_execute, ["-sr", "1"], "batch 1")
+
+        assert [repository for repository, _ in saved] == ["1", "2", "3"]
+        assert all("error" not in kwargs for _, kwargs in saved)
+
+    def test_run_pipelined_download_failure(self, monkeypatch, no_exit):
+        saved = []
+
+        def execute(script, args, iteration):
+            if script == "e1_download" and args[-1] == "1":
+                raise Exception("Extraction failed.")
+
+        monkeypatch.setattr(s3, "execute_script", execute)
+        monkeypatch.setattr(s3, "inform", lambda *args: None)
+        monkeypatch.setattr(s3, "inform_stages", lambda *args: None)
+        monkeypatch.setattr(s3, "next_iteration", lambda session: 1)
+        monkeypatch.setattr(s3, "prefetch_limit", lambda *args: 0)
+        batches = [(["-sr", "2"], "batch 2"), (False, None)]
+        monkeypatch.setattr(s3, "select_repositories", lambda *args, **kwargs: batches.pop(0))
+        monkeypatch.setattr(s3, "save_extraction", lambda session, start, end, selected, **kwargs:
+                            saved.append((selected[-1], kwargs)))
+
+        to_execute = {script: [] for script in s3.ORDER}
+        s3.run_pipelined(None, to_execute, ["-sr", "1"], "batch 1")
+
+        assert saved[0][0] == "1"
+        assert saved[0][1]["error"] is True
+        assert saved[0][1]["failure"] == "e1_download"
+        assert saved[1][0] == "2"
+        assert "error" not in saved[1][1]
+
+
+class TestExtractInform:
+    @pytest.mark.parametrize("materialized", [True, False])
+    def test_state_counts(self, session, monkeypatch, materialized):
+        monkeypatch.setattr(s3.consts, "MATERIALIZED_STATE_COUNTS", materialized)
+        RepositoryFactory(session).create(state=REP_SELECTED, disk_usage="300")
+        RepositoryFactory(session).create(state=REP_SELECTED, disk_usage="200")
+        finished = RepositoryFactory(session).create(state=REP_LOADED, disk_usage="100")
+        session.query(s3.Repository).filter(s3.Repository.id == finished.id)\
+            .update({s3.Repository.state: REP_FINISHED}, synchronize_session=False)
+        session.commit()
+
+        counts = s3.state_counts(session)
+
+        assert counts[REP_SELECTED] == (2, 500)
+        assert counts[REP_FINISHED] == (1, 100)
+        assert counts.get(REP_LOADED, (0, 0)) == (0, 0)
+
+    def test_inform(self, session, capsys):
+        RepositoryFactory(session).create(state=REP_SELECTED, disk_usage="3000000")
+        RepositoryFactory(session).create(state=REP_FINISHED, disk_usage="1000000")
+
+        s3.inform(session, 7, "Selected output")
+        captured = capsys.readouterr()
+
+        assert "Processed Repositories: 1 (1.00GB - 25.00%)" in captured.out
+        assert "Unprocessed Repositories: 1 (3.00GB - 75.00%)" in captured.out
+        assert "Iteration 7" in captured.out
+
+
+class TestExtractRunner:
+    @pytest.fixture
+    def stages(self, tmp_path, monkeypatch):
+        package = tmp_path / "fake_stages"
+        package.mkdir()
+        (package / "__init__.py").write_text("")
+        monkeypatch.syspath_prepend(str(tmp_path))
+        monkeypatch.setattr(s3, "STAGE_PACKAGE", "fake_stages")
+        return package
+
+    def test_fork_script_runs_main(self, stages, tmp_path):
+        (stages / "echo_stage.py").write_text(
+            "import sys\n\ndef main():\n    print('args:', ' '.join(sys.argv[1:]))\n"
+        )
+        out = tmp_path / "echo_stage.outerr"
+
+        with open(str(out), "wb") as outf:
+            status = s3.fork_script("echo_stage", ["-r", 1, 2], outf)
+
+        assert status == 0
+        assert out.read_text() == "args: -r 1 2\n"
+
+    def test_fork_script_failure(self, stages, tmp_path):
+        (stages / "exit_stage.py").write_text("import sys\n\ndef main():\n    sys.exit(3)\n")
+
+        with open(str(tmp_path / "exit_stage.outerr"), "wb") as outf:
+            assert s3.fork_script("exit_stage", [], outf) == 3
+
+    def test_execute_script_fork_failure(self, stages, monkeypatch, tmp_path):
+        (stages / "broken_stage.py").write_text("def main():\n    raise ValueError('broken stage')\n")
+        monkeypatch.setattr(s3, "LOGS_DIR", tmp_path)
+        monkeypatch.setattr(s3.consts, "STAGE_RUNNER", "forkserver")
+
+        with pytest.raises(Exception, match="Extraction failed."):
+            s3.execute_script("broken_stage", [], 1)
+        log, = (tmp_path / "broken_stage").iterdir()
+        assert "broken stage" in log.read_text()